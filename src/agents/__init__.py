@@ -1,3 +1,3 @@
-from agents.agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents.agents import DEFAULT_AGENT, aget_agent, get_agent, get_all_agent_info, load_agents
 
-__all__ = ["get_agent", "get_all_agent_info", "DEFAULT_AGENT"]
+__all__ = ["aget_agent", "get_agent", "get_all_agent_info", "load_agents", "DEFAULT_AGENT"]
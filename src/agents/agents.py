@@ -1,40 +1,86 @@
+import asyncio
+import logging
 from dataclasses import dataclass
+from importlib import import_module
 
 from langgraph.graph.state import CompiledStateGraph
 
-from agents.bg_task_agent.bg_task_agent import bg_task_agent
-from agents.chatbot import chatbot
-from agents.command_agent import command_agent
-from agents.interrupt_agent import interrupt_agent
-from agents.langgraph_supervisor_agent import langgraph_supervisor_agent
-from agents.research_assistant import research_assistant
+from core import get_model, settings
 from schema import AgentInfo
 
+logger = logging.getLogger(__name__)
+
 DEFAULT_AGENT = "research-assistant"
 
 
 @dataclass
 class Agent:
     description: str
-    graph: CompiledStateGraph
+    graph: CompiledStateGraph | None = None
+    # "module:attribute" of the graph, imported and compiled the first time it's used, so that
+    # starting the service doesn't wait for every agent and the model SDKs they use
+    graph_path: str | None = None
+
+    def get_graph(self) -> CompiledStateGraph:
+        if self.graph is None:
+            if self.graph_path is None:
+                raise ValueError(f"Agent has no graph: {self.description}")
+            module, attribute = self.graph_path.split(":")
+            self.graph = getattr(import_module(module), attribute)
+        return self.graph
 
 
 agents: dict[str, Agent] = {
-    "chatbot": Agent(description="A simple chatbot.", graph=chatbot),
+    "chatbot": Agent(description="A simple chatbot.", graph_path="agents.chatbot:chatbot"),
     "research-assistant": Agent(
-        description="A research assistant with web search and calculator.", graph=research_assistant
+        description="A research assistant with web search and calculator.",
+        graph_path="agents.research_assistant:research_assistant",
+    ),
+    "command-agent": Agent(
+        description="A command agent.", graph_path="agents.command_agent:command_agent"
+    ),
+    "bg-task-agent": Agent(
+        description="A background task agent.",
+        graph_path="agents.bg_task_agent.bg_task_agent:bg_task_agent",
     ),
-    "command-agent": Agent(description="A command agent.", graph=command_agent),
-    "bg-task-agent": Agent(description="A background task agent.", graph=bg_task_agent),
     "langgraph-supervisor-agent": Agent(
-        description="A langgraph supervisor agent", graph=langgraph_supervisor_agent
+        description="A langgraph supervisor agent",
+        graph_path="agents.langgraph_supervisor_agent:langgraph_supervisor_agent",
+    ),
+    "interrupt-agent": Agent(
+        description="An agent the uses interrupts.",
+        graph_path="agents.interrupt_agent:interrupt_agent",
     ),
-    "interrupt-agent": Agent(description="An agent the uses interrupts.", graph=interrupt_agent),
 }
 
 
 def get_agent(agent_id: str) -> CompiledStateGraph:
-    return agents[agent_id].graph
+    return agents[agent_id].get_graph()
+
+
+async def aget_agent(agent_id: str) -> CompiledStateGraph:
+    """get_agent for the event loop, where a graph's first import and compile run in a thread."""
+    agent = agents[agent_id]
+    if agent.graph is None:
+        return await asyncio.to_thread(agent.get_graph)
+    return agent.graph
+
+
+def load_agents() -> None:
+    """
+    Compile every agent's graph and build the available models, which imports their provider
+    SDKs, ahead of the first requests. This blocks for seconds, so run it in a thread.
+    """
+    for agent_id, agent in agents.items():
+        try:
+            agent.get_graph()
+        except Exception:
+            logger.exception(f"Failed to load agent {agent_id}")
+    for model_name in settings.AVAILABLE_MODELS:
+        try:
+            get_model(model_name)
+        except Exception:
+            logger.exception(f"Failed to load model {model_name}")
 
 
 def get_all_agent_info() -> list[AgentInfo]:
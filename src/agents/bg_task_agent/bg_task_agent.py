@@ -3,12 +3,12 @@ import asyncio
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.types import StreamWriter
 
 from agents.bg_task_agent.task import Task
 from core import get_model, settings
+from memory import get_checkpointer
 
 
 class AgentState(MessagesState, total=False):
@@ -61,5 +61,5 @@ agent.add_edge("bg_task", "model")
 agent.add_edge("model", END)
 
 bg_task_agent = agent.compile(
-    checkpointer=MemorySaver(),
+    checkpointer=get_checkpointer(),
 )
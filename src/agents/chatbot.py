@@ -1,25 +1,34 @@
+from typing import Any
+
 from langchain_core.messages import BaseMessage
 from langchain_core.runnables import RunnableConfig
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.func import entrypoint
 from langgraph.graph import add_messages
 
+from agents.context import ContextWindow
 from core import get_model, settings
+from memory import get_checkpointer
 
 
-@entrypoint(checkpointer=MemorySaver())
+@entrypoint(checkpointer=get_checkpointer())
 async def chatbot(
     inputs: dict[str, list[BaseMessage]],
     *,
-    previous: dict[str, list[BaseMessage]],
+    previous: dict[str, Any],
     config: RunnableConfig,
 ):
     messages = inputs["messages"]
+    summary = None
     if previous:
         messages = add_messages(previous["messages"], messages)
+        summary = previous.get("context_summary")
 
     model = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
-    response = await model.ainvoke(messages)
-    return entrypoint.final(
-        value={"messages": [response]}, save={"messages": add_messages(messages, response)}
-    )
+    context = messages
+    if window := ContextWindow.from_config(config):
+        context, summary = await window.apply(messages, model=model, summary=summary, config=config)
+    response = await model.ainvoke(context)
+    save = {"messages": add_messages(messages, response)}
+    if summary:
+        save["context_summary"] = summary
+    return entrypoint.final(value={"messages": [response]}, save=save)
@@ -5,6 +5,8 @@ from langchain_core.messages import AIMessage
 from langgraph.graph import START, MessagesState, StateGraph
 from langgraph.types import Command
 
+from memory import get_checkpointer
+
 
 class AgentState(MessagesState, total=False):
     """`total=False` is PEP589 specs.
@@ -51,4 +53,4 @@ builder.add_node(node_b)
 builder.add_node(node_c)
 # NOTE: there are no edges between nodes A, B and C!
 
-command_agent = builder.compile()
+command_agent = builder.compile(checkpointer=get_checkpointer())
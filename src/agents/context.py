@@ -0,0 +1,183 @@
+import logging
+from collections.abc import Sequence
+from dataclasses import dataclass
+from typing import Any, TypedDict
+
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    BaseMessage,
+    HumanMessage,
+    SystemMessage,
+    get_buffer_string,
+)
+from langchain_core.runnables import RunnableConfig
+
+from core import settings
+from core.metrics import register_metrics
+from core.tokens import estimate_tokens
+
+logger = logging.getLogger(__name__)
+
+# With summaries, this share of the budget is set aside for the summary of evicted turns
+SUMMARY_SHARE = 0.25
+
+SUMMARY_PROMPT = """
+    You maintain a running summary of a conversation between a user and an AI assistant, so that
+    the assistant can continue it after older messages are dropped. Keep names, facts, numbers,
+    decisions, the user's preferences and open questions. Leave out pleasantries. Write at most
+    {words} words, and reply with the summary only.
+    """
+
+
+class ContextSummary(TypedDict):
+    """Summary of the messages evicted from the context window, kept in the agent's state."""
+
+    text: str
+    # ID of the last message covered by the summary
+    through: str
+
+
+class ContextWindowStats:
+    def __init__(self) -> None:
+        self.requests = 0
+        self.trimmed_requests = 0
+        self.tokens_in = 0
+        self.tokens_sent = 0
+        self.summaries = 0
+        self.summary_failures = 0
+
+    def record(self, tokens_in: int, tokens_sent: int) -> None:
+        self.requests += 1
+        self.tokens_in += tokens_in
+        self.tokens_sent += tokens_sent
+        if tokens_sent < tokens_in:
+            self.trimmed_requests += 1
+
+    def stats(self) -> dict[str, Any]:
+        tokens_saved = self.tokens_in - self.tokens_sent
+        return {
+            "requests": self.requests,
+            "trimmed_requests": self.trimmed_requests,
+            "tokens_in": self.tokens_in,
+            "tokens_sent": self.tokens_sent,
+            "tokens_saved": tokens_saved,
+            "avg_tokens_saved": tokens_saved / self.requests if self.requests else 0.0,
+            "summaries": self.summaries,
+            "summary_failures": self.summary_failures,
+        }
+
+
+context_stats = ContextWindowStats()
+register_metrics("context_window", context_stats.stats)
+
+
+@dataclass
+class ContextWindow:
+    """
+    Fits a conversation into a token budget before it's sent to the model.
+
+    The most recent turns that fit in `max_tokens` are kept, starting at a user message so that
+    tool calls stay paired with their results. The current turn is always kept, even when it
+    alone exceeds the budget. With `summarize`, evicted turns are folded into a running summary
+    that's sent ahead of the kept turns. The summary is extended with newly evicted messages
+    only, and is saved in the agent's state so it isn't regenerated on every call.
+    """
+
+    max_tokens: int
+    summarize: bool = False
+
+    @classmethod
+    def from_config(cls, config: RunnableConfig) -> "ContextWindow | None":
+        """
+        The context window set by the `context_max_tokens` and `context_summarize` keys of
+        agent_config, falling back to the service settings. None when there's no budget.
+        """
+        configurable = config.get("configurable", {})
+        max_tokens = configurable.get("context_max_tokens", settings.CONTEXT_MAX_TOKENS)
+        if not max_tokens:
+            return None
+        summarize = configurable.get("context_summarize", settings.CONTEXT_SUMMARIZE)
+        return cls(max_tokens=int(max_tokens), summarize=bool(summarize))
+
+    def _window_start(self, messages: Sequence[BaseMessage], budget: int) -> int:
+        turn_starts = [i for i, m in enumerate(messages) if isinstance(m, HumanMessage)]
+        if not turn_starts:
+            return 0
+        tokens = 0
+        start = len(messages)
+        while start > 0:
+            tokens += estimate_tokens([messages[start - 1]])
+            if tokens > budget:
+                break
+            start -= 1
+        # Round up to the next turn, or keep the current turn whole
+        return next((i for i in turn_starts if i >= start), turn_starts[-1])
+
+    async def _summarize(
+        self,
+        model: BaseChatModel,
+        summary: ContextSummary | None,
+        evicted: Sequence[BaseMessage],
+        config: RunnableConfig | None,
+    ) -> str:
+        words = int(self.max_tokens * SUMMARY_SHARE * 0.75)
+        conversation = get_buffer_string(evicted)
+        if summary:
+            conversation = f"Summary so far:\n{summary['text']}\n\nNewer messages:\n{conversation}"
+        response = await model.with_config(tags=["skip_stream"]).ainvoke(
+            [
+                SystemMessage(content=SUMMARY_PROMPT.format(words=words)),
+                HumanMessage(content=conversation),
+            ],
+            config,
+        )
+        return response.text()
+
+    async def apply(
+        self,
+        messages: Sequence[BaseMessage],
+        *,
+        model: BaseChatModel,
+        summary: ContextSummary | None = None,
+        reserved_tokens: int = 0,
+        config: RunnableConfig | None = None,
+    ) -> tuple[list[BaseMessage], ContextSummary | None]:
+        """
+        Return the messages to send to the model, and the summary to save in the state.
+
+        `reserved_tokens` is taken from the budget for prompts the agent adds itself, such as
+        its system prompt. The model is only called to extend the summary.
+        """
+        budget = self.max_tokens - reserved_tokens
+        if self.summarize:
+            budget -= int(self.max_tokens * SUMMARY_SHARE)
+        start = self._window_start(messages, budget)
+        kept = list(messages[start:])
+
+        if self.summarize and start > 0:
+            ids = [m.id for m in messages[:start]]
+            # Messages up to and including `through` are already summarized
+            covered = 0
+            if summary and summary["through"] in ids:
+                covered = ids.index(summary["through"]) + 1
+            if covered < start:
+                try:
+                    text = await self._summarize(
+                        model, summary if covered else None, messages[covered:start], config
+                    )
+                    summary = ContextSummary(text=text, through=ids[start - 1])
+                    context_stats.summaries += 1
+                except Exception:
+                    # The turn goes ahead with the summary it had, which is extended next time
+                    context_stats.summary_failures += 1
+                    logger.exception("Failed to summarize the evicted conversation")
+            if summary and summary["through"] in ids:
+                kept.insert(
+                    0,
+                    SystemMessage(
+                        content=f"Summary of the earlier conversation:\n{summary['text']}"
+                    ),
+                )
+
+        context_stats.record(estimate_tokens(messages), estimate_tokens(kept))
+        return kept, summary
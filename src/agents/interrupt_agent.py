@@ -5,12 +5,12 @@ from langchain.prompts import SystemMessagePromptTemplate
 from langchain_core.language_models.chat_models import BaseChatModel
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.types import interrupt
 from pydantic import BaseModel, Field
 
 from core import get_model, settings
+from memory import get_checkpointer
 
 
 class AgentState(MessagesState, total=False):
@@ -123,6 +123,6 @@ agent.add_edge("determine_birthdate", "determine_sign")
 agent.add_edge("determine_sign", END)
 
 interrupt_agent = agent.compile(
-    checkpointer=MemorySaver(),
+    checkpointer=get_checkpointer(),
 )
 interrupt_agent.name = "interrupt-agent"
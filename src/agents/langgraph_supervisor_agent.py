@@ -1,8 +1,8 @@
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.prebuilt import create_react_agent
 from langgraph_supervisor import create_supervisor
 
 from core import get_model, settings
+from memory import get_checkpointer
 
 model = get_model(settings.DEFAULT_MODEL)
 
@@ -55,4 +55,4 @@ workflow = create_supervisor(
     add_handoff_back_messages=False,
 )
 
-langgraph_supervisor_agent = workflow.compile(checkpointer=MemorySaver())
+langgraph_supervisor_agent = workflow.compile(checkpointer=get_checkpointer())
@@ -1,10 +1,16 @@
+import hashlib
+import time
 from enum import Enum
+from functools import cache
+from typing import Any
 
 from langchain_core.messages import AIMessage, AnyMessage, HumanMessage
 from langchain_core.prompts import PromptTemplate
 from pydantic import BaseModel, Field
 
 from core import get_model, settings
+from core.cache import LRUCache
+from core.metrics import register_metrics
 from schema.models import GroqModelName
 
 
@@ -38,6 +44,9 @@ unsafe_content_categories = {
     "S14": "Code Interpreter Abuse.",
 }
 
+# Key of the custom stream event reporting how much of a streamed output Llama Guard has verified
+SAFETY_VERIFIED_KEY = "safety_verified_chars"
+
 categories_str = "\n".join([f"{k}: {v}" for k, v in unsafe_content_categories.items()])
 
 llama_guard_instructions = f"""
@@ -75,8 +84,35 @@ def parse_llama_guard_output(output: str) -> LlamaGuardOutput:
         return LlamaGuardOutput(safety_assessment=SafetyAssessment.ERROR)
 
 
+def _prefix_hashes(lines: list[str]) -> list[str]:
+    """Return a hash for every prefix of the conversation, hashes[i] covering lines[: i + 1]."""
+    digest = hashlib.sha256()
+    hashes = []
+    for line in lines:
+        digest.update(line.encode())
+        digest.update(b"\x00")
+        hashes.append(digest.copy().hexdigest())
+    return hashes
+
+
 class LlamaGuard:
-    def __init__(self) -> None:
+    """
+    Llama Guard safety checker with a verdict cache.
+
+    Verdicts are memoized by (role, conversation) so repeated checks skip the Groq round trip.
+    Once a conversation prefix has been judged safe, later checks only send the messages after
+    it, plus `prefix_context` messages from the end of the prefix for context.
+    """
+
+    def __init__(self, prefix_context: int = 2) -> None:
+        self.cache: LRUCache[tuple[str, str], LlamaGuardOutput] = LRUCache(
+            maxsize=settings.LLAMA_GUARD_CACHE_SIZE, ttl=settings.LLAMA_GUARD_CACHE_TTL
+        )
+        self.prefix_context = prefix_context
+        self.guard_calls = 0
+        self.guard_latency_ms = 0.0
+        self.latency_saved_ms = 0.0
+        self.messages_skipped = 0
         if settings.GROQ_API_KEY is None:
             print("GROQ_API_KEY not set, skipping LlamaGuard")
             self.model = None
@@ -84,27 +120,90 @@ class LlamaGuard:
         self.model = get_model(GroqModelName.LLAMA_GUARD_3_8B).with_config(tags=["skip_stream"])
         self.prompt = PromptTemplate.from_template(llama_guard_instructions)
 
-    def _compile_prompt(self, role: str, messages: list[AnyMessage]) -> str:
+    def _conversation_lines(self, messages: list[AnyMessage]) -> list[str]:
         role_mapping = {"ai": "Agent", "human": "User"}
-        messages_str = [
+        return [
             f"{role_mapping[m.type]}: {m.content}" for m in messages if m.type in ["ai", "human"]
         ]
-        conversation_history = "\n\n".join(messages_str)
+
+    def _compile_prompt(self, role: str, lines: list[str]) -> str:
+        conversation_history = "\n\n".join(lines)
         return self.prompt.format(role=role, conversation_history=conversation_history)
 
+    def _safe_prefix_length(self, hashes: list[str]) -> int:
+        """Length of the longest strict prefix of the conversation already judged safe."""
+        for length in range(len(hashes) - 1, 0, -1):
+            for role in ("User", "Agent"):
+                verdict = self.cache.peek((role, hashes[length - 1]))
+                if verdict and verdict.safety_assessment == SafetyAssessment.SAFE:
+                    return length
+        return 0
+
+    def _lookup(
+        self, role: str, messages: list[AnyMessage]
+    ) -> tuple[tuple[str, str], LlamaGuardOutput | None, str | None]:
+        """Return the cache key and either a cached verdict or the prompt to send."""
+        lines = self._conversation_lines(messages)
+        hashes = _prefix_hashes(lines)
+        key = (role, hashes[-1] if hashes else "")
+        cached = self.cache.get(key)
+        if cached is not None:
+            self.latency_saved_ms += self._avg_latency_ms()
+            return key, cached, None
+        skip = max(self._safe_prefix_length(hashes) - self.prefix_context, 0)
+        self.messages_skipped += skip
+        return key, None, self._compile_prompt(role, lines[skip:])
+
+    def _record(self, key: tuple[str, str], output: LlamaGuardOutput, started: float) -> None:
+        self.guard_calls += 1
+        self.guard_latency_ms += (time.perf_counter() - started) * 1000
+        # Errors may be transient, so only definite verdicts are cached
+        if output.safety_assessment != SafetyAssessment.ERROR:
+            self.cache.set(key, output)
+
+    def _avg_latency_ms(self) -> float:
+        return self.guard_latency_ms / self.guard_calls if self.guard_calls else 0.0
+
     def invoke(self, role: str, messages: list[AnyMessage]) -> LlamaGuardOutput:
         if self.model is None:
             return LlamaGuardOutput(safety_assessment=SafetyAssessment.SAFE)
-        compiled_prompt = self._compile_prompt(role, messages)
+        key, cached, compiled_prompt = self._lookup(role, messages)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
         result = self.model.invoke([HumanMessage(content=compiled_prompt)])
-        return parse_llama_guard_output(result.content)
+        output = parse_llama_guard_output(result.content)
+        self._record(key, output, started)
+        return output
 
     async def ainvoke(self, role: str, messages: list[AnyMessage]) -> LlamaGuardOutput:
         if self.model is None:
             return LlamaGuardOutput(safety_assessment=SafetyAssessment.SAFE)
-        compiled_prompt = self._compile_prompt(role, messages)
+        key, cached, compiled_prompt = self._lookup(role, messages)
+        if cached is not None:
+            return cached
+        started = time.perf_counter()
         result = await self.model.ainvoke([HumanMessage(content=compiled_prompt)])
-        return parse_llama_guard_output(result.content)
+        output = parse_llama_guard_output(result.content)
+        self._record(key, output, started)
+        return output
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **self.cache.stats(),
+            "guard_calls": self.guard_calls,
+            "avg_guard_latency_ms": self._avg_latency_ms(),
+            "latency_saved_ms": self.latency_saved_ms,
+            "messages_skipped": self.messages_skipped,
+        }
+
+
+@cache
+def get_llama_guard() -> LlamaGuard:
+    """Return the shared LlamaGuard instance, so verdicts are reused across requests."""
+    llama_guard = LlamaGuard()
+    register_metrics("llama_guard", llama_guard.stats)
+    return llama_guard
 
 
 if __name__ == "__main__":
@@ -1,19 +1,33 @@
+import asyncio
+from contextlib import aclosing
 from datetime import datetime
-from typing import Literal
+from typing import Any, Literal
 
 from langchain_community.tools import DuckDuckGoSearchResults, OpenWeatherMapQueryRun
 from langchain_community.utilities import OpenWeatherMapAPIWrapper
 from langchain_core.language_models.chat_models import BaseChatModel
-from langchain_core.messages import AIMessage, SystemMessage
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    SystemMessage,
+    message_chunk_to_message,
+)
 from langchain_core.runnables import RunnableConfig, RunnableLambda, RunnableSerializable
-from langgraph.checkpoint.memory import MemorySaver
 from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.managed import RemainingSteps
-from langgraph.prebuilt import ToolNode
-
-from agents.llama_guard import LlamaGuard, LlamaGuardOutput, SafetyAssessment
-from agents.tools import calculator
+from langgraph.types import StreamWriter
+
+from agents.context import ContextSummary, ContextWindow, estimate_tokens
+from agents.llama_guard import (
+    SAFETY_VERIFIED_KEY,
+    LlamaGuardOutput,
+    SafetyAssessment,
+    get_llama_guard,
+)
+from agents.tools import ParallelToolNode, cache_tool, calculator
 from core import get_model, settings
+from core.metrics import register_metrics
+from memory import get_checkpointer
 
 
 class AgentState(MessagesState, total=False):
@@ -24,9 +38,10 @@ class AgentState(MessagesState, total=False):
 
     safety: LlamaGuardOutput
     remaining_steps: RemainingSteps
+    context_summary: ContextSummary
 
 
-web_search = DuckDuckGoSearchResults(name="WebSearch")
+web_search = cache_tool(DuckDuckGoSearchResults(name="WebSearch"))
 tools = [web_search, calculator]
 
 # Add weather tool if API key is set
@@ -35,7 +50,7 @@ if settings.OPENWEATHERMAP_API_KEY:
     wrapper = OpenWeatherMapAPIWrapper(
         openweathermap_api_key=settings.OPENWEATHERMAP_API_KEY.get_secret_value()
     )
-    tools.append(OpenWeatherMapQueryRun(name="Weather", api_wrapper=wrapper))
+    tools.append(cache_tool(OpenWeatherMapQueryRun(name="Weather", api_wrapper=wrapper)))
 
 current_date = datetime.now().strftime("%B %d, %Y")
 instructions = f"""
@@ -68,32 +83,114 @@ def format_safety_message(safety: LlamaGuardOutput) -> AIMessage:
     return AIMessage(content=content)
 
 
-async def acall_model(state: AgentState, config: RunnableConfig) -> AgentState:
+# With stream_safety_check, the partial output is re-checked each time it grows by this much
+SAFETY_CHECK_INTERVAL = 200
+
+
+async def astream_model_guarded(
+    model_runnable: RunnableSerializable[AgentState, AIMessage],
+    state: AgentState,
+    config: RunnableConfig,
+    writer: StreamWriter,
+) -> tuple[AIMessage, LlamaGuardOutput]:
+    """
+    Stream the model while Llama Guard checks the partial output concurrently.
+
+    Each safe partial check is reported on the custom stream as the number of verified
+    characters, so /stream can release held-back tokens up to that point. Generation stops
+    early if a partial output is flagged as unsafe. The final check on the complete output
+    is a cache hit when nothing was generated after the last partial check.
+    """
+    llama_guard = get_llama_guard()
+
+    async def check_output(text: str) -> LlamaGuardOutput:
+        return await llama_guard.ainvoke("Agent", state["messages"] + [AIMessage(content=text)])
+
+    response: AIMessageChunk | None = None
+    check: asyncio.Task[LlamaGuardOutput] | None = None
+    checking = 0  # length of the output covered by the in-flight check
+    verified = 0
+    try:
+        async with aclosing(model_runnable.astream(state, config)) as stream:
+            async for chunk in stream:
+                response = chunk if response is None else response + chunk
+                if check and check.done():
+                    safety_output = check.result()
+                    check = None
+                    if safety_output.safety_assessment == SafetyAssessment.UNSAFE:
+                        return message_chunk_to_message(response), safety_output
+                    verified = checking
+                    writer({SAFETY_VERIFIED_KEY: verified})
+                text = response.text()
+                if check is None and len(text) - verified >= SAFETY_CHECK_INTERVAL:
+                    checking = len(text)
+                    check = asyncio.create_task(check_output(text))
+
+        if response is None:
+            response = AIMessageChunk(content="")
+        text = response.text()
+        if check and checking == len(text):
+            await check
+        safety_output = await check_output(text)
+        return message_chunk_to_message(response), safety_output
+    finally:
+        if check and not check.done():
+            check.cancel()
+
+
+async def acall_model(
+    state: AgentState, config: RunnableConfig, writer: StreamWriter
+) -> AgentState:
     m = get_model(config["configurable"].get("model", settings.DEFAULT_MODEL))
     model_runnable = wrap_model(m)
-    response = await model_runnable.ainvoke(state, config)
-
-    # Run llama guard check here to avoid returning the message if it's unsafe
-    llama_guard = LlamaGuard()
-    safety_output = await llama_guard.ainvoke("Agent", state["messages"] + [response])
+    update: dict[str, Any] = {}
+    if window := ContextWindow.from_config(config):
+        context, summary = await window.apply(
+            state["messages"],
+            model=m,
+            summary=state.get("context_summary"),
+            reserved_tokens=estimate_tokens([SystemMessage(content=instructions)]),
+            config=config,
+        )
+        if summary:
+            update["context_summary"] = summary
+        # The model sees the window, while the safety checks still see the whole conversation
+        model_runnable = (
+            RunnableLambda(
+                lambda model_state: {**model_state, "messages": context}, name="ContextWindow"
+            )
+            | model_runnable
+        )
+    if config["configurable"].get("stream_safety_check", False):
+        response, safety_output = await astream_model_guarded(model_runnable, state, config, writer)
+    else:
+        response = await model_runnable.ainvoke(state, config)
+        # Run llama guard check here to avoid returning the message if it's unsafe
+        llama_guard = get_llama_guard()
+        safety_output = await llama_guard.ainvoke("Agent", state["messages"] + [response])
     if safety_output.safety_assessment == SafetyAssessment.UNSAFE:
-        return {"messages": [format_safety_message(safety_output)], "safety": safety_output}
+        return {
+            **update,
+            "messages": [format_safety_message(safety_output)],
+            "safety": safety_output,
+        }
 
     if state["remaining_steps"] < 2 and response.tool_calls:
         return {
+            **update,
             "messages": [
                 AIMessage(
                     id=response.id,
                     content="Sorry, need more steps to process this request.",
                 )
-            ]
+            ],
         }
     # We return a list, because this will get added to the existing list
-    return {"messages": [response]}
+    return {**update, "messages": [response]}
 
 
 async def llama_guard_input(state: AgentState, config: RunnableConfig) -> AgentState:
-    llama_guard = LlamaGuard()
+    llama_guard = get_llama_guard()
     safety_output = await llama_guard.ainvoke("User", state["messages"])
     return {"safety": safety_output}
 
@@ -106,7 +203,14 @@ async def block_unsafe_content(state: AgentState, config: RunnableConfig) -> Age
 # Define the graph
 agent = StateGraph(AgentState)
 agent.add_node("model", acall_model)
-agent.add_node("tools", ToolNode(tools))
+tool_node = ParallelToolNode(
+    tools,
+    timeout=settings.TOOL_TIMEOUT,
+    timeouts=settings.TOOL_TIMEOUTS,
+    max_concurrency=settings.TOOL_MAX_CONCURRENCY,
+)
+register_metrics("tools", tool_node.stats)
+agent.add_node("tools", tool_node)
 agent.add_node("guard_input", llama_guard_input)
 agent.add_node("block_unsafe_content", block_unsafe_content)
 agent.set_entry_point("guard_input")
@@ -145,4 +249,4 @@ def pending_tool_calls(state: AgentState) -> Literal["tools", "done"]:
 
 agent.add_conditional_edges("model", pending_tool_calls, {"tools": "tools", "done": END})
 
-research_assistant = agent.compile(checkpointer=MemorySaver())
+research_assistant = agent.compile(checkpointer=get_checkpointer())
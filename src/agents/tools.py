@@ -1,8 +1,28 @@
+import asyncio
+import json
 import math
 import re
+import sqlite3
+import threading
+from collections import Counter
+from collections.abc import Callable, Sequence
+from functools import cache
+from typing import Any, Literal
+from uuid import uuid4
 
 import numexpr
-from langchain_core.tools import BaseTool, tool
+from langchain_core.callbacks import AsyncCallbackManagerForToolRun, CallbackManagerForToolRun
+from langchain_core.messages import ToolCall, ToolMessage
+from langchain_core.runnables import RunnableConfig
+from langchain_core.tools import BaseTool, ToolException, tool
+from langgraph.config import get_stream_writer
+from langgraph.prebuilt import ToolNode
+from langgraph.types import Command
+from pydantic import PrivateAttr
+
+from core import settings
+from core.cache import LRUCache, SqliteCache
+from core.metrics import register_metrics
 
 
 def calculator_func(expression: str) -> str:
@@ -38,3 +58,262 @@ def calculator_func(expression: str) -> str:
 
 calculator: BaseTool = tool(calculator_func)
 calculator.name = "Calculator"
+
+
+def normalize_tool_args(args: dict[str, Any]) -> str:
+    """
+    Cache key for tool arguments: keys sorted, strings lowercased with whitespace collapsed,
+    so that "Weather in  Paris" and "weather in paris" share a result.
+    """
+
+    def normalize(value: Any) -> Any:
+        if isinstance(value, str):
+            return " ".join(value.lower().split())
+        if isinstance(value, dict):
+            return {k: normalize(v) for k, v in value.items()}
+        if isinstance(value, list | tuple):
+            return [normalize(v) for v in value]
+        return value
+
+    return json.dumps(normalize(args), sort_keys=True, default=str)
+
+
+class CachedTool(BaseTool):
+    """
+    Wraps a tool to reuse its results for identical arguments within `ttl` seconds.
+
+    Results are cached in process, and in `store` when given, so that other processes can
+    reuse them. Concurrent calls with the same arguments share a single call to the wrapped
+    tool. Errors aren't cached.
+    """
+
+    tool: BaseTool
+    ttl: float
+    maxsize: int = 1024
+    store: SqliteCache | None = None
+
+    _cache: LRUCache[str, Any] = PrivateAttr()
+    _inflight: dict[str, asyncio.Task] = PrivateAttr(default_factory=dict)
+    _lock: threading.Lock = PrivateAttr(default_factory=threading.Lock)
+    _hits: int = PrivateAttr(default=0)
+    _store_hits: int = PrivateAttr(default=0)
+    _coalesced: int = PrivateAttr(default=0)
+    _calls: int = PrivateAttr(default=0)
+
+    def model_post_init(self, context: Any) -> None:
+        super().model_post_init(context)
+        self._cache = LRUCache(self.maxsize, ttl=self.ttl)
+
+    @classmethod
+    def wrap(
+        cls,
+        tool: BaseTool,
+        ttl: float,
+        maxsize: int = 1024,
+        store: SqliteCache | None = None,
+    ) -> "CachedTool":
+        return cls(
+            name=tool.name,
+            description=tool.description,
+            args_schema=tool.args_schema,
+            return_direct=tool.return_direct,
+            response_format=tool.response_format,
+            tool=tool,
+            ttl=ttl,
+            maxsize=maxsize,
+            store=store,
+        )
+
+    def _key(self, args: dict[str, Any]) -> str:
+        return f"{self.tool.name}:{normalize_tool_args(args)}"
+
+    def _tool_call(self, args: dict[str, Any]) -> ToolCall:
+        # Called with a tool call, the wrapped tool returns its artifact as well as its content
+        return ToolCall(name=self.tool.name, args=args, id=str(uuid4()), type="tool_call")
+
+    def _output(self, message: ToolMessage) -> Any:
+        if message.status == "error":
+            raise ToolException(message.content)
+        if self.response_format == "content_and_artifact":
+            return message.content, message.artifact
+        return message.content
+
+    def _from_store(self, value: Any) -> Any:
+        # JSON turns the (content, artifact) tuple into a list
+        if self.response_format == "content_and_artifact":
+            return tuple(value)
+        return value
+
+    def _cached(self, key: str) -> Any | None:
+        with self._lock:
+            value = self._cache.peek(key)
+            if value is not None:
+                self._hits += 1
+            return value
+
+    def _stored(self, key: str) -> Any | None:
+        try:
+            value = self.store.get(key)
+        except (ValueError, sqlite3.Error):
+            # A corrupt row, or the store is unavailable: call the wrapped tool instead
+            return None
+        if value is None:
+            return None
+        self._store_hits += 1
+        return self._from_store(value)
+
+    def _save(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._cache.set(key, value)
+        if self.store:
+            try:
+                self.store.set(key, value, self.ttl)
+            except (TypeError, ValueError, sqlite3.Error):
+                # Not JSON serializable, or the store is unavailable: the result is still
+                # cached in process
+                pass
+
+    def _run(self, run_manager: CallbackManagerForToolRun | None = None, **kwargs: Any) -> Any:
+        key = self._key(kwargs)
+        if (value := self._cached(key)) is not None:
+            return value
+        value = self._stored(key) if self.store else None
+        if value is None:
+            self._calls += 1
+            config = {"callbacks": run_manager.get_child()} if run_manager else None
+            value = self._output(self.tool.invoke(self._tool_call(kwargs), config))
+        self._save(key, value)
+        return value
+
+    async def _fetch(self, key: str, args: dict[str, Any], config: RunnableConfig | None) -> Any:
+        value = await asyncio.to_thread(self._stored, key) if self.store else None
+        if value is None:
+            self._calls += 1
+            value = self._output(await self.tool.ainvoke(self._tool_call(args), config))
+        if self.store:
+            await asyncio.to_thread(self._save, key, value)
+        else:
+            self._save(key, value)
+        return value
+
+    async def _arun(
+        self, run_manager: AsyncCallbackManagerForToolRun | None = None, **kwargs: Any
+    ) -> Any:
+        key = self._key(kwargs)
+        if (value := self._cached(key)) is not None:
+            return value
+        if task := self._inflight.get(key):
+            self._coalesced += 1
+        else:
+            config = {"callbacks": run_manager.get_child()} if run_manager else None
+            task = asyncio.create_task(self._fetch(key, kwargs, config))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # Shielded, so that one caller's cancellation doesn't fail the others
+        return await asyncio.shield(task)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self._hits + self._store_hits + self._coalesced + self._calls
+        return {
+            "size": len(self._cache),
+            "evictions": self._cache.evictions,
+            "hits": self._hits,
+            "store_hits": self._store_hits,
+            "coalesced": self._coalesced,
+            "misses": self._calls,
+            "hit_rate": (lookups - self._calls) / lookups if lookups else 0.0,
+        }
+
+
+_cached_tools: dict[str, CachedTool] = {}
+register_metrics("tool_cache", lambda: {name: tool.stats() for name, tool in _cached_tools.items()})
+
+
+@cache
+def get_tool_result_store() -> SqliteCache | None:
+    if not settings.TOOL_CACHE_SQLITE_PATH:
+        return None
+    return SqliteCache(settings.TOOL_CACHE_SQLITE_PATH, table="tool_results")
+
+
+def cache_tool(tool: BaseTool) -> BaseTool:
+    """Wrap `tool` in a CachedTool when TOOL_CACHE_TTL sets a TTL for it, else return it as is."""
+    ttl = settings.TOOL_CACHE_TTL.get(tool.name)
+    if not ttl:
+        return tool
+    cached = CachedTool.wrap(
+        tool, ttl, maxsize=settings.TOOL_CACHE_SIZE, store=get_tool_result_store()
+    )
+    _cached_tools[tool.name] = cached
+    return cached
+
+
+class ParallelToolNode(ToolNode):
+    """
+    ToolNode that bounds each tool's concurrency and duration.
+
+    The tool calls of a message run concurrently, as in ToolNode, but calls to a tool with a
+    limit in `max_concurrency` wait for one of its slots, shared by every run of the agent.
+    A call that doesn't finish within its tool's timeout, including the wait for a slot, gets
+    an error ToolMessage, so one hung call doesn't block the others or the turn. Each result
+    is written to the custom stream as soon as it's ready.
+    """
+
+    def __init__(
+        self,
+        tools: Sequence[BaseTool | Callable],
+        *,
+        timeout: float | None = None,
+        timeouts: dict[str, float] | None = None,
+        max_concurrency: dict[str, int] | None = None,
+        **kwargs: Any,
+    ) -> None:
+        super().__init__(tools, **kwargs)
+        self.timeout = timeout
+        self.timeouts = timeouts or {}
+        self._semaphores = {
+            name: asyncio.Semaphore(limit) for name, limit in (max_concurrency or {}).items()
+        }
+        self.calls: Counter[str] = Counter()
+        self.timed_out: Counter[str] = Counter()
+
+    async def _arun_limited(
+        self,
+        call: ToolCall,
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage | Command:
+        semaphore = self._semaphores.get(call["name"])
+        if semaphore is None:
+            return await super()._arun_one(call, input_type, config)
+        async with semaphore:
+            return await super()._arun_one(call, input_type, config)
+
+    async def _arun_one(
+        self,
+        call: ToolCall,
+        input_type: Literal["list", "dict", "tool_calls"],
+        config: RunnableConfig,
+    ) -> ToolMessage | Command:
+        self.calls[call["name"]] += 1
+        timeout = self.timeouts.get(call["name"], self.timeout)
+        try:
+            output = await asyncio.wait_for(self._arun_limited(call, input_type, config), timeout)
+        except TimeoutError:
+            self.timed_out[call["name"]] += 1
+            output = ToolMessage(
+                content=f"Error: {call['name']} didn't respond within {timeout:g} seconds. "
+                "Continue without this result, or try again.",
+                name=call["name"],
+                tool_call_id=call["id"],
+                status="error",
+            )
+        if isinstance(output, ToolMessage):
+            get_stream_writer()(output)
+        return output
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            name: {"calls": calls, "timed_out": self.timed_out[name]}
+            for name, calls in self.calls.items()
+        }
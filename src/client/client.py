@@ -1,11 +1,15 @@
+import asyncio
 import json
 import os
 from collections.abc import AsyncGenerator, Generator
-from typing import Any
+from types import TracebackType
+from typing import Any, Self
 
 import httpx
 
 from schema import (
+    BatchInput,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
@@ -21,7 +25,14 @@ class AgentClientError(Exception):
 
 
 class AgentClient:
-    """Client for interacting with the agent service."""
+    """
+    Client for interacting with the agent service.
+
+    The client keeps its HTTP connections open between requests. Use it as a context
+    manager, or call close() / aclose() when done, to release them. Asynchronous requests
+    have a pool per event loop, which can only be closed while its loop is open: call
+    aclose() before the loop ends, e.g. at the end of the coroutine passed to asyncio.run.
+    """
 
     def __init__(
         self,
@@ -29,6 +40,10 @@ class AgentClient:
         agent: str = None,
         timeout: float | None = None,
         get_info: bool = True,
+        max_connections: int | None = 100,
+        max_keepalive_connections: int | None = 20,
+        keepalive_expiry: float | None = 5.0,
+        http2: bool = False,
     ) -> None:
         """
         Initialize the client.
@@ -39,10 +54,27 @@ class AgentClient:
             timeout (float, optional): The timeout for requests.
             get_info (bool, optional): Whether to fetch agent information on init.
                 Default: True
+            max_connections (int, optional): Maximum number of concurrent connections.
+                Default: 100
+            max_keepalive_connections (int, optional): Maximum number of idle connections
+                kept open for reuse. Default: 20
+            keepalive_expiry (float, optional): Seconds an idle connection is kept open.
+                Default: 5.0
+            http2 (bool, optional): Use HTTP/2 when the service supports it. Requires
+                the h2 package (`pip install httpx[http2]`). Default: False
         """
         self.base_url = base_url
         self.auth_secret = os.getenv("AUTH_SECRET")
         self.timeout = timeout
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=keepalive_expiry,
+        )
+        self.http2 = http2
+        self._client: httpx.Client | None = None
+        # Connections belong to the event loop that opened them, so each loop gets its own pool
+        self._aclients: dict[asyncio.AbstractEventLoop, httpx.AsyncClient] = {}
         self.info: ServiceMetadata | None = None
         self.agent: str | None = None
         if get_info:
@@ -57,9 +89,74 @@ class AgentClient:
             headers["Authorization"] = f"Bearer {self.auth_secret}"
         return headers
 
+    @property
+    def client(self) -> httpx.Client:
+        """The pooled HTTP client used for synchronous requests."""
+        if self._client is None:
+            self._client = httpx.Client(limits=self.limits, http2=self.http2)
+        return self._client
+
+    @property
+    def aclient(self) -> httpx.AsyncClient:
+        """The pooled HTTP client used for asynchronous requests from the running event loop."""
+        loop = asyncio.get_running_loop()
+        if loop not in self._aclients:
+            # A client used from a new loop (e.g. each Streamlit rerun calls asyncio.run) needs
+            # a new pool. The pools of loops closed since then can only be dropped.
+            for closed in [other for other in self._aclients if other.is_closed()]:
+                del self._aclients[closed]
+            self._aclients[loop] = httpx.AsyncClient(limits=self.limits, http2=self.http2)
+        return self._aclients[loop]
+
+    def _close_aclients(self) -> None:
+        """Close the asynchronous clients from their event loops, where they're still open."""
+        aclients, self._aclients = self._aclients, {}
+        for loop, aclient in aclients.items():
+            if loop.is_closed():
+                continue
+            if loop.is_running():
+                asyncio.run_coroutine_threadsafe(aclient.aclose(), loop)
+            else:
+                loop.run_until_complete(aclient.aclose())
+
+    def close(self) -> None:
+        """Close the connections of the synchronous and asynchronous clients."""
+        self._close_aclients()
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+    async def aclose(self) -> None:
+        """Close the connections of the synchronous and asynchronous clients."""
+        if (aclient := self._aclients.pop(asyncio.get_running_loop(), None)) is not None:
+            await aclient.aclose()
+        self.close()
+
+    def __enter__(self) -> Self:
+        return self
+
+    def __exit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        self.close()
+
+    async def __aenter__(self) -> Self:
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: type[BaseException] | None,
+        exc_value: BaseException | None,
+        traceback: TracebackType | None,
+    ) -> None:
+        await self.aclose()
+
     def retrieve_info(self) -> None:
         try:
-            response = httpx.get(
+            response = self.client.get(
                 f"{self.base_url}/info",
                 headers=self._headers,
                 timeout=self.timeout,
@@ -111,17 +208,16 @@ class AgentClient:
             request.model = model
         if agent_config:
             request.agent_config = agent_config
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/{self.agent}/invoke",
-                    json=request.model_dump(),
-                    headers=self._headers,
-                    timeout=self.timeout,
-                )
-                response.raise_for_status()
-            except httpx.HTTPError as e:
-                raise AgentClientError(f"Error: {e}")
+        try:
+            response = await self.aclient.post(
+                f"{self.base_url}/{self.agent}/invoke",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
 
         return ChatMessage.model_validate(response.json())
 
@@ -154,7 +250,7 @@ class AgentClient:
         if agent_config:
             request.agent_config = agent_config
         try:
-            response = httpx.post(
+            response = self.client.post(
                 f"{self.base_url}/{self.agent}/invoke",
                 json=request.model_dump(),
                 headers=self._headers,
@@ -197,6 +293,7 @@ class AgentClient:
         thread_id: str | None = None,
         agent_config: dict[str, Any] | None = None,
         stream_tokens: bool = True,
+        token_batch_ms: int | None = None,
     ) -> Generator[ChatMessage | str, None, None]:
         """
         Stream the agent's response synchronously.
@@ -212,13 +309,17 @@ class AgentClient:
             agent_config (dict[str, Any], optional): Additional configuration to pass through to the agent
             stream_tokens (bool, optional): Stream tokens as they are generated
                 Default: True
+            token_batch_ms (int, optional): Coalesce streamed tokens into chunks sent at most
+                every this many milliseconds, reducing per-token overhead
 
         Returns:
             Generator[ChatMessage | str, None, None]: The response from the agent
         """
         if not self.agent:
             raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
-        request = StreamInput(message=message, stream_tokens=stream_tokens)
+        request = StreamInput(
+            message=message, stream_tokens=stream_tokens, token_batch_ms=token_batch_ms
+        )
         if thread_id:
             request.thread_id = thread_id
         if model:
@@ -226,7 +327,7 @@ class AgentClient:
         if agent_config:
             request.agent_config = agent_config
         try:
-            with httpx.stream(
+            with self.client.stream(
                 "POST",
                 f"{self.base_url}/{self.agent}/stream",
                 json=request.model_dump(),
@@ -250,6 +351,7 @@ class AgentClient:
         thread_id: str | None = None,
         agent_config: dict[str, Any] | None = None,
         stream_tokens: bool = True,
+        token_batch_ms: int | None = None,
     ) -> AsyncGenerator[ChatMessage | str, None]:
         """
         Stream the agent's response asynchronously.
@@ -265,37 +367,143 @@ class AgentClient:
             agent_config (dict[str, Any], optional): Additional configuration to pass through to the agent
             stream_tokens (bool, optional): Stream tokens as they are generated
                 Default: True
+            token_batch_ms (int, optional): Coalesce streamed tokens into chunks sent at most
+                every this many milliseconds, reducing per-token overhead
 
         Returns:
             AsyncGenerator[ChatMessage | str, None]: The response from the agent
         """
         if not self.agent:
             raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
-        request = StreamInput(message=message, stream_tokens=stream_tokens)
+        request = StreamInput(
+            message=message, stream_tokens=stream_tokens, token_batch_ms=token_batch_ms
+        )
         if thread_id:
             request.thread_id = thread_id
         if model:
             request.model = model
         if agent_config:
             request.agent_config = agent_config
-        async with httpx.AsyncClient() as client:
-            try:
-                async with client.stream(
-                    "POST",
-                    f"{self.base_url}/{self.agent}/stream",
-                    json=request.model_dump(),
-                    headers=self._headers,
-                    timeout=self.timeout,
-                ) as response:
-                    response.raise_for_status()
-                    async for line in response.aiter_lines():
-                        if line.strip():
-                            parsed = self._parse_stream_line(line)
-                            if parsed is None:
-                                break
-                            yield parsed
-            except httpx.HTTPError as e:
-                raise AgentClientError(f"Error: {e}")
+        try:
+            async with self.aclient.stream(
+                "POST",
+                f"{self.base_url}/{self.agent}/stream",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        parsed = self._parse_stream_line(line)
+                        if parsed is None:
+                            break
+                        yield parsed
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
+
+    def _batch_request(
+        self,
+        inputs: list[str | UserInput],
+        model: str | None,
+        agent_config: dict[str, Any] | None,
+        concurrency: int | None,
+    ) -> BatchInput:
+        if not self.agent:
+            raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
+        user_inputs = []
+        for item in inputs:
+            if isinstance(item, str):
+                item = UserInput(message=item)
+                if model:
+                    item.model = model
+                if agent_config:
+                    item.agent_config = agent_config
+            user_inputs.append(item)
+        request = BatchInput(inputs=user_inputs)
+        if concurrency:
+            request.concurrency = concurrency
+        return request
+
+    def batch(
+        self,
+        inputs: list[str | UserInput],
+        model: str | None = None,
+        agent_config: dict[str, Any] | None = None,
+        concurrency: int | None = None,
+    ) -> Generator[BatchResult, None, None]:
+        """
+        Invoke the agent with many inputs in a single request.
+
+        The service runs the inputs concurrently and results are yielded as each one
+        completes, so they may arrive out of order; use BatchResult.index to match them up.
+        A failed input yields a BatchResult with `error` set instead of raising.
+
+        Args:
+            inputs (list[str | UserInput]): Messages to send to the agent, or full UserInputs
+                for per-input model, thread_id or agent_config
+            model (str, optional): LLM model to use for the message inputs
+            agent_config (dict[str, Any], optional): Additional configuration to pass through
+                to the agent for the message inputs
+            concurrency (int, optional): Maximum number of inputs the service runs at once
+
+        Returns:
+            Generator[BatchResult, None, None]: The result of each input
+        """
+        request = self._batch_request(inputs, model, agent_config, concurrency)
+        try:
+            with self.client.stream(
+                "POST",
+                f"{self.base_url}/{self.agent}/batch",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            ) as response:
+                response.raise_for_status()
+                for line in response.iter_lines():
+                    if line.strip():
+                        yield BatchResult.model_validate_json(line)
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
+
+    async def abatch(
+        self,
+        inputs: list[str | UserInput],
+        model: str | None = None,
+        agent_config: dict[str, Any] | None = None,
+        concurrency: int | None = None,
+    ) -> AsyncGenerator[BatchResult, None]:
+        """
+        Invoke the agent with many inputs in a single request, asynchronously.
+
+        See batch() for details.
+
+        Args:
+            inputs (list[str | UserInput]): Messages to send to the agent, or full UserInputs
+                for per-input model, thread_id or agent_config
+            model (str, optional): LLM model to use for the message inputs
+            agent_config (dict[str, Any], optional): Additional configuration to pass through
+                to the agent for the message inputs
+            concurrency (int, optional): Maximum number of inputs the service runs at once
+
+        Returns:
+            AsyncGenerator[BatchResult, None]: The result of each input
+        """
+        request = self._batch_request(inputs, model, agent_config, concurrency)
+        try:
+            async with self.aclient.stream(
+                "POST",
+                f"{self.base_url}/{self.agent}/batch",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            ) as response:
+                response.raise_for_status()
+                async for line in response.aiter_lines():
+                    if line.strip():
+                        yield BatchResult.model_validate_json(line)
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
 
     async def acreate_feedback(
         self, run_id: str, key: str, score: float, kwargs: dict[str, Any] = {}
@@ -308,33 +516,39 @@ class AgentClient:
         See: https://api.smith.langchain.com/redoc#tag/feedback/operation/create_feedback_api_v1_feedback_post
         """
         request = Feedback(run_id=run_id, key=key, score=score, kwargs=kwargs)
-        async with httpx.AsyncClient() as client:
-            try:
-                response = await client.post(
-                    f"{self.base_url}/feedback",
-                    json=request.model_dump(),
-                    headers=self._headers,
-                    timeout=self.timeout,
-                )
-                response.raise_for_status()
-                response.json()
-            except httpx.HTTPError as e:
-                raise AgentClientError(f"Error: {e}")
+        try:
+            response = await self.aclient.post(
+                f"{self.base_url}/feedback",
+                json=request.model_dump(),
+                headers=self._headers,
+                timeout=self.timeout,
+            )
+            response.raise_for_status()
+            response.json()
+        except httpx.HTTPError as e:
+            raise AgentClientError(f"Error: {e}")
 
     def get_history(
         self,
         thread_id: str,
+        limit: int | None = None,
+        before: int | None = None,
     ) -> ChatHistory:
         """
         Get chat history.
 
         Args:
             thread_id (str, optional): Thread ID for identifying a conversation
+            limit (int, optional): Maximum number of messages to return, most recent first page
+            before (int, optional): Only return messages before this index, e.g. the
+                `next_before` cursor of a previously fetched page
         """
-        request = ChatHistoryInput(thread_id=thread_id)
+        if not self.agent:
+            raise AgentClientError("No agent selected. Use update_agent() to select an agent.")
+        request = ChatHistoryInput(thread_id=thread_id, limit=limit, before=before)
         try:
-            response = httpx.post(
-                f"{self.base_url}/history",
+            response = self.client.post(
+                f"{self.base_url}/{self.agent}/history",
                 json=request.model_dump(),
                 headers=self._headers,
                 timeout=self.timeout,
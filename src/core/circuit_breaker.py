@@ -0,0 +1,241 @@
+import time
+from collections.abc import AsyncIterator, Sequence
+from enum import StrEnum
+from typing import Any
+
+import httpx
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.messages import BaseMessage
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig
+
+from core.metrics import register_metrics
+from core.settings import settings
+from core.wrappers import ChatModelWrapper
+from schema.models import Provider
+
+# The fallback's response is reported by the breaker's own run, as the wrapped model's would be
+_NO_CALLBACKS: RunnableConfig = {"callbacks": []}
+
+
+# Connection and timeout errors of the provider SDKs, matched by name since the SDKs are only
+# imported once their models are used: openai, anthropic and groq, then botocore
+_TRANSIENT_ERRORS = {
+    "APIConnectionError",
+    "ConnectTimeoutError",
+    "EndpointConnectionError",
+    "ReadTimeoutError",
+}
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """
+    Whether `error` says the provider is unavailable: a timeout, a connection error, or a
+    429 or 5xx response. Other errors, such as invalid requests, are the caller's.
+    """
+    if isinstance(error, TimeoutError | ConnectionError | httpx.TransportError):
+        return True
+    if any(cls.__name__ in _TRANSIENT_ERRORS for cls in type(error).__mro__):
+        return True
+    # SDK status errors carry the status code, or the response it came from
+    status_code = getattr(error, "status_code", None)
+    if status_code is None:
+        status_code = getattr(getattr(error, "response", None), "status_code", None)
+    if status_code is None and isinstance(code := getattr(error, "code", None), int):
+        # google.api_core errors
+        status_code = code
+    return isinstance(status_code, int) and (status_code == 429 or status_code >= 500)
+
+
+class CircuitState(StrEnum):
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """A call was rejected because its provider's circuit is open."""
+
+
+class CircuitBreaker:
+    """
+    Tracks the health of a provider from the outcome of its calls.
+
+    After `failure_threshold` consecutive failures the circuit opens, and calls are rejected
+    without reaching the provider. Calls slower than `slow_call_seconds` count as failures.
+    Once `reset_timeout` seconds have passed, a single probe call is let through: the circuit
+    closes if it succeeds, and opens again if it fails. Only errors that say the provider is
+    unavailable count as failures, see is_transient_error.
+    """
+
+    def __init__(
+        self,
+        failure_threshold: int,
+        reset_timeout: float = 30,
+        slow_call_seconds: float | None = None,
+    ) -> None:
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.slow_call_seconds = slow_call_seconds
+        self.state = CircuitState.CLOSED
+        self.consecutive_failures = 0
+        self._opened_at = 0.0
+        self._probing = False
+        self.opened = 0
+        self.rejected = 0
+
+    def allow(self) -> bool:
+        """Whether a call may go to the provider now. Every allowed call must be recorded."""
+        if self.state == CircuitState.OPEN:
+            if time.monotonic() - self._opened_at < self.reset_timeout:
+                self.rejected += 1
+                return False
+            self.state = CircuitState.HALF_OPEN
+        if self.state == CircuitState.HALF_OPEN:
+            if self._probing:
+                self.rejected += 1
+                return False
+            self._probing = True
+        return True
+
+    def _open(self) -> None:
+        self.state = CircuitState.OPEN
+        self._opened_at = time.monotonic()
+        self.opened += 1
+
+    def record_success(self, seconds: float) -> None:
+        if self.slow_call_seconds is not None and seconds > self.slow_call_seconds:
+            self.record_failure()
+            return
+        self._probing = False
+        self.consecutive_failures = 0
+        self.state = CircuitState.CLOSED
+
+    def record_failure(self) -> None:
+        self._probing = False
+        self.consecutive_failures += 1
+        if self.state == CircuitState.HALF_OPEN or (
+            self.state == CircuitState.CLOSED
+            and self.consecutive_failures >= self.failure_threshold
+        ):
+            self._open()
+
+    def record_ignored(self) -> None:
+        # A cancelled call, or one that failed through no fault of the provider, says nothing
+        # about its health, but frees the probe slot
+        self._probing = False
+
+    def stats(self) -> dict[str, Any]:
+        retry_in = None
+        if self.state == CircuitState.OPEN:
+            retry_in = max(self.reset_timeout - (time.monotonic() - self._opened_at), 0.0)
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "rejected": self.rejected,
+            "retry_in": retry_in,
+        }
+
+
+class CircuitBreakerChatModel(ChatModelWrapper):
+    """
+    Chat model whose async calls go through `breaker`.
+
+    While the circuit is open, calls are sent to `fallback`, which has its own tools bound,
+    or fail with a CircuitOpenError. Streams count as slow from the time to their first chunk,
+    and as failed if they raise a transient error before finishing. Blocking calls bypass the
+    breaker.
+    """
+
+    breaker: CircuitBreaker
+    provider: Provider
+    fallback: Runnable | None = None
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> Runnable:
+        if self.fallback is None:
+            return super().bind_tools(tools, **kwargs)
+        with_fallback = self.model_copy(
+            update={"fallback": self.fallback.bind_tools(tools, **kwargs)}
+        )
+        return ChatModelWrapper.bind_tools(with_fallback, tools, **kwargs)
+
+    def _rejected(self) -> CircuitOpenError:
+        retry_in = self.breaker.stats()["retry_in"] or 0
+        return CircuitOpenError(
+            f"{self.provider} is unavailable, its circuit is open. Retry in {retry_in:.0f}s"
+        )
+
+    def _record_error(self, error: BaseException) -> None:
+        if is_transient_error(error):
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_ignored()
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise self._rejected()
+            # The fallback's own bound arguments replace those of the wrapped model
+            message = await self.fallback.ainvoke(messages, _NO_CALLBACKS, stop=stop)
+            return ChatResult(generations=[ChatGeneration(message=message)])
+        start = time.monotonic()
+        try:
+            result = await self.model._agenerate(
+                messages, stop=stop, run_manager=run_manager, **kwargs
+            )
+        except BaseException as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success(time.monotonic() - start)
+        return result
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        if not self.breaker.allow():
+            if self.fallback is None:
+                raise self._rejected()
+            async for message in self.fallback.astream(messages, _NO_CALLBACKS, stop=stop):
+                yield ChatGenerationChunk(message=message)
+            return
+        start = time.monotonic()
+        first_chunk_seconds = None
+        try:
+            async for chunk in self.model._astream(messages, stop=stop, **kwargs):
+                if first_chunk_seconds is None:
+                    first_chunk_seconds = time.monotonic() - start
+                yield chunk
+        except BaseException as e:
+            self._record_error(e)
+            raise
+        self.breaker.record_success(first_chunk_seconds or time.monotonic() - start)
+
+
+_breakers: dict[Provider, CircuitBreaker] = {}
+register_metrics(
+    "circuit_breakers", lambda: {provider: b.stats() for provider, b in _breakers.items()}
+)
+
+
+def get_circuit_breaker(provider: Provider) -> CircuitBreaker | None:
+    """The breaker shared by the models of `provider`, or None when breakers are disabled."""
+    if not settings.CIRCUIT_BREAKER_FAILURES:
+        return None
+    if provider not in _breakers:
+        _breakers[provider] = CircuitBreaker(
+            settings.CIRCUIT_BREAKER_FAILURES,
+            reset_timeout=settings.CIRCUIT_BREAKER_RESET_TIMEOUT,
+            slow_call_seconds=settings.CIRCUIT_BREAKER_SLOW_CALL,
+        )
+    return _breakers[provider]
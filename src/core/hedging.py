@@ -0,0 +1,222 @@
+import asyncio
+import time
+from collections import Counter, deque
+from collections.abc import AsyncIterator, Sequence
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.language_models.chat_models import BaseChatModel, agenerate_from_stream
+from langchain_core.messages import BaseMessage, BaseMessageChunk
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+from langchain_core.runnables import Runnable, RunnableConfig
+from pydantic import ConfigDict, Field
+
+from core.metrics import register_metrics
+
+# Percentiles are only used once a model has this many samples
+MIN_SAMPLES = 5
+# Calls to the models are left out of the caller's callbacks, so that only the response
+# that wins is streamed and traced
+_NO_CALLBACKS: RunnableConfig = {"callbacks": []}
+
+
+class LatencyTracker:
+    """Time to first token of a model's recent calls."""
+
+    def __init__(self, window: int = 100) -> None:
+        self.samples: deque[float] = deque(maxlen=window)
+        self.errors = 0
+
+    def record(self, seconds: float) -> None:
+        self.samples.append(seconds)
+
+    def percentile(self, q: float) -> float | None:
+        if len(self.samples) < MIN_SAMPLES:
+            return None
+        ordered = sorted(self.samples)
+        return ordered[min(int(q * len(ordered)), len(ordered) - 1)]
+
+    def stats(self) -> dict[str, Any]:
+        p50, p95 = self.percentile(0.5), self.percentile(0.95)
+        return {
+            "samples": len(self.samples),
+            "p50_ms": p50 * 1000 if p50 is not None else None,
+            "p95_ms": p95 * 1000 if p95 is not None else None,
+            "errors": self.errors,
+        }
+
+
+_latencies: dict[str, LatencyTracker] = {}
+register_metrics("model_latency", lambda: {name: t.stats() for name, t in _latencies.items()})
+
+
+def get_latency_tracker(model_name: str) -> LatencyTracker:
+    """The tracker shared by every call to `model_name`."""
+    return _latencies.setdefault(model_name, LatencyTracker())
+
+
+class _Attempt:
+    """A streaming call to one model, started in a task that waits for its first chunk."""
+
+    def __init__(
+        self,
+        name: str,
+        model: Runnable,
+        messages: list[BaseMessage],
+        stop: list[str] | None,
+        kwargs: dict[str, Any],
+    ) -> None:
+        self.name = name
+        self.stream = model.astream(messages, _NO_CALLBACKS, stop=stop, **kwargs)
+        self.started = time.perf_counter()
+        self.first: asyncio.Task[BaseMessageChunk | None] = asyncio.create_task(self._first_chunk())
+
+    async def _first_chunk(self) -> BaseMessageChunk | None:
+        return await anext(self.stream, None)
+
+    @property
+    def elapsed(self) -> float:
+        return time.perf_counter() - self.started
+
+    async def cancel(self) -> None:
+        self.first.cancel()
+        await asyncio.wait({self.first})
+        await self.stream.aclose()
+
+
+class HedgedChatModel(BaseChatModel):
+    """
+    Chat model that sends each call to the fastest of `models`, and hedges slow calls.
+
+    The models are ranked by their median time to first token, with models that don't have
+    enough samples yet tried first. If the first model doesn't stream a token within its p95,
+    capped at `hedge_after` seconds, the call is also sent to the next model, and the model
+    that streams first answers while the other call is cancelled. A model that fails before
+    its first token, or ends its stream without one, is replaced by the next one. Errors
+    after the first token are raised, as the response can't be switched midway.
+
+    Blocking calls go to the first ranked model without hedging.
+    """
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    models: dict[str, Runnable]
+    hedge_after: float = 2.0
+    counts: Counter[str] = Field(default_factory=Counter)
+
+    @property
+    def _llm_type(self) -> str:
+        return "hedged"
+
+    @property
+    def _identifying_params(self) -> dict[str, Any]:
+        return {"models": list(self.models)}
+
+    def bind_tools(self, tools: Sequence[Any], **kwargs: Any) -> "HedgedChatModel":
+        # Each model binds the tools in its own format. The copy shares the counts.
+        bound = {name: model.bind_tools(tools, **kwargs) for name, model in self.models.items()}
+        return self.model_copy(update={"models": bound})
+
+    def ranked(self) -> list[str]:
+        return sorted(self.models, key=lambda name: get_latency_tracker(name).percentile(0.5) or 0)
+
+    def _hedge_delay(self, name: str) -> float:
+        p95 = get_latency_tracker(name).percentile(0.95)
+        return min(p95, self.hedge_after) if p95 is not None else self.hedge_after
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        model = self.models[self.ranked()[0]]
+        message = model.invoke(messages, _NO_CALLBACKS, stop=stop, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        return await agenerate_from_stream(self._astream(messages, stop, **kwargs))
+
+    async def _race(
+        self, messages: list[BaseMessage], stop: list[str] | None, kwargs: dict[str, Any]
+    ) -> tuple[_Attempt, BaseMessageChunk]:
+        """Start the call, hedging or replacing it as needed, until a model streams a chunk."""
+        ranked = self.ranked()
+        candidates = iter(ranked)
+        attempts: dict[asyncio.Task, _Attempt] = {}
+        errors: list[BaseException] = []
+        hedged = False
+
+        def start_next() -> bool:
+            if (name := next(candidates, None)) is None:
+                return False
+            attempt = _Attempt(name, self.models[name], messages, stop, kwargs)
+            attempts[attempt.first] = attempt
+            return True
+
+        start_next()
+        delay = self._hedge_delay(ranked[0])
+        try:
+            while attempts:
+                done, _ = await asyncio.wait(
+                    attempts,
+                    timeout=None if hedged else delay,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if not done:
+                    hedged = True
+                    if start_next():
+                        self.counts["hedged"] += 1
+                    continue
+                for task in done:
+                    attempt = attempts.pop(task)
+                    if task.exception() is None and task.result() is not None:
+                        get_latency_tracker(attempt.name).record(attempt.elapsed)
+                        if attempt.name != ranked[0]:
+                            self.counts["primary_lost"] += 1
+                        return attempt, task.result()
+                    # An empty response can't answer the call any more than an error can
+                    get_latency_tracker(attempt.name).errors += 1
+                    errors.append(
+                        task.exception() or ValueError(f"{attempt.name} returned no response")
+                    )
+                # Replace the failed call, unless another is still running
+                if not attempts and start_next():
+                    self.counts["fallbacks"] += 1
+            raise errors[0]
+        finally:
+            for attempt in attempts.values():
+                # Cancelled calls count with the time they took so far, so that a model that
+                # keeps losing is ranked lower
+                get_latency_tracker(attempt.name).record(attempt.elapsed)
+                await attempt.cancel()
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        attempt, first = await self._race(messages, stop, kwargs)
+        self.counts["calls"] += 1
+        try:
+            yield ChatGenerationChunk(message=first)
+            async for chunk in attempt.stream:
+                yield ChatGenerationChunk(message=chunk)
+        finally:
+            await attempt.stream.aclose()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            **dict(self.counts),
+            "ranked": self.ranked(),
+            "models": {name: get_latency_tracker(name).stats() for name in self.models},
+        }
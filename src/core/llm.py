@@ -1,16 +1,17 @@
 from functools import cache
-from typing import TypeAlias
+from typing import TYPE_CHECKING, TypeAlias
 
-from langchain_anthropic import ChatAnthropic
-from langchain_aws import ChatBedrock
 from langchain_community.chat_models import FakeListChatModel
-from langchain_google_genai import ChatGoogleGenerativeAI
-from langchain_groq import ChatGroq
-from langchain_ollama import ChatOllama
-from langchain_openai import AzureChatOpenAI, ChatOpenAI
+from langchain_core.language_models.chat_models import BaseChatModel
 
+from core.circuit_breaker import CircuitBreakerChatModel, get_circuit_breaker
+from core.hedging import HedgedChatModel
+from core.llm_cache import CachedChatModel, cache_model
+from core.metrics import register_metrics
+from core.rate_limit import RateLimitedChatModel, get_rate_limiter
 from core.settings import settings
 from schema.models import (
+    MODEL_PROVIDERS,
     AllModelEnum,
     AnthropicModelName,
     AWSModelName,
@@ -21,8 +22,20 @@ from schema.models import (
     GroqModelName,
     OllamaModelName,
     OpenAIModelName,
+    Provider,
+    VirtualModelName,
 )
 
+# Provider SDKs take seconds to import between them, so each is imported by _get_model the
+# first time one of its models is needed
+if TYPE_CHECKING:
+    from langchain_anthropic import ChatAnthropic
+    from langchain_aws import ChatBedrock
+    from langchain_google_genai import ChatGoogleGenerativeAI
+    from langchain_groq import ChatGroq
+    from langchain_ollama import ChatOllama
+    from langchain_openai import ChatOpenAI
+
 _MODEL_TABLE = {
     OpenAIModelName.GPT_4O_MINI: "gpt-4o-mini",
     OpenAIModelName.GPT_4O: "gpt-4o",
@@ -45,7 +58,7 @@ _MODEL_TABLE = {
 }
 
 ModelT: TypeAlias = (
-    ChatOpenAI | ChatAnthropic | ChatGoogleGenerativeAI | ChatGroq | ChatBedrock | ChatOllama
+    "ChatOpenAI | ChatAnthropic | ChatGoogleGenerativeAI | ChatGroq | ChatBedrock | ChatOllama"
 )
 
 
@@ -57,8 +70,62 @@ class FakeToolModel(FakeListChatModel):
         return self
 
 
+def get_provider(model_name: AllModelEnum) -> Provider:
+    for model_enum, provider in MODEL_PROVIDERS.items():
+        if model_name in model_enum:
+            return provider
+    raise ValueError(f"Unsupported model: {model_name}")
+
+
 @cache
-def get_model(model_name: AllModelEnum, /) -> ModelT:
+def get_model(
+    model_name: AllModelEnum, /
+) -> "ModelT | RateLimitedChatModel | CircuitBreakerChatModel | CachedChatModel | HedgedChatModel":
+    """
+    The chat model for `model_name`, behind its provider's rate limits if PROVIDER_RPM or
+    PROVIDER_TPM set any, its provider's circuit breaker if CIRCUIT_BREAKER_FAILURES is set,
+    and a response cache if LLM_CACHE_TTL sets one. Cached responses don't count against the
+    rate limits, and are served while the circuit is open. The hedged model routes each call
+    between the models of HEDGED_MODELS.
+    """
+    if model_name == VirtualModelName.HEDGED:
+        if len(settings.HEDGED_MODELS) < 2:
+            raise ValueError("HEDGED_MODELS must list at least two models")
+        hedged = HedgedChatModel(
+            models={name: get_model(name) for name in settings.HEDGED_MODELS},
+            hedge_after=settings.HEDGE_AFTER,
+        )
+        register_metrics("hedged_model", hedged.stats)
+        return hedged
+    return _guarded_model(model_name)
+
+
+def _guarded_model(model_name: AllModelEnum, with_fallback: bool = True) -> BaseChatModel:
+    """
+    The model behind its provider's rate limits and circuit breaker, and its response cache.
+    Fallback models (`with_fallback=False`) are built without a cache: they're called from
+    within the primary model's cache, and the model itself has its own from get_model.
+    """
+    model = _get_model(model_name)
+    provider = get_provider(model_name)
+    if limiter := get_rate_limiter(provider):
+        model = RateLimitedChatModel(model=model, limiter=limiter)
+    if breaker := get_circuit_breaker(provider):
+        # Fallback models don't have fallbacks of their own, so that providers can fall back
+        # to each other
+        fallback_name = settings.CIRCUIT_BREAKER_FALLBACK.get(provider) if with_fallback else None
+        model = CircuitBreakerChatModel(
+            model=model,
+            breaker=breaker,
+            provider=provider,
+            fallback=_guarded_model(fallback_name, with_fallback=False) if fallback_name else None,
+        )
+    if not with_fallback:
+        return model
+    return cache_model(model, model_name)
+
+
+def _get_model(model_name: AllModelEnum) -> "ModelT":
     # NOTE: models with streaming=True will send tokens as they are generated
     # if the /stream endpoint is called with stream_tokens=True (the default)
     api_model_name = _MODEL_TABLE.get(model_name)
@@ -66,10 +133,13 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
         raise ValueError(f"Unsupported model: {model_name}")
 
     if model_name in OpenAIModelName:
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in AzureOpenAIModelName:
         if not settings.AZURE_OPENAI_API_KEY or not settings.AZURE_OPENAI_ENDPOINT:
             raise ValueError("Azure OpenAI API key and endpoint must be configured")
+        from langchain_openai import AzureChatOpenAI
 
         return AzureChatOpenAI(
             azure_endpoint=settings.AZURE_OPENAI_ENDPOINT,
@@ -81,6 +151,8 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             max_retries=3,
         )
     if model_name in DeepseekModelName:
+        from langchain_openai import ChatOpenAI
+
         return ChatOpenAI(
             model=api_model_name,
             temperature=0.5,
@@ -89,16 +161,26 @@ def get_model(model_name: AllModelEnum, /) -> ModelT:
             openai_api_key=settings.DEEPSEEK_API_KEY,
         )
     if model_name in AnthropicModelName:
+        from langchain_anthropic import ChatAnthropic
+
         return ChatAnthropic(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in GoogleModelName:
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
         return ChatGoogleGenerativeAI(model=api_model_name, temperature=0.5, streaming=True)
     if model_name in GroqModelName:
+        from langchain_groq import ChatGroq
+
         if model_name == GroqModelName.LLAMA_GUARD_3_8B:
             return ChatGroq(model=api_model_name, temperature=0.0)
         return ChatGroq(model=api_model_name, temperature=0.5)
     if model_name in AWSModelName:
+        from langchain_aws import ChatBedrock
+
         return ChatBedrock(model_id=api_model_name, temperature=0.5)
     if model_name in OllamaModelName:
+        from langchain_ollama import ChatOllama
+
         if settings.OLLAMA_BASE_URL:
             chat_ollama = ChatOllama(
                 model=settings.OLLAMA_MODEL, temperature=0.5, base_url=settings.OLLAMA_BASE_URL
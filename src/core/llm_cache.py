@@ -0,0 +1,370 @@
+import asyncio
+import hashlib
+import json
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from typing import Any, Protocol
+
+import numpy as np
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun, CallbackManagerForLLMRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.language_models.chat_models import BaseChatModel
+from langchain_core.messages import (
+    AIMessage,
+    AIMessageChunk,
+    BaseMessage,
+    HumanMessage,
+    message_chunk_to_message,
+    message_to_dict,
+    messages_from_dict,
+)
+from langchain_core.outputs import ChatGeneration, ChatGenerationChunk, ChatResult
+
+from core.cache import LRUCache, SqliteCache
+from core.metrics import register_metrics
+from core.settings import settings
+from core.wrappers import ChatModelWrapper
+
+
+class VectorIndex(Protocol):
+    """Nearest-neighbour index of cached prompts, for the similarity mode of ResponseCache."""
+
+    def add(self, key: str, vector: Sequence[float]) -> None: ...
+
+    def remove(self, key: str) -> None: ...
+
+    def search(self, vector: Sequence[float], k: int = 1) -> list[tuple[str, float]]:
+        """Return up to `k` keys with their cosine similarity to `vector`, most similar first."""
+        ...
+
+
+class NumpyVectorIndex:
+    """Exact cosine search over all vectors, fast enough for the thousands of entries cached."""
+
+    def __init__(self) -> None:
+        self._keys: list[str] = []
+        self._vectors: np.ndarray | None = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    def add(self, key: str, vector: Sequence[float]) -> None:
+        self.remove(key)
+        normalized = np.asarray(vector, dtype=np.float32)
+        normalized /= np.linalg.norm(normalized) or 1.0
+        self._keys.append(key)
+        if self._vectors is None:
+            self._vectors = normalized[np.newaxis, :]
+        else:
+            self._vectors = np.vstack([self._vectors, normalized])
+
+    def remove(self, key: str) -> None:
+        if key in self._keys:
+            i = self._keys.index(key)
+            del self._keys[i]
+            self._vectors = np.delete(self._vectors, i, axis=0) if self._keys else None
+
+    def search(self, vector: Sequence[float], k: int = 1) -> list[tuple[str, float]]:
+        if self._vectors is None:
+            return []
+        query = np.asarray(vector, dtype=np.float32)
+        scores = self._vectors @ (query / (np.linalg.norm(query) or 1.0))
+        best = np.argsort(-scores)[:k]
+        return [(self._keys[i], float(scores[i])) for i in best]
+
+
+def _normalize_message(message: BaseMessage) -> dict[str, Any]:
+    # IDs differ between runs, so only what the model reads is part of the key
+    content = message.content
+    if isinstance(content, str):
+        content = " ".join(content.split())
+    normalized: dict[str, Any] = {"type": message.type, "content": content}
+    if message.name:
+        normalized["name"] = message.name
+    if isinstance(message, AIMessage) and message.tool_calls:
+        normalized["tool_calls"] = [
+            {"name": tc["name"], "args": tc["args"]} for tc in message.tool_calls
+        ]
+    return normalized
+
+
+def _digest(*parts: Any) -> str:
+    return hashlib.sha256(json.dumps(parts, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def _to_chunk(message: AIMessage) -> AIMessageChunk:
+    return AIMessageChunk(
+        content=message.content,
+        additional_kwargs=message.additional_kwargs,
+        response_metadata=message.response_metadata,
+        usage_metadata=message.usage_metadata,
+        tool_call_chunks=[
+            {
+                "name": tc["name"],
+                "args": json.dumps(tc["args"]),
+                "id": tc["id"],
+                "index": i,
+                "type": "tool_call_chunk",
+            }
+            for i, tc in enumerate(message.tool_calls)
+        ],
+    )
+
+
+def _replay(chunks: list[AIMessageChunk]) -> list[AIMessageChunk]:
+    # A cached message keeps none of its original ID, or it would replace the earlier message
+    # with the same ID in the conversation state
+    return [chunk.model_copy(update={"id": None}) for chunk in chunks]
+
+
+class ResponseCache:
+    """
+    Cache of chat model responses, stored as the chunks they were streamed in.
+
+    Entries are keyed on the normalized messages and the model's parameters, including its
+    temperature and bound tools, and kept for `ttl` seconds in an LRU cache, and in `store`
+    when given. With `embeddings`, a prompt whose last user message is at least `similarity`
+    similar to a cached one, after identical earlier messages, reuses that response too.
+    Similar prompts are only matched within the process.
+    """
+
+    def __init__(
+        self,
+        ttl: float,
+        maxsize: int = 1024,
+        store: SqliteCache | None = None,
+        embeddings: Embeddings | None = None,
+        similarity: float = 0.95,
+        index_factory: Callable[[], VectorIndex] = NumpyVectorIndex,
+    ) -> None:
+        self.ttl = ttl
+        self.store = store
+        self.embeddings = embeddings
+        self.similarity = similarity
+        self.index_factory = index_factory
+        self._entries: LRUCache[str, list[AIMessageChunk]] = LRUCache(maxsize, ttl=ttl)
+        # One index per model and conversation prefix, so only the last message is compared
+        self._indexes: LRUCache[str, VectorIndex] = LRUCache(maxsize, ttl=ttl)
+        self.hits = 0
+        self.similar_hits = 0
+        self.store_hits = 0
+        self.misses = 0
+
+    def keys(self, llm_string: str, messages: Sequence[BaseMessage]) -> tuple[str, str, str | None]:
+        """The exact key of a prompt, the key of its prefix and the text to compare."""
+        normalized = [_normalize_message(m) for m in messages]
+        text = None
+        if messages and isinstance(messages[-1], HumanMessage):
+            text = messages[-1].text()
+        return _digest(llm_string, normalized), _digest(llm_string, normalized[:-1]), text
+
+    def _lookup_memory(self, key: str) -> list[AIMessageChunk] | None:
+        if (chunks := self._entries.get(key)) is not None:
+            self.hits += 1
+            return _replay(chunks)
+        return None
+
+    def _from_store(self, key: str, stored: list[dict[str, Any]]) -> list[AIMessageChunk]:
+        chunks = messages_from_dict(stored)
+        self._entries.set(key, chunks)
+        self.store_hits += 1
+        return _replay(chunks)
+
+    def _to_memory(self, key: str, chunks: list[AIMessageChunk]) -> list[dict[str, Any]]:
+        chunks = _replay(chunks)
+        self._entries.set(key, chunks)
+        return [message_to_dict(chunk) for chunk in chunks]
+
+    def lookup(self, key: str) -> list[AIMessageChunk] | None:
+        """Blocking lookup of exact matches, in process and in the store."""
+        chunks = self._lookup_memory(key)
+        if chunks is None and self.store and (stored := self.store.get(key)) is not None:
+            chunks = self._from_store(key, stored)
+        if chunks is None:
+            self.misses += 1
+        return chunks
+
+    def update(self, key: str, chunks: list[AIMessageChunk]) -> None:
+        serialized = self._to_memory(key, chunks)
+        if self.store:
+            self.store.set(key, serialized, self.ttl)
+
+    async def alookup(
+        self, key: str, prefix: str, text: str | None
+    ) -> tuple[list[AIMessageChunk] | None, list[float] | None]:
+        """Look up a prompt, returning the cached chunks or the embedding to save it with."""
+        chunks = self._lookup_memory(key)
+        if chunks is None and self.store:
+            if (stored := await asyncio.to_thread(self.store.get, key)) is not None:
+                chunks = self._from_store(key, stored)
+        if chunks is not None:
+            return chunks, None
+        if not (self.embeddings and text):
+            self.misses += 1
+            return None, None
+
+        vector = await self.embeddings.aembed_query(text)
+        if index := self._indexes.peek(prefix):
+            for similar_key, score in index.search(vector):
+                if score < self.similarity:
+                    break
+                if (similar := self._entries.get(similar_key)) is not None:
+                    self.similar_hits += 1
+                    return _replay(similar), None
+                index.remove(similar_key)
+        self.misses += 1
+        return None, vector
+
+    async def aupdate(
+        self,
+        key: str,
+        chunks: list[AIMessageChunk],
+        prefix: str,
+        vector: list[float] | None = None,
+    ) -> None:
+        serialized = self._to_memory(key, chunks)
+        if self.store:
+            await asyncio.to_thread(self.store.set, key, serialized, self.ttl)
+        if vector is not None:
+            if (index := self._indexes.get(prefix)) is None:
+                index = self.index_factory()
+                self._indexes.set(prefix, index)
+            index.add(key, vector)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.similar_hits + self.store_hits + self.misses
+        return {
+            "size": len(self._entries),
+            "evictions": self._entries.evictions,
+            "hits": self.hits,
+            "similar_hits": self.similar_hits,
+            "store_hits": self.store_hits,
+            "misses": self.misses,
+            "hit_rate": (lookups - self.misses) / lookups if lookups else 0.0,
+        }
+
+
+class CachedChatModel(ChatModelWrapper):
+    """
+    Chat model that answers repeated prompts from a ResponseCache instead of `model`.
+
+    Cached responses are replayed chunk by chunk when streamed, so token streaming behaves as
+    for a live response. Blocking calls only match exact prompts.
+    """
+
+    response_cache: ResponseCache
+
+    def _keys(
+        self, messages: list[BaseMessage], stop: list[str] | None, **kwargs: Any
+    ) -> tuple[str, str, str | None]:
+        return self.response_cache.keys(self.model._get_llm_string(stop=stop, **kwargs), messages)
+
+    def _generate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, _, _ = self._keys(messages, stop, **kwargs)
+        if (chunks := self.response_cache.lookup(key)) is not None:
+            return self._result(chunks)
+        result = self.model._generate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if len(result.generations) == 1:
+            self.response_cache.update(key, [_to_chunk(result.generations[0].message)])
+        return result
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        key, prefix, text = self._keys(messages, stop, **kwargs)
+        chunks, vector = await self.response_cache.alookup(key, prefix, text)
+        if chunks is not None:
+            return self._result(chunks)
+        result = await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        if len(result.generations) == 1:
+            chunks = [_to_chunk(result.generations[0].message)]
+            await self.response_cache.aupdate(key, chunks, prefix, vector)
+        return result
+
+    def _stream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: CallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> Iterator[ChatGenerationChunk]:
+        key, _, _ = self._keys(messages, stop, **kwargs)
+        if (chunks := self.response_cache.lookup(key)) is not None:
+            for chunk in chunks:
+                yield ChatGenerationChunk(message=chunk)
+            return
+        chunks = []
+        for generation in self.model._stream(messages, stop=stop, **kwargs):
+            chunks.append(generation.message)
+            yield generation
+        self.response_cache.update(key, chunks)
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        key, prefix, text = self._keys(messages, stop, **kwargs)
+        chunks, vector = await self.response_cache.alookup(key, prefix, text)
+        if chunks is not None:
+            for chunk in chunks:
+                yield ChatGenerationChunk(message=chunk)
+            return
+        chunks = []
+        async for generation in self.model._astream(messages, stop=stop, **kwargs):
+            chunks.append(generation.message)
+            yield generation
+        # A stream that was closed early isn't cached
+        await self.response_cache.aupdate(key, chunks, prefix, vector)
+
+    @staticmethod
+    def _result(chunks: list[AIMessageChunk]) -> ChatResult:
+        message = chunks[0]
+        for chunk in chunks[1:]:
+            message += chunk
+        return ChatResult(generations=[ChatGeneration(message=message_chunk_to_message(message))])
+
+
+_response_caches: dict[str, ResponseCache] = {}
+register_metrics(
+    "llm_cache", lambda: {name: cache.stats() for name, cache in _response_caches.items()}
+)
+
+
+def _get_cache_embeddings() -> Embeddings:
+    from langchain_openai import OpenAIEmbeddings
+
+    return OpenAIEmbeddings(model=settings.LLM_CACHE_EMBEDDING_MODEL)
+
+
+def cache_model(model: BaseChatModel, model_name: str) -> BaseChatModel:
+    """Wrap `model` in a CachedChatModel when LLM_CACHE_TTL sets a TTL for it, else return it."""
+    ttl = settings.LLM_CACHE_TTL.get(model_name)
+    if not ttl:
+        return model
+    store = None
+    if settings.LLM_CACHE_SQLITE_PATH:
+        store = SqliteCache(settings.LLM_CACHE_SQLITE_PATH, table="llm_responses")
+    embeddings = None
+    if settings.LLM_CACHE_SIMILARITY is not None:
+        embeddings = _get_cache_embeddings()
+    response_cache = ResponseCache(
+        ttl,
+        maxsize=settings.LLM_CACHE_SIZE,
+        store=store,
+        embeddings=embeddings,
+        similarity=settings.LLM_CACHE_SIMILARITY or 1.0,
+    )
+    _response_caches[model_name] = response_cache
+    return CachedChatModel(model=model, response_cache=response_cache)
@@ -0,0 +1,20 @@
+from collections.abc import Callable
+from typing import Any
+
+MetricsProvider = Callable[[], dict[str, Any]]
+
+_providers: dict[str, MetricsProvider] = {}
+
+
+def register_metrics(name: str, provider: MetricsProvider) -> None:
+    """Register a callable that returns a snapshot of a subsystem's metrics."""
+    _providers[name] = provider
+
+
+def unregister_metrics(name: str) -> None:
+    _providers.pop(name, None)
+
+
+def collect_metrics() -> dict[str, dict[str, Any]]:
+    """Return the current snapshot from every registered metrics provider."""
+    return {name: provider() for name, provider in _providers.items()}
@@ -0,0 +1,258 @@
+import asyncio
+import heapq
+import itertools
+import time
+from collections.abc import AsyncIterator, Sequence
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from enum import IntEnum
+from typing import Any
+
+from langchain_core.callbacks import AsyncCallbackManagerForLLMRun
+from langchain_core.messages import AIMessageChunk, BaseMessage
+from langchain_core.outputs import ChatGenerationChunk, ChatResult
+
+from core.metrics import register_metrics
+from core.settings import settings
+from core.tokens import estimate_tokens
+from core.wrappers import ChatModelWrapper
+from schema.models import Provider
+
+# Completion tokens reserved for a call before its usage is known
+COMPLETION_TOKENS_ESTIMATE = 512
+
+
+class Priority(IntEnum):
+    """Order in which queued model calls are sent; lower values go first."""
+
+    INTERACTIVE = 0
+    BATCH = 1
+
+
+# Priority of the model calls made in the current context, set by the service for each run
+request_priority: ContextVar[Priority] = ContextVar("request_priority", default=Priority.BATCH)
+
+
+class TokenBucket:
+    """Allowance refilled continuously at `per_minute`, holding at most `capacity`."""
+
+    def __init__(self, per_minute: float, capacity: float | None = None) -> None:
+        self.rate = per_minute / 60
+        self.capacity = capacity or per_minute
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` is available. Amounts over the capacity wait for a full bucket."""
+        self._refill()
+        missing = min(amount, self.capacity) - self.tokens
+        return max(missing / self.rate, 0.0)
+
+    def consume(self, amount: float) -> None:
+        # Usage reported after a call may exceed the estimate, leaving the bucket in debt
+        self._refill()
+        self.tokens -= amount
+
+
+@dataclass(order=True)
+class _Waiter:
+    priority: Priority
+    seq: int
+    tokens: int = field(compare=False)
+    future: asyncio.Future[None] = field(compare=False)
+    queued_at: float = field(compare=False, default_factory=time.perf_counter)
+
+
+class ProviderRateLimiter:
+    """
+    Request-per-minute and token-per-minute limits for one provider's model calls.
+
+    Calls over the limits wait in a queue instead of failing, and are sent in order of
+    priority, then arrival, as the buckets refill. A call reserves its estimated tokens when
+    it's sent, and the difference to its reported usage is settled when it completes.
+    """
+
+    def __init__(
+        self,
+        rpm: int | None = None,
+        tpm: int | None = None,
+        *,
+        burst_seconds: float = 60,
+    ) -> None:
+        # Buckets hold up to `burst_seconds` worth of their limit
+        self.requests = TokenBucket(rpm, rpm * burst_seconds / 60) if rpm else None
+        self.tokens = TokenBucket(tpm, tpm * burst_seconds / 60) if tpm else None
+        self.rpm = rpm
+        self.tpm = tpm
+        self._queue: list[_Waiter] = []
+        self._seq = itertools.count()
+        self._dispatcher: asyncio.Task | None = None
+        self._wakeup = asyncio.Event()
+        self.sent: dict[Priority, int] = dict.fromkeys(Priority, 0)
+        self.wait_ms_total: dict[Priority, float] = dict.fromkeys(Priority, 0.0)
+        self.wait_ms_max = 0.0
+        self.tokens_estimated = 0
+        self.tokens_used = 0
+
+    def _wait_time(self, tokens: int) -> float:
+        wait = self.requests.wait_time(1) if self.requests else 0.0
+        if self.tokens:
+            wait = max(wait, self.tokens.wait_time(tokens))
+        return wait
+
+    def _send(self, waiter: _Waiter) -> None:
+        if self.requests:
+            self.requests.consume(1)
+        if self.tokens:
+            self.tokens.consume(waiter.tokens)
+        wait_ms = (time.perf_counter() - waiter.queued_at) * 1000
+        self.sent[waiter.priority] += 1
+        self.wait_ms_total[waiter.priority] += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+        self.tokens_estimated += waiter.tokens
+        waiter.future.set_result(None)
+
+    async def _dispatch(self) -> None:
+        while self._queue:
+            waiter = self._queue[0]
+            if waiter.future.done():
+                heapq.heappop(self._queue)
+                continue
+            if (wait := self._wait_time(waiter.tokens)) <= 0:
+                heapq.heappop(self._queue)
+                self._send(waiter)
+                continue
+            # Wake up early when a call with a higher priority arrives
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), wait)
+            except TimeoutError:
+                pass
+
+    async def acquire(self, tokens: int, priority: Priority = Priority.BATCH) -> None:
+        """Wait until a call of an estimated `tokens` can be sent within the limits."""
+        if not self._queue and self._wait_time(tokens) <= 0:
+            future = asyncio.get_running_loop().create_future()
+            self._send(_Waiter(priority, next(self._seq), tokens, future))
+            return
+        waiter = _Waiter(
+            priority, next(self._seq), tokens, asyncio.get_running_loop().create_future()
+        )
+        heapq.heappush(self._queue, waiter)
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatcher = asyncio.create_task(self._dispatch())
+        else:
+            self._wakeup.set()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Sent just as it was cancelled, so its request and tokens are returned
+                self._refund(waiter)
+            waiter.future.cancel()
+            raise
+
+    def _refund(self, waiter: _Waiter) -> None:
+        if self.requests:
+            self.requests.consume(-1)
+        if self.tokens:
+            self.tokens.consume(-waiter.tokens)
+        self.tokens_estimated -= waiter.tokens
+
+    def settle(self, estimated: int, used: int) -> None:
+        """Correct the token bucket with a call's reported usage."""
+        self.tokens_used += used
+        if self.tokens:
+            self.tokens.consume(used - estimated)
+
+    def stats(self) -> dict[str, Any]:
+        queued = [w for w in self._queue if not w.future.done()]
+        return {
+            "rpm": self.rpm,
+            "tpm": self.tpm,
+            "queued": len(queued),
+            "queued_interactive": sum(w.priority == Priority.INTERACTIVE for w in queued),
+            "sent_interactive": self.sent[Priority.INTERACTIVE],
+            "sent_batch": self.sent[Priority.BATCH],
+            "wait_ms_avg_interactive": self._avg_wait(Priority.INTERACTIVE),
+            "wait_ms_avg_batch": self._avg_wait(Priority.BATCH),
+            "wait_ms_max": self.wait_ms_max,
+            "tokens_estimated": self.tokens_estimated,
+            "tokens_used": self.tokens_used,
+        }
+
+    def _avg_wait(self, priority: Priority) -> float:
+        sent = self.sent[priority]
+        return self.wait_ms_total[priority] / sent if sent else 0.0
+
+
+def estimate_call_tokens(messages: Sequence[BaseMessage], **kwargs: Any) -> int:
+    completion = kwargs.get("max_tokens") or COMPLETION_TOKENS_ESTIMATE
+    return estimate_tokens(messages) + completion
+
+
+class RateLimitedChatModel(ChatModelWrapper):
+    """
+    Chat model whose async calls wait for `limiter`, at the priority of the current request.
+
+    Blocking calls aren't limited; the agents call their models asynchronously.
+    """
+
+    limiter: ProviderRateLimiter
+
+    def _settle(self, estimated: int, usage: dict[str, Any] | None) -> None:
+        self.limiter.settle(estimated, usage["total_tokens"] if usage else estimated)
+
+    async def _agenerate(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        estimated = estimate_call_tokens(messages, **kwargs)
+        await self.limiter.acquire(estimated, request_priority.get())
+        result = await self.model._agenerate(messages, stop=stop, run_manager=run_manager, **kwargs)
+        message = result.generations[0].message if result.generations else None
+        self._settle(estimated, getattr(message, "usage_metadata", None))
+        return result
+
+    async def _astream(
+        self,
+        messages: list[BaseMessage],
+        stop: list[str] | None = None,
+        run_manager: AsyncCallbackManagerForLLMRun | None = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        estimated = estimate_call_tokens(messages, **kwargs)
+        await self.limiter.acquire(estimated, request_priority.get())
+        usage = None
+        try:
+            async for chunk in self.model._astream(messages, stop=stop, **kwargs):
+                if isinstance(chunk.message, AIMessageChunk) and chunk.message.usage_metadata:
+                    usage = chunk.message.usage_metadata
+                yield chunk
+        finally:
+            self._settle(estimated, usage)
+
+
+_limiters: dict[Provider, ProviderRateLimiter] = {}
+register_metrics(
+    "rate_limits", lambda: {provider: limiter.stats() for provider, limiter in _limiters.items()}
+)
+
+
+def get_rate_limiter(provider: Provider) -> ProviderRateLimiter | None:
+    """The limiter shared by the models of `provider`, or None when it has no limits."""
+    if provider not in _limiters:
+        rpm = settings.PROVIDER_RPM.get(provider)
+        tpm = settings.PROVIDER_TPM.get(provider)
+        if not rpm and not tpm:
+            return None
+        _limiters[provider] = ProviderRateLimiter(rpm, tpm)
+    return _limiters[provider]
@@ -1,6 +1,7 @@
+import logging
 from enum import StrEnum
 from json import loads
-from typing import Annotated, Any
+from typing import Annotated, Any, Literal
 
 from dotenv import find_dotenv
 from pydantic import (
@@ -14,6 +15,7 @@ from pydantic import (
 from pydantic_settings import BaseSettings, SettingsConfigDict
 
 from schema.models import (
+    MODEL_PROVIDERS,
     AllModelEnum,
     AnthropicModelName,
     AWSModelName,
@@ -25,14 +27,24 @@ from schema.models import (
     OllamaModelName,
     OpenAIModelName,
     Provider,
+    VirtualModelName,
 )
 
+logger = logging.getLogger(__name__)
+
 
 class DatabaseType(StrEnum):
     SQLITE = "sqlite"
     POSTGRES = "postgres"
 
 
+class CompressionCodec(StrEnum):
+    NONE = "none"
+    ZLIB = "zlib"
+    # Requires the zstandard package
+    ZSTD = "zstd"
+
+
 def check_str_is_http(x: str) -> str:
     http_url_adapter = TypeAdapter(HttpUrl)
     return str(http_url_adapter.validate_python(x))
@@ -69,6 +81,121 @@ class Settings(BaseSettings):
 
     OPENWEATHERMAP_API_KEY: SecretStr | None = None
 
+    # Llama Guard verdict cache
+    LLAMA_GUARD_CACHE_SIZE: int = 1024
+    LLAMA_GUARD_CACHE_TTL: float | None = Field(
+        default=3600, description="Seconds a cached safety verdict stays valid"
+    )
+
+    # Chat model response cache
+    LLM_CACHE_TTL: dict[str, float] = Field(
+        default_factory=dict,
+        description="Map of model names to the seconds their responses are reused for "
+        "identical prompts. Models not listed aren't cached",
+    )
+    LLM_CACHE_SIZE: int = Field(default=1024, ge=1, description="Responses cached per model")
+    LLM_CACHE_SQLITE_PATH: str | None = Field(
+        default=None,
+        description="SQLite database shared by service processes for responses, in addition "
+        "to the in-process cache",
+    )
+    LLM_CACHE_SIMILARITY: float | None = Field(
+        default=None,
+        gt=0,
+        le=1,
+        description="Also reuse the response to a previous prompt whose last user message has "
+        "at least this cosine similarity, after the same earlier messages. Uses OpenAI "
+        "embeddings",
+    )
+    LLM_CACHE_EMBEDDING_MODEL: str = "text-embedding-3-small"
+
+    # Provider circuit breakers
+    CIRCUIT_BREAKER_FAILURES: int | None = Field(
+        default=None,
+        ge=1,
+        description="Consecutive failed or slow calls after which a provider's calls are "
+        "rejected, or sent to its fallback model, without waiting for it. Disabled if unset",
+    )
+    CIRCUIT_BREAKER_RESET_TIMEOUT: float = Field(
+        default=30,
+        gt=0,
+        description="Seconds an open circuit waits before letting a single probe call through",
+    )
+    CIRCUIT_BREAKER_SLOW_CALL: float | None = Field(
+        default=None,
+        gt=0,
+        description="Seconds to a response, or a first streamed token, after which a call "
+        "counts as failed",
+    )
+    CIRCUIT_BREAKER_FALLBACK: dict[Provider, AllModelEnum] = Field(  # type: ignore[assignment]
+        default_factory=dict,
+        description="Map of providers to the model their calls are sent to while their circuit "
+        "is open",
+    )
+
+    # Hedged model
+    HEDGED_MODELS: list[AllModelEnum] = Field(  # type: ignore[assignment]
+        default_factory=list,
+        description="Models the hedged model sends each call to, fastest first. With two or "
+        "more, the hedged model is available",
+    )
+    HEDGE_AFTER: float = Field(
+        default=2.0,
+        gt=0,
+        description="Most seconds the hedged model waits for a first token before also "
+        "sending the call to the next model. It waits less when its p95 is lower",
+    )
+
+    # Provider rate limits
+    PROVIDER_RPM: dict[Provider, int] = Field(
+        default_factory=dict,
+        description="Map of providers to the model requests per minute sent to them. Requests "
+        "over the limit wait, with /stream requests ahead of /invoke and /batch",
+    )
+    PROVIDER_TPM: dict[Provider, int] = Field(
+        default_factory=dict,
+        description="Map of providers to the prompt and completion tokens per minute sent to "
+        "them, estimated before each request and corrected with the reported usage",
+    )
+
+    # Tool result cache
+    TOOL_CACHE_TTL: dict[str, float] = Field(
+        default_factory=lambda: {"WebSearch": 600, "Weather": 600},
+        description="Map of tool names to the seconds their results are reused for identical "
+        "arguments. Tools not listed aren't cached",
+    )
+    TOOL_CACHE_SIZE: int = Field(default=1024, ge=1, description="Results cached per tool")
+    TOOL_CACHE_SQLITE_PATH: str | None = Field(
+        default=None,
+        description="SQLite database shared by service processes for tool results, in addition "
+        "to the in-process cache",
+    )
+
+    # Tool execution in the research assistant
+    TOOL_TIMEOUT: float | None = Field(
+        default=30,
+        description="Seconds a tool call may take before the model gets an error result instead",
+    )
+    TOOL_TIMEOUTS: dict[str, float] = Field(
+        default_factory=dict, description="Map of tool names to their own timeout in seconds"
+    )
+    TOOL_MAX_CONCURRENCY: dict[str, int] = Field(
+        default_factory=dict,
+        description="Map of tool names to their maximum concurrent calls across all runs",
+    )
+
+    # Context window of the chatbot and research assistant, overridden per request by the
+    # context_max_tokens and context_summarize keys of agent_config
+    CONTEXT_MAX_TOKENS: int | None = Field(
+        default=None,
+        ge=1,
+        description="Estimated prompt tokens of conversation history sent to the model. Older "
+        "turns are dropped; unset sends the whole conversation",
+    )
+    CONTEXT_SUMMARIZE: bool = Field(
+        default=False, description="Summarize dropped turns and send the summary instead"
+    )
+
     LANGCHAIN_TRACING_V2: bool = False
     LANGCHAIN_PROJECT: str = "default"
     LANGCHAIN_ENDPOINT: Annotated[str, BeforeValidator(check_str_is_http)] = (
@@ -76,11 +203,96 @@ class Settings(BaseSettings):
     )
     LANGCHAIN_API_KEY: SecretStr | None = None
 
+    # Admission control for /invoke, /stream and /batch. Unset limits mean unlimited.
+    MAX_CONCURRENT_RUNS: int | None = Field(
+        default=None, description="Maximum concurrent agent runs across all agents"
+    )
+    MAX_CONCURRENT_RUNS_PER_AGENT: dict[str, int] = Field(
+        default_factory=dict, description="Map of agent IDs to their maximum concurrent runs"
+    )
+    MAX_QUEUED_RUNS: int = Field(
+        default=100, description="Maximum runs waiting for capacity before rejecting with 429"
+    )
+    RUN_QUEUE_TIMEOUT: float = Field(
+        default=30, description="Seconds a run may wait for capacity before rejecting with 503"
+    )
+    MAX_BATCH_CONCURRENCY: int = Field(
+        default=16, description="Upper bound on the concurrency a /batch request may ask for"
+    )
+
     # Database Configuration
     DATABASE_TYPE: DatabaseType = (
         DatabaseType.SQLITE
     )  # Options: DatabaseType.SQLITE or DatabaseType.POSTGRES
     SQLITE_DB_PATH: str = "checkpoints.db"
+    SQLITE_READ_POOL_SIZE: int = Field(
+        default=4,
+        ge=0,
+        description="Read connections to the SQLite database, alongside the one writer. "
+        "0 reads through the writer connection",
+    )
+    SQLITE_BUSY_TIMEOUT: float = Field(
+        default=5.0, description="Seconds a connection waits for a locked database"
+    )
+    SQLITE_SYNCHRONOUS: Literal["OFF", "NORMAL", "FULL", "EXTRA"] = Field(
+        default="NORMAL",
+        description="NORMAL is safe from corruption in WAL mode but may lose the last "
+        "transactions on power loss; FULL syncs every commit",
+    )
+    SQLITE_CACHE_SIZE_KB: int = Field(
+        default=64 * 1024, description="Page cache per connection, in KiB"
+    )
+    SQLITE_MMAP_SIZE: int = Field(
+        default=256 * 1024 * 1024, description="Bytes of the database file read through mmap"
+    )
+    SQLITE_MESSAGE_LOG: bool = Field(
+        default=False,
+        description="Store each message once in a per-thread log, instead of the whole message "
+        "list in every checkpoint. Existing checkpoints are still read",
+    )
+    MEMORY_CHECKPOINT_MAX_THREADS: int = Field(
+        default=1000,
+        description="Threads kept by the in-memory checkpointer used before the database is "
+        "connected or outside the service; least recently used threads are evicted",
+    )
+    MEMORY_CHECKPOINT_MAX_BYTES: int | None = Field(
+        default=256 * 1024 * 1024,
+        description="Total size of serialized checkpoints kept by the in-memory checkpointer",
+    )
+    CHECKPOINT_CACHE_SIZE: int = Field(
+        default=0,
+        description="Threads whose latest checkpoint is cached in process in front of the "
+        "database, off by default. Only enable it when a single service instance writes to "
+        "the database, since other instances' writes aren't seen until the entry expires",
+    )
+    CHECKPOINT_CACHE_TTL: float | None = Field(
+        default=300, description="Seconds a cached checkpoint is trusted before re-reading it"
+    )
+    CHECKPOINT_COMPRESSION: CompressionCodec = Field(
+        default=CompressionCodec.NONE,
+        description="Codec for compressing large checkpoint values in the database, off by "
+        "default. Rows written uncompressed or with another codec are still read",
+    )
+    CHECKPOINT_COMPRESSION_THRESHOLD: int = Field(
+        default=1024, description="Serialized size in bytes from which values are compressed"
+    )
+    CHECKPOINT_KEEP_LAST: int | None = Field(
+        default=None,
+        ge=1,
+        description="Checkpoints kept per thread by the retention task; older history is deleted. "
+        "The latest checkpoint holds the whole conversation, so 1 is enough to continue it",
+    )
+    CHECKPOINT_THREAD_TTL: float | None = Field(
+        default=None, description="Seconds after its last checkpoint that an idle thread is deleted"
+    )
+    CHECKPOINT_VACUUM: bool = Field(
+        default=False, description="Compact the database after each retention pass"
+    )
+    CHECKPOINT_RETENTION_INTERVAL: float = Field(
+        default=3600,
+        description="Seconds between retention passes in the service. The task only runs when "
+        "CHECKPOINT_KEEP_LAST, CHECKPOINT_THREAD_TTL or CHECKPOINT_VACUUM is set",
+    )
 
     # PostgreSQL Configuration
     POSTGRES_USER: str | None = None
@@ -94,7 +306,15 @@ class Settings(BaseSettings):
     POSTGRES_MIN_SIZE: int = Field(
         default=3, description="Minimum number of connections in the pool"
     )
-    POSTGRES_MAX_IDLE: int = Field(default=5, description="Maximum number of idle connections")
+    POSTGRES_MAX_IDLE: int = Field(
+        default=5,
+        description="Deprecated and ignored: the pool has no limit on idle connections, only "
+        "an idle timeout. Use POSTGRES_MAX_IDLE_SECONDS",
+    )
+    POSTGRES_MAX_IDLE_SECONDS: float = Field(
+        default=300,
+        description="Seconds an unused connection above the minimum is kept open in the pool",
+    )
 
     # Azure OpenAI Settings
     AZURE_OPENAI_API_KEY: SecretStr | None = None
@@ -183,6 +403,32 @@ class Settings(BaseSettings):
                 case _:
                     raise ValueError(f"Unknown provider: {provider}")
 
+        if "POSTGRES_MAX_IDLE" in self.model_fields_set:
+            logger.warning(
+                "POSTGRES_MAX_IDLE is deprecated and ignored, as the pool only has an idle "
+                "timeout. Set POSTGRES_MAX_IDLE_SECONDS instead"
+            )
+
+        if self.HEDGED_MODELS:
+            if unavailable := set(self.HEDGED_MODELS) - self.AVAILABLE_MODELS:
+                raise ValueError(f"HEDGED_MODELS includes unavailable models: {unavailable}")
+            if len(self.HEDGED_MODELS) > 1:
+                self.AVAILABLE_MODELS.add(VirtualModelName.HEDGED)
+
+        # A provider's calls fall back to a single model of another provider. The hedged model
+        # isn't allowed, as it may route calls back to the provider whose circuit is open.
+        for provider, fallback in self.CIRCUIT_BREAKER_FALLBACK.items():
+            if fallback == VirtualModelName.HEDGED:
+                raise ValueError(f"CIRCUIT_BREAKER_FALLBACK for {provider} can't be {fallback}")
+            if fallback not in self.AVAILABLE_MODELS:
+                raise ValueError(
+                    f"CIRCUIT_BREAKER_FALLBACK for {provider} is an unavailable model: {fallback}"
+                )
+            if MODEL_PROVIDERS.get(type(fallback)) == provider:
+                raise ValueError(
+                    f"CIRCUIT_BREAKER_FALLBACK for {provider} is one of its own models: {fallback}"
+                )
+
     @computed_field
     @property
     def BASE_URL(self) -> str:
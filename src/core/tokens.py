@@ -0,0 +1,21 @@
+import json
+from collections.abc import Sequence
+
+from langchain_core.messages import AIMessage, BaseMessage
+
+# A rough estimate for English text, good enough to keep prompts within a budget without
+# loading a provider's tokenizer
+CHARS_PER_TOKEN = 4
+# Role and formatting tokens that providers add around each message
+TOKENS_PER_MESSAGE = 4
+
+
+def estimate_tokens(messages: Sequence[BaseMessage]) -> int:
+    """Estimate the prompt tokens of `messages` from their length."""
+    chars = 0
+    for message in messages:
+        chars += len(message.text())
+        if isinstance(message, AIMessage):
+            for tool_call in message.tool_calls:
+                chars += len(tool_call["name"]) + len(json.dumps(tool_call["args"]))
+    return chars // CHARS_PER_TOKEN + TOKENS_PER_MESSAGE * len(messages)
@@ -1,7 +1,15 @@
 from langgraph.checkpoint.base import BaseCheckpointSaver
 
 from core.settings import DatabaseType, settings
+from memory.caching import CachingCheckpointSaver
 from memory.postgres import get_postgres_saver
+from memory.registry import (
+    SharedCheckpointer,
+    get_checkpointer,
+    preload_scope,
+    set_checkpointer,
+)
+from memory.retention import CheckpointRetention
 from memory.sqlite import get_sqlite_saver
 
 
@@ -16,4 +24,46 @@ def initialize_database() -> BaseCheckpointSaver:
         return get_sqlite_saver()
 
 
-__all__ = ["initialize_database"]
+def with_checkpoint_cache(saver: BaseCheckpointSaver) -> BaseCheckpointSaver:
+    """Put the in-process cache of latest checkpoints in front of saver, if enabled."""
+    if not settings.CHECKPOINT_CACHE_SIZE:
+        return saver
+    return CachingCheckpointSaver(
+        saver, maxsize=settings.CHECKPOINT_CACHE_SIZE, ttl=settings.CHECKPOINT_CACHE_TTL
+    )
+
+
+def get_checkpoint_retention(
+    saver: BaseCheckpointSaver, checkpointer: BaseCheckpointSaver | None = None
+) -> CheckpointRetention | None:
+    """
+    Build the retention policy configured in settings for the database saver, or None if none
+    is configured. Threads it deletes are dropped from checkpointer's cache, if it has one.
+    """
+    if (
+        settings.CHECKPOINT_KEEP_LAST is None
+        and settings.CHECKPOINT_THREAD_TTL is None
+        and not settings.CHECKPOINT_VACUUM
+    ):
+        return None
+    return CheckpointRetention(
+        saver,
+        keep_last=settings.CHECKPOINT_KEEP_LAST,
+        ttl=settings.CHECKPOINT_THREAD_TTL,
+        vacuum=settings.CHECKPOINT_VACUUM,
+        on_expired=(
+            checkpointer.forget if isinstance(checkpointer, CachingCheckpointSaver) else None
+        ),
+    )
+
+
+__all__ = [
+    "initialize_database",
+    "with_checkpoint_cache",
+    "get_checkpoint_retention",
+    "CheckpointRetention",
+    "get_checkpointer",
+    "preload_scope",
+    "set_checkpointer",
+    "SharedCheckpointer",
+]
@@ -0,0 +1,282 @@
+from collections.abc import AsyncIterator, Iterator, Sequence
+from dataclasses import dataclass, field
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import ChannelProtocol
+
+from core.cache import LRUCache
+from memory.registry import accepts_task_path
+from memory.serde import CompressedSerializer
+
+_MISSING = object()
+
+
+@dataclass
+class _CachedCheckpoint:
+    """The latest checkpoint of a thread, serialized so callers can't mutate the cached copy."""
+
+    config: RunnableConfig
+    checkpoint: tuple[str, bytes]
+    metadata: tuple[str, bytes]
+    parent_config: RunnableConfig | None
+    # (task ID, write index) -> (task ID, channel, serialized value)
+    writes: dict[tuple[str, int], tuple[str, str, tuple[str, bytes]]] = field(default_factory=dict)
+
+    @property
+    def checkpoint_id(self) -> str:
+        return self.config["configurable"]["checkpoint_id"]
+
+
+class CachingCheckpointSaver(BaseCheckpointSaver):
+    """
+    Read-through, write-through cache of the latest checkpoint of each thread.
+
+    Each turn reads the latest checkpoint of its thread at least twice (the service checks
+    for interrupts, then LangGraph loads it to run) and then writes new checkpoints. With
+    this wrapper those reads are served from process memory, and checkpoints and pending
+    writes still go straight to the wrapped saver.
+
+    The cache assumes this process is the only writer of its threads. If several service
+    instances share a database without routing each thread to one instance, use a short
+    `ttl` or disable the cache.
+    """
+
+    def __init__(
+        self, saver: BaseCheckpointSaver, maxsize: int = 1000, ttl: float | None = None
+    ) -> None:
+        serde = saver.serde
+        # Cached copies stay in memory, where compressing them would only cost time
+        if isinstance(serde, CompressedSerializer):
+            serde = serde.serde
+        super().__init__(serde=serde)
+        self.saver = saver
+        # (thread ID, checkpoint namespace) -> latest checkpoint, or None for an empty thread
+        self.cache: LRUCache[tuple[str, str], _CachedCheckpoint | None] = LRUCache(maxsize, ttl)
+        self.hits = 0
+        self.misses = 0
+        self._put_writes_task_path = accepts_task_path(saver.put_writes)
+        self._aput_writes_task_path = accepts_task_path(saver.aput_writes)
+
+    @staticmethod
+    def _key(config: RunnableConfig) -> tuple[str, str]:
+        configurable = config["configurable"]
+        return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+    def _lookup(self, config: RunnableConfig) -> Any:
+        """Return the cached CheckpointTuple or None, or _MISSING if the DB must be read."""
+        checkpoint_id = get_checkpoint_id(config)
+        if checkpoint_id:
+            # Only the latest checkpoint is cached; older ones are read from the saver
+            entry = self.cache.peek(self._key(config))
+            if entry is None or entry.checkpoint_id != checkpoint_id:
+                self.misses += 1
+                return _MISSING
+        else:
+            entry = self.cache.get(self._key(config), _MISSING)
+            if entry is _MISSING:
+                self.misses += 1
+                return _MISSING
+        self.hits += 1
+        return self._load(entry) if entry else None
+
+    def _load(self, entry: _CachedCheckpoint) -> CheckpointTuple:
+        return CheckpointTuple(
+            config=entry.config,
+            checkpoint=self.serde.loads_typed(entry.checkpoint),
+            metadata=self.serde.loads_typed(entry.metadata),
+            parent_config=entry.parent_config,
+            pending_writes=[
+                (task_id, channel, self.serde.loads_typed(value))
+                for _, (task_id, channel, value) in sorted(entry.writes.items())
+            ],
+        )
+
+    def _fill(self, config: RunnableConfig, saved: CheckpointTuple | None) -> None:
+        key = self._key(config)
+        # Don't overwrite a checkpoint that was written while we were reading
+        if get_checkpoint_id(config) or key in self.cache:
+            return
+        if saved is None:
+            self.cache.set(key, None)
+            return
+        entry = _CachedCheckpoint(
+            config=saved.config,
+            checkpoint=self.serde.dumps_typed(saved.checkpoint),
+            metadata=self.serde.dumps_typed(saved.metadata),
+            parent_config=saved.parent_config,
+        )
+        for idx, (task_id, channel, value) in enumerate(saved.pending_writes or []):
+            entry.writes[(task_id, WRITES_IDX_MAP.get(channel, idx))] = (
+                task_id,
+                channel,
+                self.serde.dumps_typed(value),
+            )
+        self.cache.set(key, entry)
+
+    def _store_checkpoint(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        next_config: RunnableConfig,
+    ) -> None:
+        thread_id, checkpoint_ns = self._key(next_config)
+        parent_id = get_checkpoint_id(config)
+        self.cache.set(
+            (thread_id, checkpoint_ns),
+            _CachedCheckpoint(
+                config=next_config,
+                checkpoint=self.serde.dumps_typed(checkpoint),
+                metadata=self.serde.dumps_typed(metadata),
+                parent_config=(
+                    {
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": checkpoint_ns,
+                            "checkpoint_id": parent_id,
+                        }
+                    }
+                    if parent_id
+                    else None
+                ),
+            ),
+        )
+
+    def _store_writes(
+        self, config: RunnableConfig, writes: Sequence[tuple[str, Any]], task_id: str
+    ) -> None:
+        entry = self.cache.peek(self._key(config))
+        if not entry or entry.checkpoint_id != get_checkpoint_id(config):
+            return
+        for idx, (channel, value) in enumerate(writes):
+            write_key = (task_id, WRITES_IDX_MAP.get(channel, idx))
+            # Like the savers, special channels overwrite and regular writes are kept once
+            if write_key[1] >= 0 and write_key in entry.writes:
+                continue
+            entry.writes[write_key] = (task_id, channel, self.serde.dumps_typed(value))
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        cached = self._lookup(config)
+        if cached is not _MISSING:
+            return cached
+        saved = self.saver.get_tuple(config)
+        self._fill(config, saved)
+        return saved
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        cached = self._lookup(config)
+        if cached is not _MISSING:
+            return cached
+        saved = await self.saver.aget_tuple(config)
+        self._fill(config, saved)
+        return saved
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        return self.saver.alist(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = self.saver.put(config, checkpoint, metadata, new_versions)
+        self._store_checkpoint(config, checkpoint, metadata, next_config)
+        return next_config
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        next_config = await self.saver.aput(config, checkpoint, metadata, new_versions)
+        self._store_checkpoint(config, checkpoint, metadata, next_config)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._put_writes_task_path:
+            self.saver.put_writes(config, writes, task_id, task_path)
+        else:
+            self.saver.put_writes(config, writes, task_id)
+        self._store_writes(config, writes, task_id)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._aput_writes_task_path:
+            await self.saver.aput_writes(config, writes, task_id, task_path)
+        else:
+            await self.saver.aput_writes(config, writes, task_id)
+        self._store_writes(config, writes, task_id)
+
+    def forget(self, thread_ids: Sequence[str]) -> None:
+        """Drop threads that were deleted from the saver behind the cache's back."""
+        deleted = set(thread_ids)
+        for key in self.cache.keys():
+            if key[0] in deleted:
+                self.cache.pop(key)
+
+    async def aget_messages(
+        self, config: RunnableConfig, *, before: int | None = None, limit: int | None = None
+    ) -> tuple[Sequence[BaseMessage], int] | None:
+        """A page of a thread's messages, read from the saver as checkpoints are written through."""
+        if not hasattr(self.saver, "aget_messages"):
+            return None
+        return await self.saver.aget_messages(config, before=before, limit=limit)
+
+    def get_next_version(self, current: str | None, channel: ChannelProtocol) -> str:
+        return self.saver.get_next_version(current, channel)
+
+    def stats(self) -> dict[str, Any]:
+        lookups = self.hits + self.misses
+        cache_stats = self.cache.stats()
+        return {
+            "cached_saver": type(self.saver).__name__,
+            "cache_size": cache_stats["size"],
+            "cache_maxsize": cache_stats["maxsize"],
+            "cache_evictions": cache_stats["evictions"],
+            "cache_hits": self.hits,
+            "cache_misses": self.misses,
+            "cache_hit_rate": self.hits / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,119 @@
+from collections import OrderedDict
+from collections.abc import Iterator, Sequence
+from typing import Any
+
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+)
+from langgraph.checkpoint.memory import MemorySaver
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    In-memory checkpointer that bounds its size by evicting the least recently used threads.
+
+    A thread is evicted, with all its checkpoints and writes, once more than `max_threads`
+    threads are stored or their serialized checkpoints exceed `max_bytes` in total. The
+    thread being written is never evicted, so a single thread may exceed `max_bytes`.
+    """
+
+    def __init__(self, max_threads: int = 1000, max_bytes: int | None = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.max_threads = max_threads
+        self.max_bytes = max_bytes
+        # thread ID -> serialized bytes stored for it, least recently used first
+        self._thread_bytes: OrderedDict[str, int] = OrderedDict()
+        self._thread_writes: dict[str, set[tuple[str, str, str]]] = {}
+        self.total_bytes = 0
+        self.evictions = 0
+
+    def _touch(self, config: RunnableConfig | None) -> None:
+        thread_id = (config or {}).get("configurable", {}).get("thread_id")
+        if thread_id is not None and thread_id in self._thread_bytes:
+            self._thread_bytes.move_to_end(thread_id)
+
+    def _track(self, thread_id: str, added_bytes: int) -> None:
+        self._thread_bytes[thread_id] = self._thread_bytes.get(thread_id, 0) + added_bytes
+        self._thread_bytes.move_to_end(thread_id)
+        self.total_bytes += added_bytes
+        while len(self._thread_bytes) > 1 and (
+            len(self._thread_bytes) > self.max_threads
+            or (self.max_bytes is not None and self.total_bytes > self.max_bytes)
+        ):
+            self._evict(next(iter(self._thread_bytes)))
+
+    def _evict(self, thread_id: str) -> None:
+        self.total_bytes -= self._thread_bytes.pop(thread_id)
+        self.storage.pop(thread_id, None)
+        for key in self._thread_writes.pop(thread_id, ()):
+            self.writes.pop(key, None)
+        self.evictions += 1
+
+    def _writes_bytes(self, key: tuple[str, str, str]) -> int:
+        return sum(len(value[1]) for _, _, value, _ in self.writes.get(key, {}).values())
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        self._touch(config)
+        return super().get_tuple(config)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        self._touch(config)
+        return super().list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        thread_id = config["configurable"]["thread_id"]
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        previous = self.storage[thread_id][checkpoint_ns].get(checkpoint["id"])
+        next_config = super().put(config, checkpoint, metadata, new_versions)
+        saved_checkpoint, saved_metadata, _ = self.storage[thread_id][checkpoint_ns][
+            checkpoint["id"]
+        ]
+        added_bytes = len(saved_checkpoint[1]) + len(saved_metadata[1])
+        if previous:
+            added_bytes -= len(previous[0][1]) + len(previous[1][1])
+        self._track(thread_id, added_bytes)
+        return next_config
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        thread_id = config["configurable"]["thread_id"]
+        key = (
+            thread_id,
+            config["configurable"].get("checkpoint_ns", ""),
+            config["configurable"]["checkpoint_id"],
+        )
+        before = self._writes_bytes(key)
+        super().put_writes(config, writes, task_id, task_path)
+        self._thread_writes.setdefault(thread_id, set()).add(key)
+        self._track(thread_id, self._writes_bytes(key) - before)
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "threads": len(self._thread_bytes),
+            "max_threads": self.max_threads,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evictions": self.evictions,
+        }
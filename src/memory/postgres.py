@@ -1,9 +1,15 @@
 import logging
+from collections.abc import AsyncGenerator
+from contextlib import asynccontextmanager
+from typing import Any
 
-from langgraph.checkpoint.base import BaseCheckpointSaver
 from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
 
+from core.metrics import register_metrics, unregister_metrics
 from core.settings import settings
+from memory.serde import get_checkpoint_serializer
 
 logger = logging.getLogger(__name__)
 
@@ -39,7 +45,45 @@ def get_postgres_connection_string() -> str:
     )
 
 
-def get_postgres_saver() -> BaseCheckpointSaver:
-    """Initialize and return a PostgreSQL saver instance."""
+def get_pool_stats(pool: AsyncConnectionPool) -> dict[str, Any]:
+    """Summarize connection pool usage: connections in use, waiting requests and acquire latency."""
+    stats = pool.get_stats()
+    requests_num = stats.get("requests_num", 0)
+    requests_wait_ms = stats.get("requests_wait_ms", 0)
+    return {
+        "pool_min": stats.get("pool_min", 0),
+        "pool_max": stats.get("pool_max", 0),
+        "pool_size": stats.get("pool_size", 0),
+        "in_use": stats.get("pool_size", 0) - stats.get("pool_available", 0),
+        "waiting": stats.get("requests_waiting", 0),
+        "requests": requests_num,
+        "requests_timed_out": stats.get("requests_errors", 0),
+        "acquire_wait_ms_total": requests_wait_ms,
+        "acquire_wait_ms_avg": requests_wait_ms / requests_num if requests_num else 0.0,
+    }
+
+
+@asynccontextmanager
+async def get_postgres_saver() -> AsyncGenerator[AsyncPostgresSaver, None]:
+    """
+    Initialize and return a PostgreSQL saver backed by a sized connection pool.
+
+    The pool is sized by POSTGRES_MIN_SIZE / POSTGRES_POOL_SIZE so concurrent conversations
+    don't queue behind a single connection. Pool usage is exposed as "postgres_pool" metrics.
+    """
     validate_postgres_config()
-    return AsyncPostgresSaver.from_conn_string(get_postgres_connection_string())
+    async with AsyncConnectionPool(
+        get_postgres_connection_string(),
+        min_size=settings.POSTGRES_MIN_SIZE,
+        max_size=settings.POSTGRES_POOL_SIZE,
+        max_idle=settings.POSTGRES_MAX_IDLE_SECONDS,
+        # LangGraph requires autocommit and dict rows, same as AsyncPostgresSaver.from_conn_string
+        kwargs={"autocommit": True, "prepare_threshold": 0, "row_factory": dict_row},
+        check=AsyncConnectionPool.check_connection,
+        open=False,
+    ) as pool:
+        register_metrics("postgres_pool", lambda: get_pool_stats(pool))
+        try:
+            yield AsyncPostgresSaver(conn=pool, serde=get_checkpoint_serializer())
+        finally:
+            unregister_metrics("postgres_pool")
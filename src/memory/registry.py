@@ -0,0 +1,199 @@
+from collections.abc import AsyncIterator, Callable, Iterator, Sequence
+from contextlib import contextmanager
+from contextvars import ContextVar
+from inspect import signature
+from typing import Any
+
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    BaseCheckpointSaver,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.types import ChannelProtocol
+
+from core.metrics import register_metrics
+from core.settings import settings
+from memory.in_memory import BoundedMemorySaver
+
+
+def accepts_task_path(put_writes: Callable[..., Any]) -> bool:
+    # Older savers, such as the SQLite ones, take no task_path
+    return "task_path" in signature(put_writes).parameters
+
+
+# A checkpoint read ahead of a run, to be handed to that run instead of reading it again
+_preloaded: ContextVar[tuple[tuple[str, str], CheckpointTuple | None] | None] = ContextVar(
+    "preloaded_checkpoint", default=None
+)
+
+
+@contextmanager
+def preload_scope() -> Iterator[None]:
+    """
+    Scope of a run that may preload its checkpoint. A checkpoint preloaded in the scope that
+    the run didn't read, e.g. because it failed before starting, is dropped when it exits.
+    """
+    try:
+        yield
+    finally:
+        # Not a token reset, as an abandoned stream may be closed from another context
+        _preloaded.set(None)
+
+
+def _thread_key(config: RunnableConfig) -> tuple[str, str]:
+    configurable = config["configurable"]
+    return str(configurable["thread_id"]), configurable.get("checkpoint_ns", "")
+
+
+class SharedCheckpointer(BaseCheckpointSaver):
+    """
+    Checkpointer that forwards to a swappable backend.
+
+    Agents are compiled with this shared instance at import time, before the service has
+    opened its database, and the service plugs in the database saver on startup. Until
+    then, or outside the service, checkpoints go to a bounded in-memory saver.
+    """
+
+    def __init__(self) -> None:
+        super().__init__()
+        self.default = BoundedMemorySaver(
+            max_threads=settings.MEMORY_CHECKPOINT_MAX_THREADS,
+            max_bytes=settings.MEMORY_CHECKPOINT_MAX_BYTES,
+        )
+        self.saver = self.default
+
+    @property
+    def saver(self) -> BaseCheckpointSaver:
+        return self._saver
+
+    @saver.setter
+    def saver(self, saver: BaseCheckpointSaver) -> None:
+        self._saver = saver
+        self._put_writes_task_path = accepts_task_path(saver.put_writes)
+        self._aput_writes_task_path = accepts_task_path(saver.aput_writes)
+
+    def get_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        return self.saver.get_tuple(config)
+
+    def list(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> Iterator[CheckpointTuple]:
+        return self.saver.list(config, filter=filter, before=before, limit=limit)
+
+    def put(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return self.saver.put(config, checkpoint, metadata, new_versions)
+
+    def put_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._put_writes_task_path:
+            return self.saver.put_writes(config, writes, task_id, task_path)
+        return self.saver.put_writes(config, writes, task_id)
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        if (preloaded := _preloaded.get()) is not None:
+            key, saved = preloaded
+            requested_id = get_checkpoint_id(config)
+            if key == _thread_key(config) and (
+                not requested_id or (saved and saved.checkpoint["id"] == requested_id)
+            ):
+                _preloaded.set(None)
+                return saved
+        return await self.saver.aget_tuple(config)
+
+    async def apreload(self, config: RunnableConfig) -> CheckpointTuple | None:
+        """
+        Read the latest checkpoint of a thread ahead of a run.
+
+        The next run on the thread in the same context (task) gets this checkpoint instead of
+        reading and deserializing it again. Callers must not modify it, and should preload
+        within a preload_scope around the run.
+        """
+        saved = await self.saver.aget_tuple(config)
+        _preloaded.set((_thread_key(config), saved))
+        return saved
+
+    def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        return self.saver.alist(config, filter=filter, before=before, limit=limit)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        return await self.saver.aput(config, checkpoint, metadata, new_versions)
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+        task_path: str = "",
+    ) -> None:
+        if self._aput_writes_task_path:
+            return await self.saver.aput_writes(config, writes, task_id, task_path)
+        return await self.saver.aput_writes(config, writes, task_id)
+
+    async def aget_messages(
+        self, config: RunnableConfig, *, before: int | None = None, limit: int | None = None
+    ) -> tuple[Sequence[BaseMessage], int] | None:
+        """
+        A page of the messages of a thread's latest checkpoint and the index of its first
+        message, read without loading the rest, or None if the saver can't page them.
+        See PooledSqliteSaver.aget_messages.
+        """
+        if not hasattr(self.saver, "aget_messages"):
+            return None
+        return await self.saver.aget_messages(config, before=before, limit=limit)
+
+    def get_next_version(self, current: str | None, channel: ChannelProtocol) -> str:
+        return self.saver.get_next_version(current, channel)
+
+    def stats(self) -> dict[str, Any]:
+        stats = {"backend": type(self.saver).__name__}
+        if hasattr(self.saver, "stats"):
+            stats.update(self.saver.stats())
+        return stats
+
+
+_checkpointer = SharedCheckpointer()
+register_metrics("checkpointer", _checkpointer.stats)
+
+
+def get_checkpointer() -> SharedCheckpointer:
+    """The checkpointer that all agents are compiled with."""
+    return _checkpointer
+
+
+def set_checkpointer(saver: BaseCheckpointSaver | None) -> None:
+    """Plug a saver into the shared checkpointer, or None to go back to the in-memory default."""
+    _checkpointer.saver = saver or _checkpointer.default
@@ -0,0 +1,359 @@
+import asyncio
+import logging
+import time
+from collections.abc import AsyncGenerator, Callable, Iterable
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.base.id import UUID
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from psycopg import AsyncConnection
+from psycopg_pool import AsyncConnectionPool
+
+from core.metrics import register_metrics, unregister_metrics
+from memory.sqlite import PooledSqliteSaver
+
+logger = logging.getLogger(__name__)
+
+# 100ns intervals between the UUID epoch (1582-10-15) and the Unix epoch
+_UUID_EPOCH_OFFSET = 0x01B21DD213814000
+
+
+def checkpoint_created_at(checkpoint_id: str) -> float:
+    """Unix time a checkpoint was created, from its ID (a time-ordered UUIDv6)."""
+    return (UUID(checkpoint_id).time - _UUID_EPOCH_OFFSET) / 10_000_000
+
+
+@dataclass
+class PruneResult:
+    checkpoints_deleted: int = 0
+    writes_deleted: int = 0
+    # Channel values stored apart from their checkpoints (Postgres only)
+    blobs_deleted: int = 0
+    # Entries of the message log of expired threads (SQLite only)
+    messages_deleted: int = 0
+    expired_threads: list[str] = field(default_factory=list)
+    # Size of the deleted checkpoints, writes, blobs and messages
+    bytes_reclaimed: int = 0
+    # How much the database file shrank when vacuumed (SQLite only)
+    file_bytes_reclaimed: int = 0
+
+
+class CheckpointRetention:
+    """
+    Delete checkpoints that are no longer needed, so the checkpoint database stops growing.
+
+    LangGraph saves a checkpoint for every step of every thread and never deletes them. Each
+    pass of this policy:
+
+    - deletes idle threads whose latest checkpoint is older than `ttl` seconds,
+    - keeps the last `keep_last` checkpoints of every thread (and subgraph namespace), which
+      is all a conversation needs to continue, and deletes older history and its writes. The
+      message log of a thread is append-only, so it's kept until the thread is deleted,
+    - with `vacuum`, compacts the database so the freed space is reused or returned.
+
+    Supports the async SQLite and Postgres savers.
+    """
+
+    def __init__(
+        self,
+        saver: BaseCheckpointSaver,
+        keep_last: int | None = None,
+        ttl: float | None = None,
+        vacuum: bool = False,
+        on_expired: Callable[[list[str]], None] | None = None,
+    ) -> None:
+        if keep_last is not None and keep_last < 1:
+            raise ValueError("keep_last must be at least 1")
+        if not isinstance(saver, AsyncSqliteSaver | AsyncPostgresSaver):
+            raise TypeError(f"Checkpoint retention doesn't support {type(saver).__name__}")
+        self.saver = saver
+        self.keep_last = keep_last
+        self.ttl = ttl
+        self.vacuum = vacuum
+        # Called with the deleted threads, e.g. to drop them from a cache
+        self.on_expired = on_expired
+        self.runs = 0
+        self.failures = 0
+        self.totals = PruneResult()
+        self.threads_expired = 0
+        self.last_run_at: float | None = None
+        self.last_run_s = 0.0
+
+    async def prune(self) -> PruneResult:
+        """Run one retention pass."""
+        started = time.perf_counter()
+        if isinstance(self.saver, AsyncSqliteSaver):
+            result = await self._prune_sqlite(self.saver)
+        else:
+            result = await self._prune_postgres(self.saver)
+        self.runs += 1
+        self.last_run_at = time.time()
+        self.last_run_s = time.perf_counter() - started
+        self.totals.checkpoints_deleted += result.checkpoints_deleted
+        self.totals.writes_deleted += result.writes_deleted
+        self.totals.blobs_deleted += result.blobs_deleted
+        self.totals.messages_deleted += result.messages_deleted
+        self.totals.bytes_reclaimed += result.bytes_reclaimed
+        self.totals.file_bytes_reclaimed += result.file_bytes_reclaimed
+        self.threads_expired += len(result.expired_threads)
+        if result.expired_threads and self.on_expired:
+            self.on_expired(result.expired_threads)
+        return result
+
+    async def run(self, interval: float) -> None:
+        """Prune every `interval` seconds until cancelled."""
+        register_metrics("checkpoint_retention", self.stats)
+        try:
+            while True:
+                await asyncio.sleep(interval)
+                try:
+                    result = await self.prune()
+                except Exception:
+                    self.failures += 1
+                    logger.exception("Checkpoint retention pass failed")
+                    continue
+                logger.info(
+                    "Checkpoint retention deleted %d checkpoints and %d threads, "
+                    "reclaiming %d bytes",
+                    result.checkpoints_deleted,
+                    len(result.expired_threads),
+                    result.bytes_reclaimed,
+                )
+        finally:
+            unregister_metrics("checkpoint_retention")
+
+    def _expired(self, latest: Iterable[tuple[str, str]]) -> list[str]:
+        if self.ttl is None:
+            return []
+        cutoff = time.time() - self.ttl
+        return [
+            thread_id
+            for thread_id, checkpoint_id in latest
+            if checkpoint_created_at(checkpoint_id) < cutoff
+        ]
+
+    async def _prune_sqlite(self, saver: AsyncSqliteSaver) -> PruneResult:
+        result = PruneResult()
+        conn = saver.conn
+
+        async def delete(sql: str, params: Iterable[Any] = ()) -> tuple[int, int]:
+            # Each statement returns the size of the rows it deleted
+            async with conn.execute(sql, tuple(params)) as cur:
+                sizes = [size for (size,) in await cur.fetchall()]
+            return len(sizes), sum(sizes)
+
+        async with saver.lock:
+            async with conn.execute(
+                "SELECT thread_id, MAX(checkpoint_id) FROM checkpoints GROUP BY thread_id"
+            ) as cur:
+                result.expired_threads = self._expired(await cur.fetchall())
+            async with conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'messages'"
+            ) as cur:
+                has_message_log = await cur.fetchone() is not None
+            for thread_id in result.expired_threads:
+                deleted, size = await delete(
+                    "DELETE FROM checkpoints WHERE thread_id = ? "
+                    "RETURNING LENGTH(checkpoint) + LENGTH(metadata)",
+                    (thread_id,),
+                )
+                result.checkpoints_deleted += deleted
+                result.bytes_reclaimed += size
+                if has_message_log:
+                    deleted, size = await delete(
+                        "DELETE FROM messages WHERE thread_id = ? RETURNING LENGTH(value)",
+                        (thread_id,),
+                    )
+                    result.messages_deleted += deleted
+                    result.bytes_reclaimed += size
+            if isinstance(saver, PooledSqliteSaver):
+                saver.forget(result.expired_threads)
+            if self.keep_last is not None:
+                deleted, size = await delete(
+                    """
+                    DELETE FROM checkpoints WHERE rowid IN (
+                        SELECT rowid FROM (
+                            SELECT rowid, ROW_NUMBER() OVER (
+                                PARTITION BY thread_id, checkpoint_ns ORDER BY checkpoint_id DESC
+                            ) AS n FROM checkpoints
+                        ) WHERE n > ?
+                    )
+                    RETURNING LENGTH(checkpoint) + LENGTH(metadata)
+                    """,
+                    (self.keep_last,),
+                )
+                result.checkpoints_deleted += deleted
+                result.bytes_reclaimed += size
+            if result.checkpoints_deleted:
+                deleted, size = await delete(
+                    """
+                    DELETE FROM writes WHERE NOT EXISTS (
+                        SELECT 1 FROM checkpoints c
+                        WHERE c.thread_id = writes.thread_id
+                        AND c.checkpoint_ns = writes.checkpoint_ns
+                        AND c.checkpoint_id = writes.checkpoint_id
+                    )
+                    RETURNING LENGTH(value)
+                    """
+                )
+                result.writes_deleted += deleted
+                result.bytes_reclaimed += size
+            await conn.commit()
+
+            if self.vacuum:
+                size_before = await self._sqlite_size(saver)
+                await conn.execute("VACUUM")
+                result.file_bytes_reclaimed = size_before - await self._sqlite_size(saver)
+        return result
+
+    @staticmethod
+    async def _sqlite_size(saver: AsyncSqliteSaver) -> int:
+        async with saver.conn.execute(
+            "SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()"
+        ) as cur:
+            (size,) = await cur.fetchone()
+        return size
+
+    @asynccontextmanager
+    async def _postgres_connection(
+        self, saver: AsyncPostgresSaver
+    ) -> AsyncGenerator[AsyncConnection, None]:
+        if isinstance(saver.conn, AsyncConnectionPool):
+            async with saver.conn.connection() as conn:
+                yield conn
+        else:
+            # A single connection is shared with the saver, which serializes its use
+            async with saver.lock:
+                yield saver.conn
+
+    async def _prune_postgres(self, saver: AsyncPostgresSaver) -> PruneResult:
+        result = PruneResult()
+
+        async def delete(conn: AsyncConnection, sql: str, params: tuple[Any, ...]) -> list[dict]:
+            async with conn.cursor() as cur:
+                await cur.execute(sql, params)
+                return await cur.fetchall()
+
+        async with self._postgres_connection(saver) as conn:
+            async with conn.cursor() as cur:
+                await cur.execute(
+                    "SELECT thread_id, MAX(checkpoint_id) AS checkpoint_id "
+                    "FROM checkpoints GROUP BY thread_id"
+                )
+                latest = [(row["thread_id"], row["checkpoint_id"]) for row in await cur.fetchall()]
+            result.expired_threads = self._expired(latest)
+            if result.expired_threads:
+                async with conn.transaction():
+                    for table, size_sql in (
+                        ("checkpoints", "pg_column_size(checkpoint) + pg_column_size(metadata)"),
+                        ("checkpoint_writes", "LENGTH(blob)"),
+                        ("checkpoint_blobs", "COALESCE(LENGTH(blob), 0)"),
+                    ):
+                        rows = await delete(
+                            conn,
+                            f"DELETE FROM {table} WHERE thread_id = ANY(%s) "
+                            f"RETURNING {size_sql} AS size",
+                            (result.expired_threads,),
+                        )
+                        result.bytes_reclaimed += sum(row["size"] for row in rows)
+                        if table == "checkpoints":
+                            result.checkpoints_deleted += len(rows)
+                        elif table == "checkpoint_writes":
+                            result.writes_deleted += len(rows)
+                        else:
+                            result.blobs_deleted += len(rows)
+
+            if self.keep_last is not None:
+                async with conn.transaction():
+                    rows = await delete(
+                        conn,
+                        """
+                        DELETE FROM checkpoints
+                        WHERE (thread_id, checkpoint_ns, checkpoint_id) IN (
+                            SELECT thread_id, checkpoint_ns, checkpoint_id FROM (
+                                SELECT thread_id, checkpoint_ns, checkpoint_id,
+                                    ROW_NUMBER() OVER (
+                                        PARTITION BY thread_id, checkpoint_ns
+                                        ORDER BY checkpoint_id DESC
+                                    ) AS n
+                                FROM checkpoints
+                            ) ranked WHERE n > %s
+                        )
+                        RETURNING thread_id,
+                            pg_column_size(checkpoint) + pg_column_size(metadata) AS size
+                        """,
+                        (self.keep_last,),
+                    )
+                    result.checkpoints_deleted += len(rows)
+                    result.bytes_reclaimed += sum(row["size"] for row in rows)
+                    pruned_threads = list({row["thread_id"] for row in rows})
+                    if pruned_threads:
+                        rows = await delete(
+                            conn,
+                            """
+                            DELETE FROM checkpoint_writes w
+                            WHERE w.thread_id = ANY(%s) AND NOT EXISTS (
+                                SELECT 1 FROM checkpoints c
+                                WHERE c.thread_id = w.thread_id
+                                AND c.checkpoint_ns = w.checkpoint_ns
+                                AND c.checkpoint_id = w.checkpoint_id
+                            )
+                            RETURNING LENGTH(w.blob) AS size
+                            """,
+                            (pruned_threads,),
+                        )
+                        result.writes_deleted += len(rows)
+                        result.bytes_reclaimed += sum(row["size"] for row in rows)
+                        # Channel values are shared by the checkpoints whose versions reference
+                        # them. Blobs newer than any checkpoint may belong to a checkpoint being
+                        # written right now, so only older unreferenced versions are deleted.
+                        rows = await delete(
+                            conn,
+                            """
+                            DELETE FROM checkpoint_blobs b
+                            WHERE b.thread_id = ANY(%s) AND NOT EXISTS (
+                                SELECT 1 FROM checkpoints c
+                                WHERE c.thread_id = b.thread_id
+                                AND c.checkpoint_ns = b.checkpoint_ns
+                                AND c.checkpoint -> 'channel_versions' ->> b.channel = b.version
+                            ) AND b.version < (
+                                SELECT MAX(c.checkpoint -> 'channel_versions' ->> b.channel)
+                                FROM checkpoints c
+                                WHERE c.thread_id = b.thread_id
+                                AND c.checkpoint_ns = b.checkpoint_ns
+                            )
+                            RETURNING COALESCE(LENGTH(b.blob), 0) AS size
+                            """,
+                            (pruned_threads,),
+                        )
+                        result.blobs_deleted += len(rows)
+                        result.bytes_reclaimed += sum(row["size"] for row in rows)
+
+            if self.vacuum:
+                # Makes the freed space reusable. Unlike VACUUM FULL, it doesn't lock the tables.
+                await conn.execute(
+                    "VACUUM (ANALYZE) checkpoints, checkpoint_writes, checkpoint_blobs"
+                )
+        return result
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "keep_last": self.keep_last,
+            "ttl": self.ttl,
+            "vacuum": self.vacuum,
+            "runs": self.runs,
+            "failures": self.failures,
+            "last_run_at": self.last_run_at,
+            "last_run_s": self.last_run_s,
+            "checkpoints_deleted": self.totals.checkpoints_deleted,
+            "writes_deleted": self.totals.writes_deleted,
+            "blobs_deleted": self.totals.blobs_deleted,
+            "messages_deleted": self.totals.messages_deleted,
+            "threads_expired": self.threads_expired,
+            "bytes_reclaimed": self.totals.bytes_reclaimed,
+            "file_bytes_reclaimed": self.totals.file_bytes_reclaimed,
+        }
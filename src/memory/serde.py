@@ -0,0 +1,127 @@
+import zlib
+from collections.abc import Callable
+from typing import Any, Protocol
+
+from langgraph.checkpoint.serde.base import SerializerProtocol
+from langgraph.checkpoint.serde.jsonplus import JsonPlusSerializer
+
+from core.settings import CompressionCodec, settings
+
+
+class Codec(Protocol):
+    name: str
+
+    def compress(self, data: bytes) -> bytes: ...
+
+    def decompress(self, data: bytes) -> bytes: ...
+
+
+class ZlibCodec:
+    name = "zlib"
+
+    # Checkpoints are written on every step, and higher levels cost more time than they save
+    def __init__(self, level: int = 1) -> None:
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        return zlib.compress(data, self.level)
+
+    def decompress(self, data: bytes) -> bytes:
+        return zlib.decompress(data)
+
+
+class ZstdCodec:
+    name = "zstd"
+
+    def __init__(self, level: int = 3) -> None:
+        try:
+            import zstandard
+        except ImportError as e:
+            raise ImportError(
+                "The zstd checkpoint codec requires the zstandard package: pip install zstandard"
+            ) from e
+        self._zstd = zstandard
+        self.level = level
+
+    def compress(self, data: bytes) -> bytes:
+        # Compressor objects aren't thread-safe, and savers may be called from worker threads
+        return self._zstd.ZstdCompressor(level=self.level).compress(data)
+
+    def decompress(self, data: bytes) -> bytes:
+        return self._zstd.ZstdDecompressor().decompress(data)
+
+
+CODECS: dict[str, Callable[[], Codec]] = {
+    ZlibCodec.name: ZlibCodec,
+    ZstdCodec.name: ZstdCodec,
+}
+# Separates the wrapped serializer's type from the codec, e.g. "msgpack+zlib"
+_CODEC_SEPARATOR = "+"
+
+
+class CompressedSerializer(SerializerProtocol):
+    """
+    Serializer that compresses large checkpoint values before they're stored.
+
+    Values that serialize to at least `threshold` bytes are compressed with `codec`, and their
+    type is tagged with the codec name, e.g. "msgpack+zlib". Smaller values, values that don't
+    compress, and rows written before compression was enabled are stored and read untagged, so
+    existing databases keep working. Rows written with any registered codec can be read,
+    whichever codec is configured for writing, including None, which writes uncompressed.
+    """
+
+    def __init__(
+        self,
+        serde: SerializerProtocol | None = None,
+        codec: str | None = ZlibCodec.name,
+        threshold: int = 1024,
+    ) -> None:
+        if codec is not None and codec not in CODECS:
+            raise ValueError(f"Unknown codec {codec!r}, expected one of {', '.join(CODECS)}")
+        self.serde = serde or JsonPlusSerializer()
+        self.threshold = threshold
+        self._codecs: dict[str, Codec] = {}
+        self.codec = self._get_codec(codec) if codec is not None else None
+
+    def _get_codec(self, name: str) -> Codec:
+        if name not in self._codecs:
+            self._codecs[name] = CODECS[name]()
+        return self._codecs[name]
+
+    def dumps(self, obj: Any) -> bytes:
+        return self.serde.dumps(obj)
+
+    def loads(self, data: bytes) -> Any:
+        return self.serde.loads(data)
+
+    def dumps_typed(self, obj: Any) -> tuple[str, bytes]:
+        return self.compress_typed(self.serde.dumps_typed(obj))
+
+    def compress_typed(self, serialized: tuple[str, bytes]) -> tuple[str, bytes]:
+        """Compress a value serialized by the wrapped serializer, as dumps_typed does."""
+        type_, data = serialized
+        if self.codec is None or data is None or len(data) < self.threshold:
+            return type_, data
+        compressed = self.codec.compress(data)
+        if len(compressed) >= len(data):
+            return type_, data
+        return f"{type_}{_CODEC_SEPARATOR}{self.codec.name}", compressed
+
+    def loads_typed(self, data: tuple[str, bytes]) -> Any:
+        type_, payload = data
+        base_type, separator, codec = type_.rpartition(_CODEC_SEPARATOR)
+        if separator and codec in CODECS:
+            return self.serde.loads_typed((base_type, self._get_codec(codec).decompress(payload)))
+        return self.serde.loads_typed(data)
+
+
+def get_checkpoint_serializer() -> CompressedSerializer:
+    """
+    The serializer for checkpoints saved to the database. It reads compressed rows even when
+    compression is off, so turning it off doesn't strand the rows already written with it.
+    """
+    codec = settings.CHECKPOINT_COMPRESSION
+    return CompressedSerializer(
+        codec=None if codec == CompressionCodec.NONE else codec,
+        threshold=settings.CHECKPOINT_COMPRESSION_THRESHOLD,
+    )
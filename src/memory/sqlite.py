@@ -1,9 +1,524 @@
-from langgraph.checkpoint.base import BaseCheckpointSaver
+import asyncio
+import hashlib
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Sequence
+from contextlib import AsyncExitStack, asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Any
+
+import aiosqlite
+from langchain_core.messages import BaseMessage
+from langchain_core.runnables import RunnableConfig
+from langgraph.checkpoint.base import (
+    WRITES_IDX_MAP,
+    ChannelVersions,
+    Checkpoint,
+    CheckpointMetadata,
+    CheckpointTuple,
+    get_checkpoint_id,
+)
+from langgraph.checkpoint.serde.base import SerializerProtocol
 from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.checkpoint.sqlite.utils import search_where
 
+from core.cache import LRUCache
+from core.metrics import register_metrics, unregister_metrics
 from core.settings import settings
+from memory.serde import CompressedSerializer, get_checkpoint_serializer
+
+_SELECT_WRITES = (
+    "SELECT task_id, channel, type, value FROM writes "
+    "WHERE thread_id = ? AND checkpoint_ns = ? AND checkpoint_id = ? ORDER BY task_id, idx"
+)
+
+# Append-only log of the messages of each thread, each stored once, in the order they were
+# first checkpointed. A message edited in place (same ID) is logged again as a new entry.
+_CREATE_MESSAGES = """
+CREATE TABLE IF NOT EXISTS messages (
+    thread_id TEXT NOT NULL,
+    checkpoint_ns TEXT NOT NULL DEFAULT '',
+    seq INTEGER NOT NULL,
+    message_id TEXT NOT NULL,
+    digest BLOB NOT NULL,
+    type TEXT,
+    value BLOB,
+    PRIMARY KEY (thread_id, checkpoint_ns, seq)
+);
+"""
+# Stands in for a list of messages in a checkpoint: ranges of their sequence numbers in the log
+_MESSAGE_LOG_REFS = "__message_log__"
+
+
+def _is_message_list(value: Any) -> bool:
+    return (
+        isinstance(value, list) and bool(value) and all(isinstance(m, BaseMessage) for m in value)
+    )
+
+
+def _to_ranges(seqs: Sequence[int]) -> list[list[int]]:
+    """Compact sequence numbers into inclusive [start, end] ranges, e.g. [0, 1, 2, 5] to
+    [[0, 2], [5, 5]]. A conversation that only appends messages is a single range."""
+    ranges: list[list[int]] = []
+    for seq in seqs:
+        if ranges and ranges[-1][1] == seq - 1:
+            ranges[-1][1] = seq
+        else:
+            ranges.append([seq, seq])
+    return ranges
+
+
+def _message_refs(checkpoint: Checkpoint) -> dict[str, list[int]]:
+    return {
+        channel: [seq for start, end in value[_MESSAGE_LOG_REFS] for seq in range(start, end + 1)]
+        for channel, value in checkpoint["channel_values"].items()
+        if isinstance(value, dict) and _MESSAGE_LOG_REFS in value
+    }
+
+
+@dataclass
+class _ThreadLog:
+    # (message ID, digest of the serialized message) -> sequence number in the log
+    seqs: dict[tuple[str, bytes], int] = field(default_factory=dict)
+    next_seq: int = 0
+
+
+class PooledSqliteSaver(AsyncSqliteSaver):
+    """
+    SQLite saver with a dedicated writer connection and a pool of reader connections.
+
+    AsyncSqliteSaver serializes every read and write on one connection. In WAL mode SQLite
+    allows readers alongside a writer, so here checkpoints are written through `conn`, still
+    one at a time, and read through whichever reader connection is free. Each aiosqlite
+    connection has its own thread, so reads run in parallel with each other and with writes.
+    Without readers, this behaves like AsyncSqliteSaver.
+
+    Every checkpoint holds the whole message list, so a conversation writes O(turns²) bytes.
+    With `message_log`, messages are written once to a per-thread append-only log instead, and
+    checkpoints only reference their positions in it. Checkpoints written either way are read.
+    The log assumes this process is the only writer of its threads, like the checkpoint cache.
+    """
+
+    def __init__(
+        self,
+        conn: aiosqlite.Connection,
+        readers: list[aiosqlite.Connection] | None = None,
+        *,
+        serde: SerializerProtocol | None = None,
+        message_log: bool = False,
+    ) -> None:
+        super().__init__(conn, serde=serde)
+        self.readers = readers or []
+        self._idle: asyncio.Queue[aiosqlite.Connection] = asyncio.Queue()
+        for reader in self.readers:
+            self._idle.put_nowait(reader)
+        self.reads = 0
+        self.read_wait_ms_total = 0.0
+        self.message_log = message_log
+        # (thread ID, checkpoint namespace) -> messages already in the log
+        self._thread_logs: LRUCache[tuple[str, str], _ThreadLog] = LRUCache(1000)
+        self.messages_logged = 0
+        self.messages_referenced = 0
+
+    async def setup(self) -> None:
+        if not self.is_setup:
+            async with self.lock:
+                async with self.conn.executescript(_CREATE_MESSAGES):
+                    await self.conn.commit()
+        await super().setup()
+
+    @asynccontextmanager
+    async def _reader(self) -> AsyncIterator[aiosqlite.Connection]:
+        if not self.readers:
+            async with self.lock:
+                yield self.conn
+            return
+        started = time.perf_counter()
+        reader = await self._idle.get()
+        self.reads += 1
+        self.read_wait_ms_total += (time.perf_counter() - started) * 1000
+        try:
+            yield reader
+        finally:
+            self._idle.put_nowait(reader)
+
+    def _load(
+        self,
+        config: RunnableConfig,
+        row: tuple[Any, ...],
+        writes: list[tuple[str, str, str, bytes]],
+    ) -> CheckpointTuple:
+        thread_id, checkpoint_ns, _, parent_checkpoint_id, type_, checkpoint, metadata = row
+        return CheckpointTuple(
+            config,
+            self.serde.loads_typed((type_, checkpoint)),
+            self.jsonplus_serde.loads(metadata) if metadata is not None else {},
+            (
+                {
+                    "configurable": {
+                        "thread_id": thread_id,
+                        "checkpoint_ns": checkpoint_ns,
+                        "checkpoint_id": parent_checkpoint_id,
+                    }
+                }
+                if parent_checkpoint_id
+                else None
+            ),
+            [
+                (task_id, channel, self.serde.loads_typed((type_, value)))
+                for task_id, channel, type_, value in writes
+            ],
+        )
+
+    async def _thread_log(self, thread_id: str, checkpoint_ns: str) -> _ThreadLog:
+        """The messages of a thread already in the log. Must be called holding the lock."""
+        key = (thread_id, checkpoint_ns)
+        if (log := self._thread_logs.get(key)) is None:
+            log = _ThreadLog()
+            async with self.conn.execute(
+                "SELECT message_id, digest, seq FROM messages "
+                "WHERE thread_id = ? AND checkpoint_ns = ?",
+                key,
+            ) as cur:
+                async for message_id, digest, seq in cur:
+                    log.seqs[(message_id, digest)] = seq
+                    log.next_seq = max(log.next_seq, seq + 1)
+            self._thread_logs.set(key, log)
+        return log
+
+    def _serialize_message(self, message: BaseMessage) -> tuple[str, bytes]:
+        # Uncompressed, so that messages already in the log are only serialized to be hashed
+        if isinstance(self.serde, CompressedSerializer):
+            return self.serde.serde.dumps_typed(message)
+        return self.serde.dumps_typed(message)
+
+    def _store_message(self, serialized: tuple[str, bytes]) -> tuple[str, bytes]:
+        if isinstance(self.serde, CompressedSerializer):
+            return self.serde.compress_typed(serialized)
+        return serialized
+
+    def _log_messages(
+        self, log: _ThreadLog, thread_id: str, checkpoint_ns: str, checkpoint: Checkpoint
+    ) -> tuple[Checkpoint, list[tuple[Any, ...]], dict[tuple[str, bytes], int]]:
+        """
+        The checkpoint referencing its messages in the log, the rows of the messages new to
+        the log, and their sequence numbers. `log` is left as is until the rows are committed.
+        """
+        channels = [
+            channel
+            for channel, value in checkpoint["channel_values"].items()
+            if _is_message_list(value)
+        ]
+        if not channels:
+            return checkpoint, [], {}
+        channel_values = dict(checkpoint["channel_values"])
+        rows = []
+        new_seqs: dict[tuple[str, bytes], int] = {}
+        for channel in channels:
+            seqs = []
+            for message in channel_values[channel]:
+                type_, value = self._serialize_message(message)
+                key = (message.id or "", hashlib.blake2b(value, digest_size=16).digest())
+                seq = log.seqs.get(key, new_seqs.get(key))
+                if seq is None:
+                    seq = new_seqs[key] = log.next_seq + len(new_seqs)
+                    rows.append(
+                        (thread_id, checkpoint_ns, seq, *key, *self._store_message((type_, value)))
+                    )
+                seqs.append(seq)
+            channel_values[channel] = {_MESSAGE_LOG_REFS: _to_ranges(seqs)}
+            self.messages_referenced += len(seqs)
+        return {**checkpoint, "channel_values": channel_values}, rows, new_seqs
+
+    async def _read_log(
+        self, conn: aiosqlite.Connection, thread_id: str, checkpoint_ns: str, seqs: Sequence[int]
+    ) -> dict[int, tuple[str, bytes]]:
+        """The serialized messages of a thread's log with the given sequence numbers."""
+        ranges = _to_ranges(sorted(set(seqs)))
+        async with conn.execute(
+            "SELECT seq, type, value FROM messages WHERE thread_id = ? AND checkpoint_ns = ? "
+            f"AND ({' OR '.join(['seq BETWEEN ? AND ?'] * len(ranges))})",
+            (thread_id, checkpoint_ns, *(bound for seq_range in ranges for bound in seq_range)),
+        ) as cur:
+            return {seq: (type_, value) for seq, type_, value in await cur.fetchall()}
+
+    async def _load_messages(
+        self, conn: aiosqlite.Connection, saved: CheckpointTuple, refs: dict[str, list[int]]
+    ) -> None:
+        """Replace the message log references in a loaded checkpoint with the messages."""
+        seqs = [seq for channel_seqs in refs.values() for seq in channel_seqs]
+        configurable = saved.config["configurable"]
+        rows = await self._read_log(
+            conn, configurable["thread_id"], configurable["checkpoint_ns"], seqs
+        )
+        for channel, channel_seqs in refs.items():
+            saved.checkpoint["channel_values"][channel] = [
+                self.serde.loads_typed(rows[seq]) for seq in channel_seqs
+            ]
+
+    def forget(self, thread_ids: Sequence[str]) -> None:
+        """Drop what's known about the message logs of threads that were deleted."""
+        deleted = set(thread_ids)
+        for key in self._thread_logs.keys():
+            if key[0] in deleted:
+                self._thread_logs.pop(key)
+
+    async def aput(
+        self,
+        config: RunnableConfig,
+        checkpoint: Checkpoint,
+        metadata: CheckpointMetadata,
+        new_versions: ChannelVersions,
+    ) -> RunnableConfig:
+        if not self.message_log:
+            return await super().aput(config, checkpoint, metadata, new_versions)
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"]["checkpoint_ns"]
+        async with self.lock:
+            log = await self._thread_log(thread_id, checkpoint_ns)
+            checkpoint, rows, new_seqs = self._log_messages(
+                log, thread_id, checkpoint_ns, checkpoint
+            )
+            type_, serialized_checkpoint = self.serde.dumps_typed(checkpoint)
+            # The new messages and the checkpoint referencing them are committed together
+            try:
+                if rows:
+                    await self.conn.executemany(
+                        "INSERT INTO messages (thread_id, checkpoint_ns, seq, message_id, "
+                        "digest, type, value) VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        rows,
+                    )
+                await self.conn.execute(
+                    "INSERT OR REPLACE INTO checkpoints (thread_id, checkpoint_ns, checkpoint_id, "
+                    "parent_checkpoint_id, type, checkpoint, metadata) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (
+                        thread_id,
+                        checkpoint_ns,
+                        checkpoint["id"],
+                        config["configurable"].get("checkpoint_id"),
+                        type_,
+                        serialized_checkpoint,
+                        self.jsonplus_serde.dumps(metadata),
+                    ),
+                )
+                await self.conn.commit()
+            except BaseException:
+                await self.conn.rollback()
+                raise
+            log.seqs.update(new_seqs)
+            log.next_seq += len(new_seqs)
+            self.messages_logged += len(rows)
+        return {
+            "configurable": {
+                "thread_id": thread_id,
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": checkpoint["id"],
+            }
+        }
+
+    async def aput_writes(
+        self,
+        config: RunnableConfig,
+        writes: Sequence[tuple[str, Any]],
+        task_id: str,
+    ) -> None:
+        # AsyncSqliteSaver leaves pending writes, such as interrupts, uncommitted until the next
+        # checkpoint, where the readers can't see them
+        query = (
+            "INSERT OR REPLACE INTO writes (thread_id, checkpoint_ns, checkpoint_id, task_id, "
+            "idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+            if all(w[0] in WRITES_IDX_MAP for w in writes)
+            else "INSERT OR IGNORE INTO writes (thread_id, checkpoint_ns, checkpoint_id, "
+            "task_id, idx, channel, type, value) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+        )
+        configurable = config["configurable"]
+        rows = [
+            (
+                str(configurable["thread_id"]),
+                str(configurable["checkpoint_ns"]),
+                str(configurable["checkpoint_id"]),
+                task_id,
+                WRITES_IDX_MAP.get(channel, idx),
+                channel,
+                *self.serde.dumps_typed(value),
+            )
+            for idx, (channel, value) in enumerate(writes)
+        ]
+        await self.setup()
+        async with self.lock:
+            await self.conn.executemany(query, rows)
+            await self.conn.commit()
+
+    async def aget_tuple(self, config: RunnableConfig) -> CheckpointTuple | None:
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+            "checkpoint, metadata FROM checkpoints WHERE thread_id = ? AND checkpoint_ns = ?"
+        )
+        if checkpoint_id := get_checkpoint_id(config):
+            query += " AND checkpoint_id = ?"
+            params: tuple[str, ...] = (thread_id, checkpoint_ns, checkpoint_id)
+        else:
+            query += " ORDER BY checkpoint_id DESC LIMIT 1"
+            params = (thread_id, checkpoint_ns)
+        async with self._reader() as conn:
+            async with conn.execute(query, params) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                return None
+            async with conn.execute(_SELECT_WRITES, (thread_id, checkpoint_ns, row[2])) as cur:
+                writes = await cur.fetchall()
+        # Deserialize after handing the connection back to the pool
+        config = {
+            "configurable": {
+                "thread_id": row[0],
+                "checkpoint_ns": checkpoint_ns,
+                "checkpoint_id": row[2],
+            }
+        }
+        saved = self._load(config, row, writes)
+        if refs := _message_refs(saved.checkpoint):
+            async with self._reader() as conn:
+                await self._load_messages(conn, saved, refs)
+        return saved
+
+    async def alist(
+        self,
+        config: RunnableConfig | None,
+        *,
+        filter: dict[str, Any] | None = None,
+        before: RunnableConfig | None = None,
+        limit: int | None = None,
+    ) -> AsyncIterator[CheckpointTuple]:
+        await self.setup()
+        where, params = search_where(config, filter, before)
+        query = (
+            "SELECT thread_id, checkpoint_ns, checkpoint_id, parent_checkpoint_id, type, "
+            f"checkpoint, metadata FROM checkpoints {where} ORDER BY checkpoint_id DESC"
+        )
+        if limit:
+            query += f" LIMIT {limit}"
+        async with self._reader() as conn:
+            async with conn.execute(query, params) as cur, conn.cursor() as wcur:
+                async for row in cur:
+                    thread_id, checkpoint_ns, checkpoint_id = row[:3]
+                    await wcur.execute(_SELECT_WRITES, (thread_id, checkpoint_ns, checkpoint_id))
+                    config = {
+                        "configurable": {
+                            "thread_id": thread_id,
+                            "checkpoint_ns": checkpoint_ns,
+                            "checkpoint_id": checkpoint_id,
+                        }
+                    }
+                    saved = self._load(config, row, await wcur.fetchall())
+                    if refs := _message_refs(saved.checkpoint):
+                        await self._load_messages(conn, saved, refs)
+                    yield saved
+
+    async def aget_messages(
+        self,
+        config: RunnableConfig,
+        *,
+        before: int | None = None,
+        limit: int | None = None,
+        channel: str = "messages",
+    ) -> tuple[Sequence[BaseMessage], int] | None:
+        """
+        A page of the messages of a thread's latest checkpoint, and the index of its first
+        message. The page holds the `limit` messages preceding index `before`, and only they
+        are read from the message log and deserialized.
+
+        Returns None when the checkpoint doesn't keep the channel in the log, e.g. it was saved
+        without `message_log`, or when it has pending writes to the channel, which reading the
+        graph's state would apply. The messages should then be read from the state.
+        """
+        await self.setup()
+        thread_id = str(config["configurable"]["thread_id"])
+        checkpoint_ns = config["configurable"].get("checkpoint_ns", "")
+        async with self._reader() as conn:
+            async with conn.execute(
+                "SELECT checkpoint_id, type, checkpoint FROM checkpoints "
+                "WHERE thread_id = ? AND checkpoint_ns = ? ORDER BY checkpoint_id DESC LIMIT 1",
+                (thread_id, checkpoint_ns),
+            ) as cur:
+                row = await cur.fetchone()
+            if row is None:
+                return None
+            checkpoint_id, type_, checkpoint = row
+            async with conn.execute(
+                "SELECT 1 FROM writes WHERE thread_id = ? AND checkpoint_ns = ? "
+                "AND checkpoint_id = ? AND channel = ? LIMIT 1",
+                (thread_id, checkpoint_ns, checkpoint_id, channel),
+            ) as cur:
+                if await cur.fetchone() is not None:
+                    return None
+            # With the messages in the log, the checkpoint only holds their ranges
+            seqs = _message_refs(self.serde.loads_typed((type_, checkpoint))).get(channel)
+            if seqs is None:
+                return None
+            end = len(seqs) if before is None else min(before, len(seqs))
+            start = 0 if limit is None else max(end - limit, 0)
+            page = seqs[start:end]
+            rows = await self._read_log(conn, thread_id, checkpoint_ns, page) if page else {}
+        return [self.serde.loads_typed(rows[seq]) for seq in page], start
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "readers": len(self.readers),
+            "readers_idle": self._idle.qsize(),
+            "reads": self.reads,
+            "read_wait_ms_avg": self.read_wait_ms_total / self.reads if self.reads else 0.0,
+            "message_log": self.message_log,
+            "messages_logged": self.messages_logged,
+            "messages_referenced": self.messages_referenced,
+        }
+
+
+async def _connect(path: str, read_only: bool = False) -> aiosqlite.Connection:
+    conn = await aiosqlite.connect(path, timeout=settings.SQLITE_BUSY_TIMEOUT)
+    pragmas = [
+        f"PRAGMA synchronous = {settings.SQLITE_SYNCHRONOUS}",
+        f"PRAGMA cache_size = {-settings.SQLITE_CACHE_SIZE_KB}",
+        f"PRAGMA mmap_size = {settings.SQLITE_MMAP_SIZE}",
+    ]
+    if read_only:
+        pragmas.append("PRAGMA query_only = ON")
+    else:
+        # Readers don't block the writer or each other in WAL mode. It persists in the file.
+        pragmas.insert(0, "PRAGMA journal_mode = WAL")
+    for pragma in pragmas:
+        await conn.execute(pragma)
+    return conn
+
 
+@asynccontextmanager
+async def get_sqlite_saver() -> AsyncGenerator[AsyncSqliteSaver, None]:
+    """
+    Initialize and return a SQLite saver with one writer connection and a pool of readers.
 
-def get_sqlite_saver() -> BaseCheckpointSaver:
-    """Initialize and return a SQLite saver instance."""
-    return AsyncSqliteSaver.from_conn_string(settings.SQLITE_DB_PATH)
+    The pool is sized by SQLITE_READ_POOL_SIZE, and its usage is exposed as "sqlite_pool"
+    metrics. An in-memory database can't be shared between connections, so it gets no readers.
+    """
+    path = settings.SQLITE_DB_PATH
+    pool_size = 0 if path == ":memory:" else settings.SQLITE_READ_POOL_SIZE
+    async with AsyncExitStack() as stack:
+        # The writer connects first, so the readers open the database in WAL mode
+        connections = []
+        for read_only in [False] + [True] * pool_size:
+            conn = await _connect(path, read_only=read_only)
+            stack.push_async_callback(conn.close)
+            connections.append(conn)
+        saver = PooledSqliteSaver(
+            connections[0],
+            connections[1:],
+            serde=get_checkpoint_serializer(),
+            message_log=settings.SQLITE_MESSAGE_LOG,
+        )
+        register_metrics("sqlite_pool", saver.stats)
+        try:
+            yield saver
+        finally:
+            unregister_metrics("sqlite_pool")
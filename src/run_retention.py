@@ -0,0 +1,57 @@
+import argparse
+import asyncio
+import sys
+
+from dotenv import load_dotenv
+
+from core import settings
+from memory import CheckpointRetention, initialize_database
+
+load_dotenv()
+
+
+async def main(keep_last: int | None, ttl: float | None, vacuum: bool) -> None:
+    async with initialize_database() as saver:
+        await saver.setup()
+        retention = CheckpointRetention(saver, keep_last=keep_last, ttl=ttl, vacuum=vacuum)
+        result = await retention.prune()
+    print(
+        f"Deleted {result.checkpoints_deleted} checkpoints, {result.writes_deleted} writes "
+        f"and {result.blobs_deleted} blobs, including {len(result.expired_threads)} idle threads"
+    )
+    print(f"Reclaimed {result.bytes_reclaimed} bytes of checkpoint data")
+    if vacuum:
+        print(f"The database file shrank by {result.file_bytes_reclaimed} bytes")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Run one checkpoint retention pass against the configured database. "
+        "Options default to the CHECKPOINT_* settings."
+    )
+    parser.add_argument(
+        "--keep-last",
+        type=int,
+        default=settings.CHECKPOINT_KEEP_LAST,
+        help="checkpoints to keep per thread",
+    )
+    parser.add_argument(
+        "--ttl",
+        type=float,
+        default=settings.CHECKPOINT_THREAD_TTL,
+        help="delete threads idle for longer than this many seconds",
+    )
+    parser.add_argument(
+        "--vacuum",
+        action=argparse.BooleanOptionalAction,
+        default=settings.CHECKPOINT_VACUUM,
+        help="compact the database afterwards",
+    )
+    args = parser.parse_args()
+    if args.keep_last is None and args.ttl is None and not args.vacuum:
+        parser.error("nothing to do, set --keep-last, --ttl or --vacuum")
+
+    # psycopg needs the selector event loop on Windows, see run_service.py
+    if sys.platform == "win32":
+        asyncio.set_event_loop_policy(asyncio.WindowsSelectorEventLoopPolicy())
+    asyncio.run(main(args.keep_last, args.ttl, args.vacuum))
@@ -1,6 +1,8 @@
 from schema.models import AllModelEnum
 from schema.schema import (
     AgentInfo,
+    BatchInput,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
@@ -22,4 +24,6 @@ __all__ = [
     "FeedbackResponse",
     "ChatHistoryInput",
     "ChatHistory",
+    "BatchInput",
+    "BatchResult",
 ]
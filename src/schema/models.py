@@ -76,6 +76,12 @@ class FakeModelName(StrEnum):
     FAKE = "fake"
 
 
+class VirtualModelName(StrEnum):
+    """Models that route each call to one of several configured models."""
+
+    HEDGED = "hedged"
+
+
 AllModelEnum: TypeAlias = (
     OpenAIModelName
     | AzureOpenAIModelName
@@ -86,4 +92,18 @@ AllModelEnum: TypeAlias = (
     | AWSModelName
     | OllamaModelName
     | FakeModelName
+    | VirtualModelName
 )
+
+# The provider that serves each family of models. Virtual models have none of their own.
+MODEL_PROVIDERS: dict[type[StrEnum], Provider] = {
+    OpenAIModelName: Provider.OPENAI,
+    AzureOpenAIModelName: Provider.AZURE_OPENAI,
+    DeepseekModelName: Provider.DEEPSEEK,
+    AnthropicModelName: Provider.ANTHROPIC,
+    GoogleModelName: Provider.GOOGLE,
+    GroqModelName: Provider.GROQ,
+    AWSModelName: Provider.AWS,
+    OllamaModelName: Provider.OLLAMA,
+    FakeModelName: Provider.FAKE,
+}
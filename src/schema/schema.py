@@ -69,6 +69,18 @@ class StreamInput(UserInput):
         description="Whether to stream LLM tokens to the client.",
         default=True,
     )
+    token_batch_ms: int | None = Field(
+        description="Coalesce streamed tokens into frames sent at most every this many "
+        "milliseconds, instead of one frame per token. Disabled if not set.",
+        default=None,
+        ge=1,
+        examples=[50],
+    )
+    token_batch_bytes: int = Field(
+        description="With token_batch_ms, send a frame early once it holds this many bytes.",
+        default=1024,
+        ge=1,
+    )
 
 
 class ToolCall(TypedDict):
@@ -164,7 +176,63 @@ class ChatHistoryInput(BaseModel):
         description="Thread ID to persist and continue a multi-turn conversation.",
         examples=["847c6285-8fc9-4560-a83f-4e6285809254"],
     )
+    limit: int | None = Field(
+        description="Maximum number of messages to return. Returns the whole thread if not set.",
+        default=None,
+        ge=1,
+        examples=[50],
+    )
+    before: int | None = Field(
+        description="Only return messages before this message index. Use `next_before` from "
+        "the previous page to continue paging backwards.",
+        default=None,
+        ge=0,
+        examples=[100],
+    )
 
 
 class ChatHistory(BaseModel):
     messages: list[ChatMessage]
+    next_before: int | None = Field(
+        description="Cursor for the previous page of messages, or None if this page starts "
+        "at the beginning of the thread.",
+        default=None,
+    )
+
+
+class BatchInput(BaseModel):
+    """A batch of user inputs to run through an agent."""
+
+    inputs: list[UserInput] = Field(
+        description="User inputs to run. Each is run as an independent /invoke call.",
+        min_length=1,
+    )
+    concurrency: int = Field(
+        description="Maximum number of inputs to run at once. Capped by the service's "
+        "MAX_BATCH_CONCURRENCY.",
+        default=8,
+        ge=1,
+        examples=[8],
+    )
+    format: Literal["ndjson", "sse"] = Field(
+        description="Stream results as newline-delimited JSON or as Server Sent Events.",
+        default="ndjson",
+    )
+
+
+class BatchResult(BaseModel):
+    """The result of one input of a batch, either its final message or an error."""
+
+    index: int = Field(
+        description="Position of the input in the batch.",
+        examples=[0],
+    )
+    output: ChatMessage | None = Field(
+        description="The agent's final response, if the run succeeded.",
+        default=None,
+    )
+    error: str | None = Field(
+        description="Why the run failed, if it did.",
+        default=None,
+        examples=["Unexpected error"],
+    )
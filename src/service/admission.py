@@ -0,0 +1,194 @@
+import asyncio
+import math
+import time
+from collections import deque
+from collections.abc import AsyncGenerator, Callable
+from contextlib import asynccontextmanager
+from typing import Any
+
+from fastapi import HTTPException, status
+
+from core import settings
+from core.metrics import register_metrics
+
+
+class ConcurrencyLimiter:
+    """
+    Limit the number of concurrent runs, with a bounded FIFO wait queue.
+
+    A limit of None admits everything immediately but still tracks activity.
+    """
+
+    def __init__(self, limit: int | None, max_waiting: int) -> None:
+        self.limit = limit
+        self.max_waiting = max_waiting
+        self.active = 0
+        self._waiters: deque[asyncio.Future[None]] = deque()
+        self.admitted = 0
+        self.rejected_queue_full = 0
+        self.rejected_timeout = 0
+        self.wait_ms_total = 0.0
+        self.wait_ms_max = 0.0
+        self.run_s_total = 0.0
+        self.completed = 0
+
+    @property
+    def waiting(self) -> int:
+        return len(self._waiters)
+
+    def _has_capacity(self) -> bool:
+        return self.limit is None or self.active < self.limit
+
+    def retry_after(self) -> int:
+        """Estimate in seconds when a slot frees up, from the average run duration."""
+        if not self.completed or not self.limit:
+            return 1
+        avg_run_s = self.run_s_total / self.completed
+        return max(1, math.ceil(avg_run_s * (self.waiting + 1) / self.limit))
+
+    async def acquire(self, timeout: float) -> None:
+        started = time.perf_counter()
+        if self._has_capacity() and not self._waiters:
+            self.active += 1
+            self._record_admitted(started)
+            return
+        if len(self._waiters) >= self.max_waiting:
+            self.rejected_queue_full += 1
+            raise HTTPException(
+                status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                detail="Too many requests in queue",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), timeout)
+        except (TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as we gave up on it, so pass it on
+                self.release_slot()
+            else:
+                waiter.cancel()
+                self._waiters.remove(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            self.rejected_timeout += 1
+            raise HTTPException(
+                status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                detail="Timed out waiting for capacity",
+                headers={"Retry-After": str(self.retry_after())},
+            )
+        self._record_admitted(started)
+
+    def _record_admitted(self, started: float) -> None:
+        wait_ms = (time.perf_counter() - started) * 1000
+        self.admitted += 1
+        self.wait_ms_total += wait_ms
+        self.wait_ms_max = max(self.wait_ms_max, wait_ms)
+
+    def release(self, run_s: float) -> None:
+        self.completed += 1
+        self.run_s_total += run_s
+        self.release_slot()
+
+    def release_slot(self) -> None:
+        # Hand the slot straight to the next waiter, so it can't be taken by a newcomer
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "limit": self.limit,
+            "active": self.active,
+            "waiting": self.waiting,
+            "admitted": self.admitted,
+            "rejected_queue_full": self.rejected_queue_full,
+            "rejected_timeout": self.rejected_timeout,
+            "wait_ms_avg": self.wait_ms_total / self.admitted if self.admitted else 0.0,
+            "wait_ms_max": self.wait_ms_max,
+        }
+
+
+class AdmissionController:
+    """
+    Admission control for agent runs: a global limit plus an optional limit per agent.
+
+    Limits come from MAX_CONCURRENT_RUNS and MAX_CONCURRENT_RUNS_PER_AGENT. Requests over
+    the limit wait in a queue of at most MAX_QUEUED_RUNS for up to RUN_QUEUE_TIMEOUT
+    seconds; beyond that they are rejected with 429 (queue full) or 503 (timed out).
+    """
+
+    def __init__(self) -> None:
+        self._global: ConcurrencyLimiter | None = None
+        self._agents: dict[str, ConcurrencyLimiter] = {}
+
+    @property
+    def global_limiter(self) -> ConcurrencyLimiter:
+        if self._global is None:
+            self._global = ConcurrencyLimiter(
+                settings.MAX_CONCURRENT_RUNS, settings.MAX_QUEUED_RUNS
+            )
+        return self._global
+
+    def agent_limiter(self, agent_id: str) -> ConcurrencyLimiter:
+        if agent_id not in self._agents:
+            self._agents[agent_id] = ConcurrencyLimiter(
+                settings.MAX_CONCURRENT_RUNS_PER_AGENT.get(agent_id), settings.MAX_QUEUED_RUNS
+            )
+        return self._agents[agent_id]
+
+    async def acquire(self, agent_id: str) -> Callable[[], None]:
+        """Wait for capacity to run agent_id. Returns a callback that releases it."""
+        deadline = time.monotonic() + settings.RUN_QUEUE_TIMEOUT
+        agent_limiter = self.agent_limiter(agent_id)
+        await agent_limiter.acquire(settings.RUN_QUEUE_TIMEOUT)
+        try:
+            await self.global_limiter.acquire(max(deadline - time.monotonic(), 0))
+        except BaseException:
+            agent_limiter.release_slot()
+            raise
+        started = time.perf_counter()
+        released = False
+
+        def release() -> None:
+            nonlocal released
+            if released:
+                return
+            released = True
+            run_s = time.perf_counter() - started
+            self.global_limiter.release(run_s)
+            agent_limiter.release(run_s)
+
+        return release
+
+    @asynccontextmanager
+    async def admit(self, agent_id: str) -> AsyncGenerator[None, None]:
+        release = await self.acquire(agent_id)
+        try:
+            yield
+        finally:
+            release()
+
+    async def guard_stream(
+        self, agen: AsyncGenerator[bytes, None], release: Callable[[], None]
+    ) -> AsyncGenerator[bytes, None]:
+        """Yield from an already admitted stream, releasing its slot when the stream ends."""
+        try:
+            async for item in agen:
+                yield item
+        finally:
+            release()
+
+    def stats(self) -> dict[str, Any]:
+        return {
+            "global": self.global_limiter.stats(),
+            "agents": {agent_id: limiter.stats() for agent_id, limiter in self._agents.items()},
+        }
+
+
+admission = AdmissionController()
+register_metrics("admission", admission.stats)
@@ -0,0 +1,64 @@
+import orjson
+from pydantic import TypeAdapter
+
+from schema import BatchResult, ChatMessage
+
+# Stream events are built from pre-encoded envelopes and serialized straight to UTF-8 bytes,
+# skipping the model_dump() -> dict -> json.dumps() round trip.
+_chat_message_adapter = TypeAdapter(ChatMessage)
+_batch_result_adapter = TypeAdapter(BatchResult)
+
+_TOKEN_PREFIX = b'data: {"type":"token","content":'
+_MESSAGE_PREFIX = b'data: {"type":"message","content":'
+_ERROR_PREFIX = b'data: {"type":"error","content":'
+_RESULT_PREFIX = b'data: {"type":"result","content":'
+_EVENT_SUFFIX = b"}\n\n"
+
+SSE_DONE = b"data: [DONE]\n\n"
+
+# Unlike json.dumps, the fast encoders emit non-ASCII characters as raw UTF-8. These three
+# are line breaks to str.splitlines() (and so to httpx's iter_lines()), which would split an
+# event in two, so they are escaped. They can only occur inside JSON strings.
+_LINE_BREAKS = (
+    (b"\xc2\x85", b"\\u0085"),
+    (b"\xe2\x80\xa8", b"\\u2028"),
+    (b"\xe2\x80\xa9", b"\\u2029"),
+)
+
+
+def _escape_line_breaks(data: bytes) -> bytes:
+    if b"\xc2\x85" not in data and b"\xe2\x80" not in data:
+        return data
+    for raw, escaped in _LINE_BREAKS:
+        data = data.replace(raw, escaped)
+    return data
+
+
+def dump_chat_message(message: ChatMessage) -> bytes:
+    """Serialize a ChatMessage to JSON bytes."""
+    return _escape_line_breaks(_chat_message_adapter.dump_json(message))
+
+
+def sse_token(content: str) -> bytes:
+    return _TOKEN_PREFIX + _escape_line_breaks(orjson.dumps(content)) + _EVENT_SUFFIX
+
+
+def sse_message(message: ChatMessage) -> bytes:
+    return _MESSAGE_PREFIX + dump_chat_message(message) + _EVENT_SUFFIX
+
+
+def sse_error(content: str) -> bytes:
+    return _ERROR_PREFIX + _escape_line_breaks(orjson.dumps(content)) + _EVENT_SUFFIX
+
+
+def dump_batch_result(result: BatchResult) -> bytes:
+    """Serialize a BatchResult to JSON bytes."""
+    return _escape_line_breaks(_batch_result_adapter.dump_json(result))
+
+
+def ndjson_batch_result(result: BatchResult) -> bytes:
+    return dump_batch_result(result) + b"\n"
+
+
+def sse_batch_result(result: BatchResult) -> bytes:
+    return _RESULT_PREFIX + dump_batch_result(result) + _EVENT_SUFFIX
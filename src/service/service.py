@@ -1,25 +1,41 @@
-import json
+import asyncio
 import logging
+import time
 import warnings
+from collections import Counter
 from collections.abc import AsyncGenerator
-from contextlib import asynccontextmanager
+from contextlib import asynccontextmanager, suppress
 from typing import Annotated, Any
 from uuid import UUID, uuid4
 
-from fastapi import APIRouter, Depends, FastAPI, HTTPException, status
-from fastapi.responses import StreamingResponse
+from fastapi import APIRouter, Depends, FastAPI, HTTPException, Request, status
+from fastapi.responses import Response, StreamingResponse
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from langchain_core._api import LangChainBetaWarning
 from langchain_core.messages import AIMessage, AIMessageChunk, AnyMessage, HumanMessage, ToolMessage
 from langchain_core.runnables import RunnableConfig
+from langgraph.constants import INTERRUPT
 from langgraph.graph.state import CompiledStateGraph
 from langgraph.types import Command, Interrupt
 from langsmith import Client as LangsmithClient
+from starlette.background import BackgroundTask
 
-from agents import DEFAULT_AGENT, get_agent, get_all_agent_info
+from agents import DEFAULT_AGENT, aget_agent, get_all_agent_info, load_agents
+from agents.llama_guard import SAFETY_VERIFIED_KEY
 from core import settings
-from memory import initialize_database
+from core.metrics import collect_metrics, register_metrics
+from core.rate_limit import Priority, request_priority
+from memory import (
+    SharedCheckpointer,
+    get_checkpoint_retention,
+    initialize_database,
+    preload_scope,
+    set_checkpointer,
+    with_checkpoint_cache,
+)
 from schema import (
+    BatchInput,
+    BatchResult,
     ChatHistory,
     ChatHistoryInput,
     ChatMessage,
@@ -29,10 +45,23 @@ from schema import (
     StreamInput,
     UserInput,
 )
+from service.admission import admission
+from service.serializers import (
+    SSE_DONE,
+    dump_chat_message,
+    ndjson_batch_result,
+    sse_batch_result,
+    sse_error,
+    sse_message,
+    sse_token,
+)
 from service.utils import (
+    TokenBatcher,
+    TokenHoldback,
     convert_message_content_to_string,
     langchain_to_chat_message,
     remove_tool_calls,
+    with_deadlines,
 )
 
 warnings.filterwarnings("ignore", category=LangChainBetaWarning)
@@ -57,17 +86,35 @@ async def lifespan(app: FastAPI) -> AsyncGenerator[None, None]:
     """
     Configurable lifespan that initializes the appropriate database checkpointer based on settings.
     """
+    # Agents and models are loaded on first use to start quickly. Load them now in a thread, so
+    # the first requests don't wait for them, and their imports don't block the event loop.
+    warmup = asyncio.create_task(asyncio.to_thread(load_agents))
     try:
         async with initialize_database() as saver:
             await saver.setup()
-            agents = get_all_agent_info()
-            for a in agents:
-                agent = get_agent(a.key)
-                agent.checkpointer = saver
-            yield
+            checkpointer = with_checkpoint_cache(saver)
+            # All agents are compiled with the shared checkpointer, so this switches them over
+            set_checkpointer(checkpointer)
+            retention = get_checkpoint_retention(saver, checkpointer)
+            retention_task = (
+                asyncio.create_task(retention.run(settings.CHECKPOINT_RETENTION_INTERVAL))
+                if retention
+                else None
+            )
+            try:
+                yield
+            finally:
+                if retention_task:
+                    retention_task.cancel()
+                    with suppress(asyncio.CancelledError):
+                        await retention_task
+                set_checkpointer(None)
     except Exception as e:
         logger.error(f"Error during database initialization: {e}")
         raise
+    finally:
+        # The thread itself finishes before the event loop closes
+        warmup.cancel()
 
 
 app = FastAPI(lifespan=lifespan)
@@ -86,6 +133,34 @@ async def info() -> ServiceMetadata:
     )
 
 
+@router.get("/metrics")
+async def metrics() -> dict[str, dict[str, Any]]:
+    """
+    Snapshot of runtime metrics from the service's subsystems, such as connection pools.
+    """
+    return collect_metrics()
+
+
+async def _get_agent(agent_id: str) -> CompiledStateGraph:
+    """The agent's graph, or a 404 for an unknown agent before any capacity is taken for it."""
+    try:
+        return await aget_agent(agent_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Agent not found: {agent_id}")
+
+
+async def _has_pending_interrupt(agent: CompiledStateGraph, config: RunnableConfig) -> bool:
+    checkpointer = agent.checkpointer
+    if isinstance(checkpointer, SharedCheckpointer):
+        # Interrupts are pending writes of the latest checkpoint, so there's no need to build
+        # the full state snapshot. The run that follows reuses the checkpoint read here.
+        saved = await checkpointer.apreload(config)
+        pending_writes = saved.pending_writes if saved else None
+        return any(channel == INTERRUPT for _, channel, _ in pending_writes or ())
+    state = await agent.aget_state(config=config)
+    return any(getattr(task, "interrupts", None) for task in state.tasks)
+
+
 async def _handle_input(
     user_input: UserInput, agent: CompiledStateGraph
 ) -> tuple[dict[str, Any], UUID]:
@@ -104,6 +179,15 @@ async def _handle_input(
                 status_code=422,
                 detail=f"agent_config contains reserved keys: {overlap}",
             )
+        # Read by the agents' context window, where a bad value would fail the run with a 500
+        max_tokens = user_input.agent_config.get("context_max_tokens")
+        if max_tokens is not None and (
+            isinstance(max_tokens, bool) or not isinstance(max_tokens, int) or max_tokens < 0
+        ):
+            raise HTTPException(
+                status_code=422,
+                detail="agent_config context_max_tokens must be a non-negative integer",
+            )
         configurable.update(user_input.agent_config)
 
     config = RunnableConfig(
@@ -111,13 +195,8 @@ async def _handle_input(
         run_id=run_id,
     )
 
-    # Check for interrupts that need to be resumed
-    state = await agent.aget_state(config=config)
-    interrupted_tasks = [
-        task for task in state.tasks if hasattr(task, "interrupts") and task.interrupts
-    ]
-
-    if interrupted_tasks:
+    # Check for interrupts that need to be resumed. A new thread can't have any.
+    if user_input.thread_id and await _has_pending_interrupt(agent, config):
         # assume user input is response to resume agent execution from interrupt
         input = Command(resume=user_input.message)
     else:
@@ -131,9 +210,9 @@ async def _handle_input(
     return kwargs, run_id
 
 
-@router.post("/{agent_id}/invoke")
-@router.post("/invoke")
-async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMessage:
+@router.post("/{agent_id}/invoke", response_model=ChatMessage)
+@router.post("/invoke", response_model=ChatMessage)
+async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> Response:
     """
     Invoke an agent with user input to retrieve a final response.
 
@@ -146,110 +225,234 @@ async def invoke(user_input: UserInput, agent_id: str = DEFAULT_AGENT) -> ChatMe
     # in interrupt-agent, or a tool step in research-assistant), it's omitted. Arguably,
     # you'd want to include it. You could update the API to return a list of ChatMessages
     # in that case.
-    agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = await _handle_input(user_input, agent)
-    try:
-        response_events = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])
-        response_type, response = response_events[-1]
-        if response_type == "values":
-            # Normal response, the agent completed successfully
-            output = langchain_to_chat_message(response["messages"][-1])
-        elif response_type == "updates" and "__interrupt__" in response:
-            # The last thing to occur was an interrupt
-            # Return the value of the first interrupt as an AIMessage
-            output = langchain_to_chat_message(
-                AIMessage(content=response["__interrupt__"][0].value)
-            )
-        else:
-            raise ValueError(f"Unexpected response type: {response_type}")
-
-        output.run_id = str(run_id)
-        return output
-    except Exception as e:
-        logger.error(f"An exception occurred: {e}")
-        raise HTTPException(status_code=500, detail="Unexpected error")
+    agent: CompiledStateGraph = await _get_agent(agent_id)
+    async with admission.admit(agent_id):
+        output = await _invoke(user_input, agent)
+    # Serialize directly to bytes rather than through FastAPI's response_model validation
+    return Response(content=dump_chat_message(output), media_type="application/json")
+
+
+async def _invoke(user_input: UserInput, agent: CompiledStateGraph) -> ChatMessage:
+    with preload_scope():
+        kwargs, run_id = await _handle_input(user_input, agent)
+        try:
+            response_events = await agent.ainvoke(**kwargs, stream_mode=["updates", "values"])
+            response_type, response = response_events[-1]
+            if response_type == "values":
+                # Normal response, the agent completed successfully
+                output = langchain_to_chat_message(response["messages"][-1])
+            elif response_type == "updates" and "__interrupt__" in response:
+                # The last thing to occur was an interrupt
+                # Return the value of the first interrupt as an AIMessage
+                output = langchain_to_chat_message(
+                    AIMessage(content=response["__interrupt__"][0].value)
+                )
+            else:
+                raise ValueError(f"Unexpected response type: {response_type}")
+
+            output.run_id = str(run_id)
+            return output
+        except Exception as e:
+            logger.error(f"An exception occurred: {e}")
+            raise HTTPException(status_code=500, detail="Unexpected error")
 
 
 async def message_generator(
     user_input: StreamInput, agent_id: str = DEFAULT_AGENT
-) -> AsyncGenerator[str, None]:
+) -> AsyncGenerator[bytes, None]:
     """
     Generate a stream of messages from the agent.
 
     This is the workhorse method for the /stream endpoint.
     """
-    agent: CompiledStateGraph = get_agent(agent_id)
-    kwargs, run_id = await _handle_input(user_input, agent)
-
-    # Process streamed events from the graph and yield messages over the SSE stream.
-    async for stream_event in agent.astream(
-        **kwargs, stream_mode=["updates", "messages", "custom"]
-    ):
-        if not isinstance(stream_event, tuple):
-            continue
-        stream_mode, event = stream_event
-        new_messages = []
-        if stream_mode == "updates":
-            for node, updates in event.items():
-                # A simple approach to handle agent interrupts.
-                # In a more sophisticated implementation, we could add
-                # some structured ChatMessage type to return the interrupt value.
-                if node == "__interrupt__":
-                    interrupt: Interrupt
-                    for interrupt in updates:
-                        new_messages.append(AIMessage(content=interrupt.value))
-                    continue
-                update_messages = updates.get("messages", [])
-                # special cases for using langgraph-supervisor library
-                if node == "supervisor":
-                    # Get only the last AIMessage since supervisor includes all previous messages
-                    ai_messages = [msg for msg in update_messages if isinstance(msg, AIMessage)]
-                    if ai_messages:
-                        update_messages = [ai_messages[-1]]
-                if node in ("research_expert", "math_expert"):
-                    # By default the sub-agent output is returned as an AIMessage.
-                    # Convert it to a ToolMessage so it displays in the UI as a tool response.
-                    msg = ToolMessage(
-                        content=update_messages[0].content,
-                        name=node,
-                        tool_call_id="",
-                    )
-                    update_messages = [msg]
-                new_messages.extend(update_messages)
-
-        if stream_mode == "custom":
-            new_messages = [event]
+    agent: CompiledStateGraph = await _get_agent(agent_id)
+    # A checkpoint preloaded by _handle_input is dropped if the run fails before reading it
+    with preload_scope():
+        kwargs, run_id = await _handle_input(user_input, agent)
+        # A user is waiting on this response, so its model calls are sent ahead of those for
+        # /invoke and /batch when a provider's rate limits are reached
+        request_priority.set(Priority.INTERACTIVE)
+
+        # With stream_safety_check, the agent checks its output while generating it and reports
+        # progress on the custom stream. Tokens are only sent once they have been verified.
+        # If the output is flagged, the held-back tokens are dropped and the final message
+        # replaces the streamed text.
+        holdback = TokenHoldback() if user_input.agent_config.get("stream_safety_check") else None
+        # Optionally coalesce tokens into fewer, larger SSE frames
+        batcher = (
+            TokenBatcher(user_input.token_batch_ms, user_input.token_batch_bytes)
+            if user_input.token_batch_ms
+            else None
+        )
 
-        for message in new_messages:
-            try:
-                chat_message = langchain_to_chat_message(message)
-                chat_message.run_id = str(run_id)
-            except Exception as e:
-                logger.error(f"Error parsing message: {e}")
-                yield f"data: {json.dumps({'type': 'error', 'content': 'Unexpected error'})}\n\n"
+        # Tool results sent from the custom stream as soon as they're ready, and skipped when
+        # their node's update arrives
+        streamed_tool_calls: set[str] = set()
+
+        # Process streamed events from the graph and yield messages over the SSE stream.
+        events = agent.astream(**kwargs, stream_mode=["updates", "messages", "custom"])
+        if batcher:
+            # Send coalesced tokens once they're due, also while the agent is busy between
+            # tokens, e.g. running a tool. None is yielded when the frame is due.
+            events = with_deadlines(events, batcher.due_in)
+        async for stream_event in events:
+            if stream_event is None:
+                if pending := batcher.flush():
+                    yield sse_token(pending)
                 continue
-            # LangGraph re-sends the input message, which feels weird, so drop it
-            if chat_message.type == "human" and chat_message.content == user_input.message:
+            if not isinstance(stream_event, tuple):
                 continue
-            yield f"data: {json.dumps({'type': 'message', 'content': chat_message.model_dump()})}\n\n"
+            stream_mode, event = stream_event
+            new_messages = []
+            if stream_mode == "updates":
+                if holdback:
+                    holdback.reset()
+                for node, updates in event.items():
+                    # A simple approach to handle agent interrupts.
+                    # In a more sophisticated implementation, we could add
+                    # some structured ChatMessage type to return the interrupt value.
+                    if node == "__interrupt__":
+                        interrupt: Interrupt
+                        for interrupt in updates:
+                            new_messages.append(AIMessage(content=interrupt.value))
+                        continue
+                    update_messages = updates.get("messages", [])
+                    # special cases for using langgraph-supervisor library
+                    if node == "supervisor":
+                        # Get only the last AIMessage since supervisor includes all previous messages
+                        ai_messages = [msg for msg in update_messages if isinstance(msg, AIMessage)]
+                        if ai_messages:
+                            update_messages = [ai_messages[-1]]
+                    if node in ("research_expert", "math_expert"):
+                        # By default the sub-agent output is returned as an AIMessage.
+                        # Convert it to a ToolMessage so it displays in the UI as a tool response.
+                        msg = ToolMessage(
+                            content=update_messages[0].content,
+                            name=node,
+                            tool_call_id="",
+                        )
+                        update_messages = [msg]
+                    new_messages.extend(
+                        msg
+                        for msg in update_messages
+                        if not (
+                            isinstance(msg, ToolMessage) and msg.tool_call_id in streamed_tool_calls
+                        )
+                    )
 
-        if stream_mode == "messages":
-            if not user_input.stream_tokens:
-                continue
-            msg, metadata = event
-            if "skip_stream" in metadata.get("tags", []):
-                continue
-            # For some reason, astream("messages") causes non-LLM nodes to send extra messages.
-            # Drop them.
-            if not isinstance(msg, AIMessageChunk):
+            if stream_mode == "custom":
+                if isinstance(event, dict) and SAFETY_VERIFIED_KEY in event:
+                    if holdback and (released := holdback.verify(event[SAFETY_VERIFIED_KEY])):
+                        if batcher:
+                            released = batcher.add(released)
+                        if released:
+                            yield sse_token(released)
+                    continue
+                if isinstance(event, ToolMessage):
+                    streamed_tool_calls.add(event.tool_call_id)
+                new_messages = [event]
+
+            # Send any coalesced tokens before the messages that follow them
+            if new_messages and batcher and (pending := batcher.flush()):
+                yield sse_token(pending)
+
+            for message in new_messages:
+                try:
+                    chat_message = langchain_to_chat_message(message)
+                    chat_message.run_id = str(run_id)
+                except Exception as e:
+                    logger.error(f"Error parsing message: {e}")
+                    yield sse_error("Unexpected error")
+                    continue
+                # LangGraph re-sends the input message, which feels weird, so drop it
+                if chat_message.type == "human" and chat_message.content == user_input.message:
+                    continue
+                yield sse_message(chat_message)
+
+            if stream_mode == "messages":
+                if not user_input.stream_tokens:
+                    continue
+                msg, metadata = event
+                if "skip_stream" in metadata.get("tags", []):
+                    continue
+                # For some reason, astream("messages") causes non-LLM nodes to send extra messages.
+                # Drop them.
+                if not isinstance(msg, AIMessageChunk):
+                    continue
+                content = remove_tool_calls(msg.content)
+                if content:
+                    # Empty content in the context of OpenAI usually means
+                    # that the model is asking for a tool to be invoked.
+                    # So we only print non-empty content.
+                    token = convert_message_content_to_string(content)
+                    if holdback:
+                        token = holdback.add(token)
+                    if batcher and token:
+                        token = batcher.add(token)
+                    if token:
+                        yield sse_token(token)
+        if batcher and (pending := batcher.flush()):
+            yield sse_token(pending)
+        yield SSE_DONE
+
+
+# How often a stream checks whether its client has gone away
+DISCONNECT_POLL_INTERVAL = 1.0
+
+stream_stats: Counter[str] = Counter()
+register_metrics("streams", lambda: dict(stream_stats))
+
+
+async def stream_until_disconnect(
+    events: AsyncGenerator[bytes, None], request: Request
+) -> AsyncGenerator[bytes, None]:
+    """
+    Run an SSE event stream in its own task and cancel it once the client disconnects.
+
+    This stops LLM generation, tool calls and checkpoint writes for a response nobody will
+    read. LangGraph only commits a checkpoint when a step completes, so the thread is left at
+    its last completed step, and the next input on the thread discards the unfinished tasks.
+    """
+    queue: asyncio.Queue[bytes | Exception | None] = asyncio.Queue(maxsize=32)
+
+    async def produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(None)
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    last_poll = time.monotonic()
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), DISCONNECT_POLL_INTERVAL)
+                idle = False
+            except TimeoutError:
+                idle = True
+            # Poll while the agent is busy, and periodically while it is streaming
+            if idle or time.monotonic() - last_poll >= DISCONNECT_POLL_INTERVAL:
+                last_poll = time.monotonic()
+                if await request.is_disconnected():
+                    stream_stats["client_disconnected"] += 1
+                    return
+            if idle:
                 continue
-            content = remove_tool_calls(msg.content)
-            if content:
-                # Empty content in the context of OpenAI usually means
-                # that the model is asking for a tool to be invoked.
-                # So we only print non-empty content.
-                yield f"data: {json.dumps({'type': 'token', 'content': convert_message_content_to_string(content)})}\n\n"
-    yield "data: [DONE]\n\n"
+            if item is None:
+                stream_stats["completed"] += 1
+                return
+            if isinstance(item, Exception):
+                stream_stats["failed"] += 1
+                raise item
+            yield item
+    finally:
+        if not producer.done():
+            producer.cancel()
+            await asyncio.wait({producer})
+            stream_stats["runs_cancelled"] += 1
+            logger.info("Cancelled agent run after the client disconnected")
 
 
 def _sse_response_example() -> dict[int, Any]:
@@ -272,7 +475,9 @@ def _sse_response_example() -> dict[int, Any]:
     responses=_sse_response_example(),
 )
 @router.post("/stream", response_class=StreamingResponse, responses=_sse_response_example())
-async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> StreamingResponse:
+async def stream(
+    user_input: StreamInput, request: Request, agent_id: str = DEFAULT_AGENT
+) -> StreamingResponse:
     """
     Stream an agent's response to a user input, including intermediate messages and tokens.
 
@@ -282,9 +487,91 @@ async def stream(user_input: StreamInput, agent_id: str = DEFAULT_AGENT) -> Stre
 
     Set `stream_tokens=false` to return intermediate messages but not token-by-token.
     """
+    await _get_agent(agent_id)
+    # Admit the run before the response starts, so overflow can still be rejected with 429/503
+    release = await admission.acquire(agent_id)
     return StreamingResponse(
-        message_generator(user_input, agent_id),
+        admission.guard_stream(
+            stream_until_disconnect(message_generator(user_input, agent_id), request), release
+        ),
         media_type="text/event-stream",
+        # The stream releases its slot when it ends, but it never starts if the client goes
+        # away before the response is sent. release is idempotent, so this is a safety net.
+        background=BackgroundTask(release),
+    )
+
+
+async def batch_generator(
+    batch: BatchInput, agent: CompiledStateGraph, agent_id: str = DEFAULT_AGENT
+) -> AsyncGenerator[bytes, None]:
+    """
+    Run each input of a batch like /invoke, with bounded concurrency, and yield the results
+    in the order they complete.
+    """
+    semaphore = asyncio.Semaphore(min(batch.concurrency, settings.MAX_BATCH_CONCURRENCY))
+    encode = sse_batch_result if batch.format == "sse" else ndjson_batch_result
+
+    async def run(index: int, user_input: UserInput) -> BatchResult:
+        async with semaphore:
+            try:
+                # Each input is admitted as its own run, so batches share capacity fairly
+                # with /invoke and /stream
+                async with admission.admit(agent_id):
+                    output = await _invoke(user_input, agent)
+                return BatchResult(index=index, output=output)
+            except HTTPException as e:
+                return BatchResult(index=index, error=str(e.detail))
+            except Exception as e:
+                logger.error(f"An exception occurred in batch input {index}: {e}")
+                return BatchResult(index=index, error="Unexpected error")
+
+    tasks = [asyncio.create_task(run(i, user_input)) for i, user_input in enumerate(batch.inputs)]
+    try:
+        for next_result in asyncio.as_completed(tasks):
+            yield encode(await next_result)
+    finally:
+        # Stop the remaining runs if the stream is closed early
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if batch.format == "sse":
+        yield SSE_DONE
+
+
+@router.post(
+    "/{agent_id}/batch",
+    response_class=StreamingResponse,
+    responses={
+        status.HTTP_200_OK: {
+            "description": "One BatchResult per input, as NDJSON lines or SSE result events",
+            "content": {
+                "application/x-ndjson": {
+                    "example": '{"index":1,"output":{"type":"ai","content":"Hello"},"error":null}\n'
+                    '{"index":0,"output":null,"error":"Unexpected error"}\n',
+                    "schema": {"type": "string"},
+                },
+                "text/event-stream": {"schema": {"type": "string"}},
+            },
+        }
+    },
+)
+@router.post("/batch", response_class=StreamingResponse)
+async def batch(
+    batch: BatchInput, request: Request, agent_id: str = DEFAULT_AGENT
+) -> StreamingResponse:
+    """
+    Invoke an agent with many user inputs in one request.
+
+    The inputs are run concurrently, up to `concurrency` at a time, and each result is
+    streamed back as soon as it completes, tagged with the index of its input. A failed
+    input produces a result with `error` set and doesn't affect the rest of the batch.
+    """
+    # Resolved before the response starts, so an unknown agent fails with 404 rather than an
+    # empty 200 stream
+    agent: CompiledStateGraph = await _get_agent(agent_id)
+    return StreamingResponse(
+        stream_until_disconnect(batch_generator(batch, agent, agent_id), request),
+        media_type="text/event-stream" if batch.format == "sse" else "application/x-ndjson",
     )
 
 
@@ -308,24 +595,34 @@ async def feedback(feedback: Feedback) -> FeedbackResponse:
     return FeedbackResponse()
 
 
+@router.post("/{agent_id}/history")
 @router.post("/history")
-def history(input: ChatHistoryInput) -> ChatHistory:
+async def history(input: ChatHistoryInput, agent_id: str = DEFAULT_AGENT) -> ChatHistory:
     """
     Get chat history.
+
+    If agent_id is not provided, the default agent will be used.
+    Set `limit` to page backwards through long threads: each page holds the `limit`
+    messages preceding index `before`, and `next_before` is the cursor for the previous page.
+    With SQLITE_MESSAGE_LOG, only the messages in the requested page are read from the
+    database. Otherwise the whole thread is loaded, and only the page is converted.
     """
-    # TODO: Hard-coding DEFAULT_AGENT here is wonky
-    agent: CompiledStateGraph = get_agent(DEFAULT_AGENT)
+    agent: CompiledStateGraph = await _get_agent(agent_id)
+    config = RunnableConfig(configurable={"thread_id": input.thread_id})
     try:
-        state_snapshot = agent.get_state(
-            config=RunnableConfig(
-                configurable={
-                    "thread_id": input.thread_id,
-                }
-            )
-        )
-        messages: list[AnyMessage] = state_snapshot.values["messages"]
-        chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in messages]
-        return ChatHistory(messages=chat_messages)
+        checkpointer = agent.checkpointer
+        page = None
+        if isinstance(checkpointer, SharedCheckpointer):
+            page = await checkpointer.aget_messages(config, before=input.before, limit=input.limit)
+        if page is None:
+            state_snapshot = await agent.aget_state(config=config)
+            messages: list[AnyMessage] = state_snapshot.values["messages"]
+            end = len(messages) if input.before is None else min(input.before, len(messages))
+            start = 0 if input.limit is None else max(end - input.limit, 0)
+            page = messages[start:end], start
+        page_messages, start = page
+        chat_messages: list[ChatMessage] = [langchain_to_chat_message(m) for m in page_messages]
+        return ChatHistory(messages=chat_messages, next_before=start or None)
     except Exception as e:
         logger.error(f"An exception occurred: {e}")
         raise HTTPException(status_code=500, detail="Unexpected error")
@@ -1,3 +1,8 @@
+import asyncio
+import time
+from collections.abc import AsyncGenerator, AsyncIterator, Callable
+from typing import TypeVar
+
 from langchain_core.messages import (
     AIMessage,
     BaseMessage,
@@ -10,6 +15,8 @@ from langchain_core.messages import (
 
 from schema import ChatMessage
 
+T = TypeVar("T")
+
 
 def convert_message_content_to_string(content: str | list[str | dict]) -> str:
     if isinstance(content, str):
@@ -74,3 +81,121 @@ def remove_tool_calls(content: str | list[str | dict]) -> str | list[str | dict]
         for content_item in content
         if isinstance(content_item, str) or content_item["type"] != "tool_use"
     ]
+
+
+class TokenHoldback:
+    """
+    Hold back streamed tokens until a safety check has verified them.
+
+    Offsets count characters of the message currently being streamed; call reset()
+    once that message is complete.
+    """
+
+    def __init__(self) -> None:
+        self.reset()
+
+    def reset(self) -> None:
+        self.pending = ""
+        self.released = 0
+        self.verified = 0
+
+    def add(self, token: str) -> str:
+        """Buffer a token and return any text that is now safe to send."""
+        self.pending += token
+        return self._drain()
+
+    def verify(self, chars: int) -> str:
+        """Mark the first `chars` characters as verified and return the text released."""
+        self.verified = max(self.verified, chars)
+        return self._drain()
+
+    def _drain(self) -> str:
+        releasable = self.verified - self.released
+        if releasable <= 0 or not self.pending:
+            return ""
+        text, self.pending = self.pending[:releasable], self.pending[releasable:]
+        self.released += len(text)
+        return text
+
+
+class TokenBatcher:
+    """
+    Coalesce streamed tokens into larger frames.
+
+    A frame is released once it holds at least `max_bytes` bytes of text or its first token
+    is `interval_ms` old. The age is checked as tokens arrive, so callers must flush() when
+    the frame is due_in() 0 seconds without a new token, and when the token stream ends.
+    """
+
+    def __init__(self, interval_ms: int, max_bytes: int) -> None:
+        self.interval = interval_ms / 1000
+        self.max_bytes = max_bytes
+        self.tokens: list[str] = []
+        self.size = 0
+        self.started = 0.0
+
+    def add(self, token: str) -> str | None:
+        """Buffer a token and return a frame's worth of text if one is ready."""
+        if not self.tokens:
+            self.started = time.monotonic()
+        self.tokens.append(token)
+        self.size += len(token.encode())
+        if self.size >= self.max_bytes or time.monotonic() - self.started >= self.interval:
+            return self.flush()
+        return None
+
+    def due_in(self) -> float | None:
+        """Seconds until the buffered frame is due, or None when nothing is buffered."""
+        if not self.tokens:
+            return None
+        return max(self.started + self.interval - time.monotonic(), 0.0)
+
+    def flush(self) -> str | None:
+        if not self.tokens:
+            return None
+        text = "".join(self.tokens)
+        self.tokens.clear()
+        self.size = 0
+        return text
+
+
+class _End:
+    pass
+
+
+async def with_deadlines(
+    events: AsyncIterator[T], due_in: Callable[[], float | None]
+) -> AsyncGenerator[T | None, None]:
+    """
+    Yield from `events`, and yield None whenever the `due_in()` seconds pass before the next
+    event arrives.
+
+    The events are consumed in a task of their own, so that a wait can time out without
+    cancelling the iterator it's waiting on.
+    """
+    queue: asyncio.Queue[T | _End | BaseException] = asyncio.Queue(maxsize=1)
+
+    async def produce() -> None:
+        try:
+            async for event in events:
+                await queue.put(event)
+            await queue.put(_End())
+        except Exception as e:
+            await queue.put(e)
+
+    producer = asyncio.create_task(produce())
+    try:
+        while True:
+            try:
+                item = await asyncio.wait_for(queue.get(), due_in())
+            except TimeoutError:
+                yield None
+                continue
+            if isinstance(item, _End):
+                return
+            if isinstance(item, BaseException):
+                raise item
+            yield item
+    finally:
+        producer.cancel()
+        await asyncio.wait({producer})
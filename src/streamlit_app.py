@@ -25,6 +25,8 @@ from schema.task_data import TaskData, TaskDataStatus
 
 APP_TITLE = "Agent Service Toolkit"
 APP_ICON = "🧰"
+# Number of messages loaded at a time when resuming a thread
+HISTORY_PAGE_SIZE = 100
 
 
 async def main() -> None:
@@ -72,13 +74,20 @@ async def main() -> None:
         if not thread_id:
             thread_id = get_script_run_ctx().session_id
             messages = []
+            history_before = None
         else:
             try:
-                messages: ChatHistory = agent_client.get_history(thread_id=thread_id).messages
+                history: ChatHistory = agent_client.get_history(
+                    thread_id=thread_id, limit=HISTORY_PAGE_SIZE
+                )
+                messages = history.messages
+                history_before = history.next_before
             except AgentClientError:
                 st.error("No message history found for this Thread ID.")
                 messages = []
+                history_before = None
         st.session_state.messages = messages
+        st.session_state.history_before = history_before
         st.session_state.thread_id = thread_id
 
     # Config options
@@ -140,6 +149,21 @@ async def main() -> None:
     # Draw existing messages
     messages: list[ChatMessage] = st.session_state.messages
 
+    # Long threads are resumed one page at a time, most recent first
+    if st.session_state.history_before is not None:
+        if st.button(":material/history: Load earlier messages"):
+            try:
+                history = agent_client.get_history(
+                    thread_id=st.session_state.thread_id,
+                    limit=HISTORY_PAGE_SIZE,
+                    before=st.session_state.history_before,
+                )
+                messages[:0] = history.messages
+                st.session_state.history_before = history.next_before
+                st.rerun()
+            except AgentClientError as e:
+                st.error(f"Error loading earlier messages: {e}")
+
     if len(messages) == 0:
         match agent_client.agent:
             case "chatbot":
@@ -366,5 +390,14 @@ async def handle_feedback() -> None:
         st.toast("Feedback recorded", icon=":material/reviews:")
 
 
+async def run() -> None:
+    try:
+        await main()
+    finally:
+        # Each rerun has its own event loop, whose connections are closed before it ends
+        if agent_client := st.session_state.get("agent_client"):
+            await agent_client.aclose()
+
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(run())
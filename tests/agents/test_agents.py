@@ -0,0 +1,56 @@
+import asyncio
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import pytest
+
+from agents.agents import Agent, aget_agent
+
+SRC = Path(__file__).parents[2] / "src"
+PROVIDER_SDKS = [
+    "langchain_anthropic",
+    "langchain_aws",
+    "langchain_google_genai",
+    "langchain_groq",
+    "langchain_ollama",
+    "langchain_openai",
+]
+
+
+def test_agents_are_compiled_on_first_use():
+    agent = Agent(description="A chatbot.", graph_path="agents.chatbot:chatbot")
+    assert agent.graph is None
+    graph = agent.get_graph()
+    assert graph is agent.get_graph()
+
+    with pytest.raises(ValueError, match="has no graph"):
+        Agent(description="Nothing to load.").get_graph()
+
+
+@pytest.mark.asyncio
+async def test_aget_agent_compiles_in_a_thread():
+    agent = Agent(description="A chatbot.", graph_path="agents.chatbot:chatbot")
+    with (
+        patch.dict("agents.agents.agents", {"local": agent}, clear=True),
+        patch("agents.agents.asyncio.to_thread", wraps=asyncio.to_thread) as to_thread,
+    ):
+        graph = await aget_agent("local")
+        assert graph is agent.graph
+        assert await aget_agent("local") is graph
+    to_thread.assert_called_once()
+
+
+def test_startup_doesnt_import_agents_or_provider_sdks():
+    code = "import sys, service; print(' '.join(sys.modules))"
+    result = subprocess.run(
+        [sys.executable, "-c", code], cwd=SRC, capture_output=True, text=True, check=True
+    )
+    modules = set(result.stdout.split())
+    assert not [sdk for sdk in PROVIDER_SDKS if sdk in modules]
+    # Only Llama Guard, whose state key the service uses, is imported before a run
+    assert {m for m in modules if m.startswith("agents.")} <= {
+        "agents.agents",
+        "agents.llama_guard",
+    }
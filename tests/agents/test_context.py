@@ -0,0 +1,149 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolMessage
+
+from agents.context import ContextWindow, context_stats
+from core.metrics import collect_metrics
+from core.tokens import estimate_tokens
+
+
+def _turn(i: int, words: int = 40) -> list:
+    text = " ".join(["word"] * words)
+    return [
+        HumanMessage(content=f"question {i} {text}", id=f"h{i}"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "WebSearch", "args": {"query": str(i)}, "id": f"call{i}"}],
+            id=f"a{i}",
+        ),
+        ToolMessage(content=f"result {i} {text}", tool_call_id=f"call{i}", id=f"t{i}"),
+        AIMessage(content=f"answer {i} {text}", id=f"r{i}"),
+    ]
+
+
+def _conversation(turns: int) -> list:
+    messages = [m for i in range(turns) for m in _turn(i)]
+    return messages + [HumanMessage(content="latest question", id="latest")]
+
+
+def _model(*summaries: str) -> Mock:
+    model = Mock()
+    summarizer = Mock()
+    summarizer.ainvoke = AsyncMock(side_effect=[AIMessage(content=s) for s in summaries])
+    model.with_config.return_value = summarizer
+    return model
+
+
+def test_context_window_from_config():
+    with patch("agents.context.settings") as mock_settings:
+        mock_settings.CONTEXT_MAX_TOKENS = None
+        mock_settings.CONTEXT_SUMMARIZE = False
+        assert ContextWindow.from_config({"configurable": {}}) is None
+        window = ContextWindow.from_config(
+            {"configurable": {"context_max_tokens": 500, "context_summarize": True}}
+        )
+        assert window == ContextWindow(max_tokens=500, summarize=True)
+
+        mock_settings.CONTEXT_MAX_TOKENS = 2000
+        assert ContextWindow.from_config({"configurable": {}}).max_tokens == 2000
+
+
+@pytest.mark.asyncio
+async def test_context_window_trims_whole_turns():
+    messages = _conversation(10)
+    window = ContextWindow(max_tokens=300)
+    requests = context_stats.requests
+    context, summary = await window.apply(messages, model=_model())
+
+    assert summary is None
+    assert estimate_tokens(context) <= 300
+    # The window starts at a user message, so tool calls keep their results
+    assert isinstance(context[0], HumanMessage)
+    assert context == messages[-len(context) :]
+    assert len(context) < len(messages)
+
+    # The current turn is kept, even over budget
+    context, _ = await ContextWindow(max_tokens=1).apply(messages, model=_model())
+    assert context == [messages[-1]]
+    # Conversations within the budget are sent whole
+    context, _ = await ContextWindow(max_tokens=100_000).apply(messages, model=_model())
+    assert context == messages
+
+    assert context_stats.requests == requests + 3
+    assert collect_metrics()["context_window"]["tokens_saved"] > 0
+
+
+@pytest.mark.asyncio
+async def test_context_window_summarizes_incrementally():
+    window = ContextWindow(max_tokens=400, summarize=True)
+    model = _model("summary 1", "summary 2")
+    messages = _conversation(10)
+
+    context, summary = await window.apply(messages, model=model)
+    assert isinstance(context[0], SystemMessage)
+    assert "summary 1" in context[0].content
+    evicted = len(messages) - len(context) + 1
+    assert summary["through"] == messages[evicted - 1].id
+    prompt = model.with_config.return_value.ainvoke.await_args.args[0][1].content
+    assert "question 0" in prompt
+    model.with_config.assert_called_with(tags=["skip_stream"])
+
+    # With the summary from the state, the next call doesn't summarize the same turns again
+    context, same = await window.apply(messages, model=model, summary=summary)
+    assert same == summary
+    assert model.with_config.return_value.ainvoke.await_count == 1
+
+    # Newly evicted turns extend the summary
+    messages = messages[:-1] + [m for i in range(10, 13) for m in _turn(i)] + messages[-1:]
+    context, summary = await window.apply(messages, model=model, summary=summary)
+    assert summary["text"] == "summary 2"
+    prompt = model.with_config.return_value.ainvoke.await_args.args[0][1].content
+    assert "summary 1" in prompt
+    assert "question 0" not in prompt
+    assert "question 10" in prompt
+
+
+@pytest.mark.asyncio
+async def test_context_window_summary_failure():
+    model = Mock()
+    model.with_config.return_value.ainvoke = AsyncMock(side_effect=RuntimeError("rate limited"))
+    failures = context_stats.summary_failures
+    window = ContextWindow(max_tokens=400, summarize=True)
+    context, summary = await window.apply(_conversation(10), model=model)
+
+    # The turn goes ahead without a summary
+    assert summary is None
+    assert isinstance(context[0], HumanMessage)
+    assert context_stats.summary_failures == failures + 1
+
+
+@pytest.mark.asyncio
+async def test_chatbot_context_window():
+    from agents.chatbot import chatbot
+
+    model = Mock()
+    model.with_config.return_value.ainvoke = AsyncMock(
+        return_value=AIMessage(content="the user asked about word")
+    )
+    model.ainvoke = AsyncMock(side_effect=lambda messages: AIMessage(content=f"{len(messages)}"))
+    config = {
+        "configurable": {
+            "thread_id": "context",
+            "context_max_tokens": 300,
+            "context_summarize": True,
+        }
+    }
+    with patch("agents.chatbot.get_model", return_value=model):
+        for i in range(6):
+            text = " ".join(["word"] * 60)
+            await chatbot.ainvoke({"messages": [HumanMessage(content=f"{i} {text}")]}, config)
+        sent = model.ainvoke.await_args.args[0]
+
+    assert isinstance(sent[0], SystemMessage)
+    assert sent[-1].content.startswith("5 ")
+    # The summary is saved with the whole conversation
+    saved = (await chatbot.checkpointer.aget_tuple(config)).checkpoint
+    previous = saved["channel_values"]["__previous__"]
+    assert len(previous["messages"]) == 12
+    assert previous["context_summary"]["text"] == "the user asked about word"
@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, Mock
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.prompts import PromptTemplate
+
+from agents.llama_guard import (
+    LlamaGuard,
+    SafetyAssessment,
+    llama_guard_instructions,
+)
+
+
+@pytest.fixture
+def llama_guard():
+    guard = LlamaGuard()
+    guard.model = Mock()
+    guard.model.ainvoke = AsyncMock(return_value=AIMessage(content="safe"))
+    guard.prompt = PromptTemplate.from_template(llama_guard_instructions)
+    return guard
+
+
+def _sent_prompt(guard: LlamaGuard) -> str:
+    return guard.model.ainvoke.await_args.args[0][0].content
+
+
+@pytest.mark.asyncio
+async def test_llama_guard_caches_verdicts(llama_guard):
+    messages = [HumanMessage(content="What is the weather in Tokyo?")]
+    first = await llama_guard.ainvoke("User", messages)
+    second = await llama_guard.ainvoke("User", messages)
+    assert first.safety_assessment == SafetyAssessment.SAFE
+    assert second == first
+    assert llama_guard.model.ainvoke.await_count == 1
+
+    # The role is part of the key
+    await llama_guard.ainvoke("Agent", messages)
+    assert llama_guard.model.ainvoke.await_count == 2
+
+    stats = llama_guard.stats()
+    assert stats["hits"] == 1
+    assert stats["guard_calls"] == 2
+
+
+@pytest.mark.asyncio
+async def test_llama_guard_skips_safe_prefix(llama_guard):
+    llama_guard.prefix_context = 1
+    messages = [HumanMessage(content="Question one"), AIMessage(content="Answer one")]
+    await llama_guard.ainvoke("Agent", messages)
+
+    messages += [HumanMessage(content="Question two"), AIMessage(content="Answer two")]
+    await llama_guard.ainvoke("Agent", messages)
+    prompt = _sent_prompt(llama_guard)
+    assert "Question one" not in prompt
+    assert "Agent: Answer one" in prompt
+    assert "Agent: Answer two" in prompt
+    assert llama_guard.stats()["messages_skipped"] == 1
+
+
+@pytest.mark.asyncio
+async def test_llama_guard_does_not_cache_errors(llama_guard):
+    llama_guard.model.ainvoke.return_value = AIMessage(content="garbage")
+    messages = [HumanMessage(content="Hello")]
+    output = await llama_guard.ainvoke("User", messages)
+    assert output.safety_assessment == SafetyAssessment.ERROR
+    await llama_guard.ainvoke("User", messages)
+    assert llama_guard.model.ainvoke.await_count == 2
@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, Mock, patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+from langchain_core.runnables import RunnableLambda
+
+from agents.llama_guard import SAFETY_VERIFIED_KEY, LlamaGuardOutput, SafetyAssessment
+from agents.research_assistant import astream_model_guarded
+
+RESPONSE = "The weather in Tokyo is sunny with a light breeze."
+
+
+def _model_runnable():
+    model = FakeListChatModel(responses=[RESPONSE], sleep=0.001)
+    return RunnableLambda(lambda state: state["messages"]) | model
+
+
+def _guard(*assessments: SafetyAssessment) -> Mock:
+    guard = Mock()
+    guard.ainvoke = AsyncMock(
+        side_effect=[LlamaGuardOutput(safety_assessment=a) for a in assessments]
+    )
+    return guard
+
+
+@pytest.mark.asyncio
+async def test_astream_model_guarded_safe():
+    state = {"messages": [HumanMessage(content="What is the weather in Tokyo?")]}
+    writer = Mock()
+    guard = _guard(*[SafetyAssessment.SAFE] * 10)
+    with (
+        patch("agents.research_assistant.get_llama_guard", return_value=guard),
+        patch("agents.research_assistant.SAFETY_CHECK_INTERVAL", 10),
+    ):
+        response, safety = await astream_model_guarded(_model_runnable(), state, {}, writer)
+
+    assert isinstance(response, AIMessage)
+    assert response.content == RESPONSE
+    assert safety.safety_assessment == SafetyAssessment.SAFE
+
+    # Partial outputs were checked while generating and reported as verified
+    verified = [call.args[0][SAFETY_VERIFIED_KEY] for call in writer.call_args_list]
+    assert verified
+    assert verified == sorted(verified)
+    assert all(0 < v < len(RESPONSE) for v in verified)
+
+    # The last check covers the complete output
+    checked = guard.ainvoke.await_args_list[-1].args[1][-1]
+    assert checked.content == RESPONSE
+
+
+@pytest.mark.asyncio
+async def test_astream_model_guarded_unsafe_stops_early():
+    state = {"messages": [HumanMessage(content="Tell me something bad")]}
+    writer = Mock()
+    guard = _guard(SafetyAssessment.UNSAFE)
+    with (
+        patch("agents.research_assistant.get_llama_guard", return_value=guard),
+        patch("agents.research_assistant.SAFETY_CHECK_INTERVAL", 10),
+    ):
+        response, safety = await astream_model_guarded(_model_runnable(), state, {}, writer)
+
+    assert safety.safety_assessment == SafetyAssessment.UNSAFE
+    assert len(response.content) < len(RESPONSE)
+    assert guard.ainvoke.await_count == 1
+    writer.assert_not_called()
@@ -0,0 +1,232 @@
+import asyncio
+import sqlite3
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, ToolMessage
+from langchain_core.tools import BaseTool, ToolException
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.prebuilt import ToolNode
+
+from agents.tools import (
+    CachedTool,
+    ParallelToolNode,
+    cache_tool,
+    calculator,
+    normalize_tool_args,
+)
+from core.cache import SqliteCache
+from core.metrics import collect_metrics
+
+
+class FakeSearch(BaseTool):
+    name: str = "WebSearch"
+    description: str = "Search the web."
+    response_format: str = "content_and_artifact"
+    calls: int = 0
+    delay: float = 0.05
+
+    def _run(self, query: str) -> tuple[str, list]:
+        self.calls += 1
+        if query == "fail":
+            raise ToolException("search failed")
+        return f"results for {query}", [{"link": f"https://example.com/{self.calls}"}]
+
+    async def _arun(self, query: str) -> tuple[str, list]:
+        await asyncio.sleep(self.delay)
+        return self._run(query)
+
+
+def _tool_call(query: str, call_id: str = "1") -> dict:
+    return {"name": "WebSearch", "args": {"query": query}, "id": call_id, "type": "tool_call"}
+
+
+def test_normalize_tool_args():
+    assert normalize_tool_args({"query": " Weather in  Paris"}) == normalize_tool_args(
+        {"query": "weather in paris"}
+    )
+    assert normalize_tool_args({"a": 1, "b": "x"}) == normalize_tool_args({"b": "X", "a": 1})
+    assert normalize_tool_args({"query": "paris"}) != normalize_tool_args({"query": "rome"})
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_reuses_results():
+    search = FakeSearch()
+    cached = CachedTool.wrap(search, ttl=60)
+
+    first = await cached.ainvoke(_tool_call("Weather in  Paris", "1"))
+    second = await cached.ainvoke(_tool_call("weather in paris", "2"))
+    assert search.calls == 1
+    assert isinstance(second, ToolMessage)
+    assert second.tool_call_id == "2"
+    assert (second.content, second.artifact) == (first.content, first.artifact)
+    assert cached.invoke({"query": "weather in paris"}) == first.content
+    assert search.calls == 1
+
+    await cached.ainvoke(_tool_call("weather in rome"))
+    assert search.calls == 2
+    assert cached.stats()["hits"] == 2
+    assert cached.stats()["misses"] == 2
+
+    # Results expire after the TTL
+    search = FakeSearch(delay=0)
+    cached = CachedTool.wrap(search, ttl=0.05)
+    await cached.ainvoke({"query": "paris"})
+    await asyncio.sleep(0.1)
+    await cached.ainvoke({"query": "paris"})
+    assert search.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_coalesces_concurrent_calls():
+    search = FakeSearch()
+    cached = CachedTool.wrap(search, ttl=60)
+
+    results = await asyncio.gather(*(cached.ainvoke({"query": "trending"}) for _ in range(10)))
+    assert results == ["results for trending"] * 10
+    assert search.calls == 1
+    assert cached.stats()["coalesced"] == 9
+
+    # A cancelled caller doesn't fail the others waiting for the same result
+    first = asyncio.create_task(cached.ainvoke({"query": "news"}))
+    second = asyncio.create_task(cached.ainvoke({"query": "news"}))
+    await asyncio.sleep(0.01)
+    first.cancel()
+    assert await second == "results for news"
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_doesnt_cache_errors():
+    search = FakeSearch(delay=0)
+    node = ToolNode([CachedTool.wrap(search, ttl=60)])
+
+    for _ in range(2):
+        message = AIMessage(content="", tool_calls=[_tool_call("fail")])
+        result = await node.ainvoke({"messages": [message]})
+        assert result["messages"][0].status == "error"
+    assert search.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_shared_store(tmp_path):
+    store = SqliteCache(str(tmp_path / "tools.db"), table="tool_results")
+    search = FakeSearch(delay=0)
+    await CachedTool.wrap(search, ttl=60, store=store).ainvoke(_tool_call("paris"))
+
+    # Another process, with its own in-process cache, reuses the stored result
+    other = CachedTool.wrap(search, ttl=60, store=SqliteCache(store.path, table="tool_results"))
+    message = await other.ainvoke(_tool_call("paris"))
+    assert search.calls == 1
+    assert message.artifact == [{"link": "https://example.com/1"}]
+    assert other.stats()["store_hits"] == 1
+
+    with patch("core.cache.time.time", return_value=10**10):
+        assert store.get(f"WebSearch:{normalize_tool_args({'query': 'paris'})}") is None
+    store.close()
+
+
+@pytest.mark.asyncio
+async def test_cached_tool_store_unavailable(tmp_path):
+    store = SqliteCache(str(tmp_path / "tools.db"), table="tool_results")
+    search = FakeSearch(delay=0)
+    with patch.object(store, "get", side_effect=sqlite3.OperationalError("database is locked")):
+        message = await CachedTool.wrap(search, ttl=60, store=store).ainvoke(_tool_call("paris"))
+        assert message.artifact == [{"link": "https://example.com/1"}]
+        CachedTool.wrap(search, ttl=60, store=store).invoke({"query": "paris"})
+    assert search.calls == 2
+    store.close()
+
+
+def test_cache_tool_settings():
+    with (
+        patch("agents.tools.settings") as mock_settings,
+        patch.dict("agents.tools._cached_tools", clear=True),
+    ):
+        mock_settings.TOOL_CACHE_TTL = {"WebSearch": 300}
+        mock_settings.TOOL_CACHE_SIZE = 16
+        mock_settings.TOOL_CACHE_SQLITE_PATH = None
+        cached = cache_tool(FakeSearch())
+        assert isinstance(cached, CachedTool)
+        assert (cached.ttl, cached.maxsize, cached.name) == (300, 16, "WebSearch")
+        assert cache_tool(calculator) is calculator
+        assert list(collect_metrics()["tool_cache"]) == ["WebSearch"]
+
+
+class SlowTool(BaseTool):
+    name: str = "Slow"
+    description: str = "Wait for a number of seconds."
+    running: int = 0
+    max_running: int = 0
+
+    def _run(self, seconds: float) -> str:
+        raise NotImplementedError
+
+    async def _arun(self, seconds: float) -> str:
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            self.running -= 1
+        return f"waited {seconds}"
+
+
+def _slow_calls(*seconds: float) -> AIMessage:
+    return AIMessage(
+        content="",
+        tool_calls=[
+            {"name": "Slow", "args": {"seconds": s}, "id": f"call_{i}"}
+            for i, s in enumerate(seconds)
+        ],
+    )
+
+
+@pytest.mark.asyncio
+async def test_parallel_tool_node_timeout():
+    node = ParallelToolNode([SlowTool()], timeout=1.0, timeouts={"Slow": 0.2})
+
+    start = time.perf_counter()
+    result = await node.ainvoke({"messages": [_slow_calls(0.1, 5, 0.1)]})
+    assert time.perf_counter() - start < 1
+
+    # The hung call is reported to the model, and the others return their results
+    messages = result["messages"]
+    assert [m.tool_call_id for m in messages] == ["call_0", "call_1", "call_2"]
+    assert [m.status for m in messages] == ["success", "error", "success"]
+    assert "didn't respond within 0.2 seconds" in messages[1].content
+    assert node.stats() == {"Slow": {"calls": 3, "timed_out": 1}}
+
+
+@pytest.mark.asyncio
+async def test_parallel_tool_node_concurrency_limit():
+    slow = SlowTool()
+    node = ParallelToolNode([slow], max_concurrency={"Slow": 2})
+    await node.ainvoke({"messages": [_slow_calls(*[0.05] * 6)]})
+    assert slow.max_running == 2
+
+    slow = SlowTool()
+    await ParallelToolNode([slow]).ainvoke({"messages": [_slow_calls(*[0.05] * 6)]})
+    assert slow.max_running == 6
+
+
+@pytest.mark.asyncio
+async def test_parallel_tool_node_streams_results():
+    builder = StateGraph(MessagesState)
+    builder.add_node("tools", ParallelToolNode([SlowTool()]))
+    builder.set_entry_point("tools")
+    builder.add_edge("tools", END)
+    graph = builder.compile()
+
+    streamed = []
+    async for mode, event in graph.astream(
+        {"messages": [_slow_calls(0.3, 0.05)]}, stream_mode=["custom", "updates"]
+    ):
+        streamed.append((mode, event))
+
+    # Each result is streamed when it's ready, before the node's update with all of them
+    assert [(mode, getattr(e, "tool_call_id", None)) for mode, e in streamed] == [
+        ("custom", "call_1"),
+        ("custom", "call_0"),
+        ("updates", None),
+    ]
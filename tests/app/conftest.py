@@ -1,4 +1,4 @@
-from unittest.mock import patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 
@@ -23,4 +23,5 @@ def mock_agent_client(mock_env):
     with patch("client.AgentClient") as mock_agent_client:
         mock_agent_client_instance = mock_agent_client.return_value
         mock_agent_client_instance.info = mock_info
+        mock_agent_client_instance.aclose = AsyncMock()
         yield mock_agent_client_instance
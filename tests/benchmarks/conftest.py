@@ -0,0 +1,59 @@
+import asyncio
+import time
+from collections.abc import Awaitable, Callable
+from uuid import uuid4
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import BaseCheckpointSaver, empty_checkpoint
+
+
+async def checkpoint_turn(saver: BaseCheckpointSaver, thread_id: str, turn: int) -> None:
+    """Simulate the checkpoint I/O of one conversation turn: load latest state, then save."""
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    previous = await saver.aget_tuple(config)
+    messages = list(previous.checkpoint["channel_values"].get("messages", [])) if previous else []
+    messages += [HumanMessage(content=f"question {turn}"), AIMessage(content=f"answer {turn}")]
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": messages}
+    checkpoint["channel_versions"] = {"messages": turn + 1}
+    if previous:
+        config = previous.config
+    await saver.aput(config, checkpoint, {"source": "loop", "step": turn, "writes": {}}, {})
+
+
+async def _run_conversations(
+    saver: BaseCheckpointSaver, conversations: int, turns: int
+) -> dict[str, float]:
+    """Run `conversations` concurrent threads of `turns` turns each and report throughput."""
+
+    async def conversation() -> None:
+        thread_id = str(uuid4())
+        for turn in range(turns):
+            await checkpoint_turn(saver, thread_id, turn)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation() for _ in range(conversations)))
+    elapsed = time.perf_counter() - start
+    return {"elapsed_s": elapsed, "turns_per_s": conversations * turns / elapsed}
+
+
+@pytest.fixture
+def run_conversations() -> Callable[..., Awaitable[dict[str, float]]]:
+    return _run_conversations
+
+
+@pytest.fixture
+def save_turn() -> Callable[..., Awaitable[None]]:
+    return checkpoint_turn
+
+
+@pytest.fixture
+def report() -> Callable[..., None]:
+    """Print a benchmark result line, visible with `pytest -s`."""
+
+    def _report(name: str, **values: float) -> None:
+        formatted = ", ".join(f"{k}={v:.3f}" for k, v in values.items())
+        print(f"\n[benchmark] {name}: {formatted}")  # noqa: T201
+
+    return _report
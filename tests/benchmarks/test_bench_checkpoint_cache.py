@@ -0,0 +1,67 @@
+"""
+Checkpoint database round trips per turn, with and without the in-process checkpoint cache.
+
+    pytest tests/benchmarks/test_bench_checkpoint_cache.py --run-benchmark -s
+"""
+
+import asyncio
+import time
+from contextlib import ExitStack
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+
+from memory.caching import CachingCheckpointSaver
+
+CONVERSATIONS = 20
+TURNS = 10
+
+
+def _graph(checkpointer):
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("cached", [False, True])
+async def test_bench_checkpoint_cache(cached, tmp_path, report):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as sqlite:
+        await sqlite.setup()
+        saver = CachingCheckpointSaver(sqlite) if cached else sqlite
+        graph = _graph(saver)
+
+        async def conversation() -> None:
+            config = {"configurable": {"thread_id": str(uuid4())}}
+            for turn in range(TURNS):
+                # Like the service: check for interrupts, then run
+                await graph.aget_state(config)
+                await graph.ainvoke({"messages": [HumanMessage(content=f"turn {turn}")]}, config)
+
+        with ExitStack() as stack:
+            calls = {
+                name: stack.enter_context(patch.object(sqlite, name, wraps=getattr(sqlite, name)))
+                for name in ("aget_tuple", "aput", "aput_writes")
+            }
+            start = time.perf_counter()
+            await asyncio.gather(*(conversation() for _ in range(CONVERSATIONS)))
+            elapsed = time.perf_counter() - start
+
+    turns = CONVERSATIONS * TURNS
+    report(
+        f"checkpoint cache={cached}",
+        reads_per_turn=calls["aget_tuple"].await_count / turns,
+        writes_per_turn=(calls["aput"].await_count + calls["aput_writes"].await_count) / turns,
+        turns_per_s=turns / elapsed,
+        hit_rate=saver.stats()["cache_hit_rate"] if cached else 0.0,
+    )
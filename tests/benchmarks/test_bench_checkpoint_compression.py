@@ -0,0 +1,97 @@
+"""
+Disk bytes, write and read latency per checkpoint with and without compression, for
+conversations with large tool outputs, as the research assistant's web searches produce.
+
+    pytest tests/benchmarks/test_bench_checkpoint_compression.py --run-benchmark -s
+"""
+
+import random
+import time
+
+import aiosqlite
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage, ToolMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.serde import CompressedSerializer
+
+TURNS = 50
+WORDS = (
+    "weather forecast san francisco fog morning afternoon clear sky high low temperature wind "
+    "humidity rain chance week weekend bay area coast inland cloudy sunny mild cool warm "
+    "update news report local today tomorrow degrees celsius fahrenheit pressure visibility"
+).split()
+
+
+def _search_result(turn: int) -> str:
+    """Ten search hits of random text, so that each turn's tool output is different."""
+    rng = random.Random(turn)
+    return ", ".join(
+        f"snippet: {' '.join(rng.choices(WORDS, k=40))}., title: {rng.choice(WORDS).title()} "
+        f"{i}, link: https://example.com/{rng.choice(WORDS)}/{rng.randrange(10**6)}"
+        for i in range(10)
+    )
+
+
+RESPONSE_METADATA = {
+    "token_usage": {"completion_tokens": 120, "prompt_tokens": 2400, "total_tokens": 2520},
+    "model_name": "gpt-4o-mini-2024-07-18",
+    "system_fingerprint": "fp_0123456789",
+    "finish_reason": "stop",
+}
+
+
+def _turn_messages(turn: int) -> list:
+    return [
+        HumanMessage(content=f"What's the weather like today? ({turn})"),
+        AIMessage(
+            content="",
+            tool_calls=[{"name": "WebSearch", "args": {"query": "weather"}, "id": f"call_{turn}"}],
+            response_metadata=RESPONSE_METADATA,
+        ),
+        ToolMessage(content=_search_result(turn), tool_call_id=f"call_{turn}"),
+        AIMessage(
+            content="It's foggy this morning with highs near 18C.",
+            response_metadata=RESPONSE_METADATA,
+        ),
+    ]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("codec", [None, "zlib", "zstd"])
+async def test_bench_checkpoint_compression(codec, tmp_path, report):
+    if codec == "zstd":
+        pytest.importorskip("zstandard")
+    serde = CompressedSerializer(codec=codec) if codec else None
+
+    async with aiosqlite.connect(str(tmp_path / "checkpoints.db")) as conn:
+        saver = AsyncSqliteSaver(conn, serde=serde)
+        await saver.setup()
+        config = {"configurable": {"thread_id": "1", "checkpoint_ns": ""}}
+        messages: list = []
+        write_s = 0.0
+        for turn in range(TURNS):
+            messages += _turn_messages(turn)
+            checkpoint = empty_checkpoint()
+            checkpoint["channel_values"] = {"messages": messages}
+            checkpoint["channel_versions"] = {"messages": turn + 1}
+            start = time.perf_counter()
+            config = await saver.aput(config, checkpoint, {"step": turn}, {})
+            write_s += time.perf_counter() - start
+
+        start = time.perf_counter()
+        async for _ in saver.alist({"configurable": {"thread_id": "1"}}):
+            pass
+        read_s = time.perf_counter() - start
+
+        async with conn.execute("SELECT SUM(LENGTH(checkpoint)) FROM checkpoints") as cur:
+            (stored_bytes,) = await cur.fetchone()
+
+    report(
+        f"checkpoint compression codec={codec}",
+        kb_per_checkpoint=stored_bytes / TURNS / 1000,
+        write_ms_per_checkpoint=write_s * 1000 / TURNS,
+        read_ms_per_checkpoint=read_s * 1000 / TURNS,
+    )
@@ -0,0 +1,62 @@
+"""
+State-load latency and database size of long SQLite threads, before and after retention.
+
+    pytest tests/benchmarks/test_bench_checkpoint_retention.py --run-benchmark -s
+"""
+
+import time
+from uuid import uuid4
+
+import pytest
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from memory.retention import CheckpointRetention
+
+THREADS = 20
+TURNS = 100
+LOADS = 5
+
+
+async def _load_latency_ms(saver: AsyncSqliteSaver, thread_ids: list[str]) -> float:
+    start = time.perf_counter()
+    for _ in range(LOADS):
+        for thread_id in thread_ids:
+            await saver.aget_tuple({"configurable": {"thread_id": thread_id}})
+    return (time.perf_counter() - start) * 1000 / (LOADS * len(thread_ids))
+
+
+async def _db_size(saver: AsyncSqliteSaver) -> int:
+    async with saver.conn.execute(
+        "SELECT page_count * page_size FROM pragma_page_count(), pragma_page_size()"
+    ) as cur:
+        (size,) = await cur.fetchone()
+    return size
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("keep_last", [1, 10])
+async def test_bench_checkpoint_retention(keep_last, tmp_path, save_turn, report):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        await saver.setup()
+        thread_ids = [str(uuid4()) for _ in range(THREADS)]
+        for thread_id in thread_ids:
+            for turn in range(TURNS):
+                await save_turn(saver, thread_id, turn)
+
+        size_before = await _db_size(saver)
+        load_before = await _load_latency_ms(saver, thread_ids)
+        retention = CheckpointRetention(saver, keep_last=keep_last, vacuum=True)
+        result = await retention.prune()
+        load_after = await _load_latency_ms(saver, thread_ids)
+        size_after = await _db_size(saver)
+
+    report(
+        f"checkpoint retention keep_last={keep_last}",
+        load_ms_before=load_before,
+        load_ms_after=load_after,
+        db_mb_before=size_before / 1e6,
+        db_mb_after=size_after / 1e6,
+        mb_reclaimed=result.bytes_reclaimed / 1e6,
+        prune_s=retention.last_run_s,
+    )
@@ -0,0 +1,54 @@
+"""
+Cold-start import time of the service, from `python -X importtime`, with the slowest imports
+it pulls in. tests/agents/test_agents.py checks that provider SDKs aren't imported at startup.
+
+    pytest tests/benchmarks/test_bench_import_time.py --run-benchmark -s
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+import pytest
+
+SRC = Path(__file__).parents[2] / "src"
+STARTUP = "import service"
+FIRST_RUN = "import service; from agents import get_agent; get_agent('chatbot')"
+
+
+def _import_times(code: str) -> tuple[dict[str, int], int]:
+    """
+    Cumulative import time in microseconds of each module imported by `code`, and the total
+    of the modules it imports directly.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SRC,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    times = {}
+    total = 0
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        _, cumulative, module = line.removeprefix("import time:").split("|")
+        times.setdefault(module.strip(), int(cumulative))
+        # Imports are indented under the module that imported them
+        if not module.startswith("  ", 1):
+            total += int(cumulative)
+    return times, total
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("code", [STARTUP, FIRST_RUN], ids=["startup", "first_run"])
+def test_bench_import_time(code, report):
+    times, total = _import_times(code)
+    packages = {m: us for m, us in times.items() if "." not in m}
+    slowest = sorted(packages.items(), key=lambda item: item[1], reverse=True)[:8]
+    report(
+        f"import time ({code})",
+        total_ms=total / 1000,
+        **{f"{package}_ms": us / 1000 for package, us in slowest},
+    )
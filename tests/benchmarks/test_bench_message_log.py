@@ -0,0 +1,88 @@
+"""
+Bytes written to SQLite per turn, with messages stored in every checkpoint vs. once in the
+per-thread message log, for conversations of increasing length.
+
+    pytest tests/benchmarks/test_bench_message_log.py --run-benchmark -s
+"""
+
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+
+from core.settings import CompressionCodec, settings
+from memory.sqlite import get_sqlite_saver
+
+MESSAGES = [10, 100, 1000]
+TURNS = 5
+STORED_BYTES = """
+    SELECT
+        (SELECT COALESCE(SUM(LENGTH(checkpoint) + LENGTH(metadata)), 0) FROM checkpoints)
+        + (SELECT COALESCE(SUM(LENGTH(value)), 0) FROM writes)
+        + (SELECT COALESCE(SUM(LENGTH(value) + LENGTH(message_id) + LENGTH(digest)), 0)
+           FROM messages)
+"""
+
+
+def _turn(turn: int) -> list:
+    # Messages get IDs from add_messages in a graph
+    return [
+        HumanMessage(content=f"What's the weather like in city {turn}?", id=f"h{turn}"),
+        AIMessage(content=f"It's sunny in city {turn}, with highs near 20C.", id=f"a{turn}"),
+    ]
+
+
+async def _stored_bytes(conn) -> int:
+    async with conn.execute(STORED_BYTES) as cur:
+        return (await cur.fetchone())[0]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("message_count", MESSAGES)
+@pytest.mark.parametrize("message_log", [False, True])
+async def test_bench_message_log(message_log, message_count, tmp_path, report):
+    # Without compression, which is benchmarked on its own
+    with (
+        patch.object(settings, "SQLITE_DB_PATH", str(tmp_path / "checkpoints.db")),
+        patch.object(settings, "CHECKPOINT_COMPRESSION", CompressionCodec.NONE),
+        patch.object(settings, "SQLITE_MESSAGE_LOG", message_log),
+    ):
+        async with get_sqlite_saver() as saver:
+            await saver.setup()
+            config = {"configurable": {"thread_id": "1", "checkpoint_ns": ""}}
+            messages: list = []
+            version = 0
+
+            async def save(new: list) -> None:
+                nonlocal config, version
+                messages.extend(new)
+                version += 1
+                checkpoint = empty_checkpoint()
+                checkpoint["channel_values"] = {"messages": list(messages)}
+                checkpoint["channel_versions"] = {"messages": version}
+                config = await saver.aput(config, checkpoint, {"step": version}, {})
+
+            # The conversation so far, saved in one checkpoint
+            await save([m for turn in range(message_count // 2) for m in _turn(turn)])
+
+            before = await _stored_bytes(saver.conn)
+            start = time.perf_counter()
+            for turn in range(message_count // 2, message_count // 2 + TURNS):
+                await save(_turn(turn))
+            write_s = time.perf_counter() - start
+            written = await _stored_bytes(saver.conn) - before
+
+            start = time.perf_counter()
+            latest = await saver.aget_tuple({"configurable": {"thread_id": "1"}})
+            read_s = time.perf_counter() - start
+            assert len(latest.checkpoint["channel_values"]["messages"]) == len(messages)
+
+    report(
+        f"message log={message_log} messages={message_count}",
+        kb_written_per_turn=written / TURNS / 1000,
+        write_ms_per_turn=write_s * 1000 / TURNS,
+        read_latest_ms=read_s * 1000,
+    )
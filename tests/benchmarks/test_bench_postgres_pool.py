@@ -0,0 +1,43 @@
+"""
+Concurrent checkpoint I/O against a local Postgres, single connection vs. connection pool.
+
+    docker run -d --rm -p 5432:5432 -e POSTGRES_PASSWORD=postgres postgres:16
+    POSTGRES_USER=postgres POSTGRES_PASSWORD=postgres POSTGRES_HOST=localhost \
+    POSTGRES_PORT=5432 POSTGRES_DB=postgres \
+    pytest tests/benchmarks/test_bench_postgres_pool.py --run-docker --run-benchmark -s
+"""
+
+import pytest
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+from core.metrics import collect_metrics
+from core.settings import settings
+from memory.postgres import get_postgres_connection_string, get_postgres_saver
+
+CONVERSATIONS = [1, 10, 50]
+TURNS = 10
+
+
+@pytest.mark.docker
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("conversations", CONVERSATIONS)
+async def test_bench_postgres_pool(conversations, run_conversations, report):
+    if not settings.POSTGRES_HOST:
+        pytest.skip("POSTGRES_* settings are required for the Postgres benchmark")
+
+    async with AsyncPostgresSaver.from_conn_string(get_postgres_connection_string()) as saver:
+        await saver.setup()
+        single = await run_conversations(saver, conversations, TURNS)
+
+    async with get_postgres_saver() as saver:
+        await saver.setup()
+        pooled = await run_conversations(saver, conversations, TURNS)
+        stats = collect_metrics()["postgres_pool"]
+
+    report(
+        f"postgres conversations={conversations}",
+        single_turns_per_s=single["turns_per_s"],
+        pooled_turns_per_s=pooled["turns_per_s"],
+        acquire_wait_ms_avg=stats["acquire_wait_ms_avg"],
+    )
@@ -0,0 +1,97 @@
+"""
+CPU cost of serializing SSE events and /invoke responses, stdlib json vs. pre-encoded bytes.
+
+    pytest tests/benchmarks/test_bench_serialization.py --run-benchmark -s
+"""
+
+import json
+import time
+
+import pytest
+
+from schema import ChatMessage
+from service.serializers import dump_chat_message, sse_message, sse_token
+
+ITERATIONS = 20_000
+
+MESSAGES = {
+    "token": " weather",
+    "ai_text": ChatMessage(
+        type="ai",
+        content="The weather in Tokyo is sunny with a high of 24°C. " * 10,
+        run_id="847c6285-8fc9-4560-a83f-4e6285809254",
+        response_metadata={
+            "finish_reason": "stop",
+            "model_name": "gpt-4o-mini-2024-07-18",
+            "system_fingerprint": "fp_0aa8d3e20b",
+            "token_usage": {"completion_tokens": 120, "prompt_tokens": 850, "total_tokens": 970},
+        },
+    ),
+    "ai_tool_calls": ChatMessage(
+        type="ai",
+        content="",
+        run_id="847c6285-8fc9-4560-a83f-4e6285809254",
+        tool_calls=[
+            {
+                "name": "WebSearch",
+                "args": {"query": f"weather in city {i}"},
+                "id": f"call_{i:024d}",
+                "type": "tool_call",
+            }
+            for i in range(3)
+        ],
+        response_metadata={"finish_reason": "tool_calls", "model_name": "gpt-4o-mini"},
+    ),
+    "tool_result": ChatMessage(
+        type="tool",
+        content="[{'title': 'Tokyo weather', 'snippet': 'Sunny, 24°C'}] " * 20,
+        tool_call_id="call_000000000000000000000000",
+        run_id="847c6285-8fc9-4560-a83f-4e6285809254",
+    ),
+}
+
+
+def _stdlib_sse(message: ChatMessage | str) -> bytes:
+    if isinstance(message, str):
+        event = {"type": "token", "content": message}
+    else:
+        event = {"type": "message", "content": message.model_dump()}
+    return f"data: {json.dumps(event)}\n\n".encode()
+
+
+def _fast_sse(message: ChatMessage | str) -> bytes:
+    return sse_token(message) if isinstance(message, str) else sse_message(message)
+
+
+def _time_us(fn, arg) -> float:
+    start = time.process_time()
+    for _ in range(ITERATIONS):
+        fn(arg)
+    return (time.process_time() - start) * 1e6 / ITERATIONS
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("kind", MESSAGES.keys())
+def test_bench_sse_serialization(kind, report):
+    message = MESSAGES[kind]
+    stdlib_us, fast_us = _time_us(_stdlib_sse, message), _time_us(_fast_sse, message)
+    report(
+        f"sse {kind}",
+        stdlib_us=stdlib_us,
+        fast_us=fast_us,
+        speedup=stdlib_us / fast_us,
+        bytes=len(_fast_sse(message)),
+    )
+
+
+@pytest.mark.benchmark
+@pytest.mark.parametrize("kind", ["ai_text", "ai_tool_calls", "tool_result"])
+def test_bench_invoke_serialization(kind, report):
+    message = MESSAGES[kind]
+    # FastAPI's default path validates the response_model, dumps to a dict, then json.dumps
+    fastapi_us = _time_us(
+        lambda m: json.dumps(ChatMessage.model_validate(m.model_dump()).model_dump()).encode(),
+        message,
+    )
+    fast_us = _time_us(dump_chat_message, message)
+    report(f"invoke {kind}", fastapi_us=fastapi_us, fast_us=fast_us, speedup=fastapi_us / fast_us)
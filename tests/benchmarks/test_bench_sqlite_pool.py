@@ -0,0 +1,64 @@
+"""
+Concurrent checkpoint I/O against SQLite, one shared connection vs. WAL with a writer and a
+pool of readers.
+
+    pytest tests/benchmarks/test_bench_sqlite_pool.py --run-benchmark -s
+"""
+
+import asyncio
+import time
+from unittest.mock import patch
+from uuid import uuid4
+
+import pytest
+from langgraph.checkpoint.base import BaseCheckpointSaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+
+from core.settings import CompressionCodec, settings
+from memory.sqlite import get_sqlite_saver
+
+CONVERSATIONS = [1, 10, 50]
+TURNS = 10
+# The service reads a thread's latest checkpoint more often than it writes one: to check for
+# interrupts, to start the run and to serve /history
+EXTRA_READS_PER_TURN = 2
+
+
+async def _turns_per_s(saver: BaseCheckpointSaver, conversations: int, save_turn) -> float:
+    async def conversation() -> None:
+        thread_id = str(uuid4())
+        for turn in range(TURNS):
+            for _ in range(EXTRA_READS_PER_TURN):
+                await saver.aget_tuple({"configurable": {"thread_id": thread_id}})
+            await save_turn(saver, thread_id, turn)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(conversation() for _ in range(conversations)))
+    return conversations * TURNS / (time.perf_counter() - start)
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("conversations", CONVERSATIONS)
+async def test_bench_sqlite_pool(conversations, tmp_path, save_turn, report):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "single.db")) as saver:
+        await saver.setup()
+        single = await _turns_per_s(saver, conversations, save_turn)
+
+    # Without compression, which is benchmarked on its own
+    with (
+        patch.object(settings, "SQLITE_DB_PATH", str(tmp_path / "pooled.db")),
+        patch.object(settings, "CHECKPOINT_COMPRESSION", CompressionCodec.NONE),
+    ):
+        async with get_sqlite_saver() as saver:
+            await saver.setup()
+            pooled = await _turns_per_s(saver, conversations, save_turn)
+            read_wait_ms = saver.stats()["read_wait_ms_avg"]
+
+    report(
+        f"sqlite conversations={conversations}",
+        single_turns_per_s=single,
+        pooled_turns_per_s=pooled,
+        speedup=pooled / single,
+        read_wait_ms_avg=read_wait_ms,
+    )
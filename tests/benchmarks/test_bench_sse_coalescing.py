@@ -0,0 +1,63 @@
+"""
+SSE frames and CPU per stream, one frame per token vs. coalesced token frames.
+
+    pytest tests/benchmarks/test_bench_sse_coalescing.py --run-benchmark -s
+"""
+
+import asyncio
+import time
+from unittest.mock import AsyncMock, patch
+
+import pytest
+from langchain_core.messages import AIMessage, AIMessageChunk
+
+from client import AgentClient
+from schema import StreamInput
+from service.service import message_generator
+
+STREAMS = 50
+TOKENS = 500
+TOKEN_INTERVAL_S = 0.0005
+
+
+def _mock_agent() -> AsyncMock:
+    async def astream(**kwargs):
+        for i in range(TOKENS):
+            await asyncio.sleep(TOKEN_INTERVAL_S)
+            yield ("messages", (AIMessageChunk(content=f" token{i}"), {"tags": []}))
+        yield ("updates", {"model": {"messages": [AIMessage(content="done")]}})
+
+    agent = AsyncMock()
+    agent.astream = astream
+    return agent
+
+
+async def _collect(user_input: StreamInput) -> list[bytes]:
+    return [frame async for frame in message_generator(user_input)]
+
+
+@pytest.mark.benchmark
+@pytest.mark.asyncio
+@pytest.mark.parametrize("token_batch_ms", [None, 20, 50])
+async def test_bench_sse_coalescing(token_batch_ms, report):
+    user_input = StreamInput(message="Hello", token_batch_ms=token_batch_ms)
+    with patch("service.service.aget_agent", return_value=_mock_agent()):
+        cpu_start, wall_start = time.process_time(), time.perf_counter()
+        streams = await asyncio.gather(*(_collect(user_input) for _ in range(STREAMS)))
+        cpu_s, wall_s = time.process_time() - cpu_start, time.perf_counter() - wall_start
+
+    # Client side cost of parsing the frames of one stream
+    client = AgentClient(get_info=False)
+    parse_start = time.process_time()
+    for frame in streams[0]:
+        client._parse_stream_line(frame.decode())
+    parse_ms = (time.process_time() - parse_start) * 1000
+
+    frames = sum(len(frames) for frames in streams)
+    report(
+        f"sse token_batch_ms={token_batch_ms}",
+        frames_per_stream=frames / STREAMS,
+        frames_per_s=frames / wall_s,
+        server_cpu_ms_per_stream=cpu_s * 1000 / STREAMS,
+        client_parse_ms_per_stream=parse_ms,
+    )
@@ -1,3 +1,4 @@
+import asyncio
 import json
 import os
 from unittest.mock import AsyncMock, Mock, patch
@@ -6,7 +7,7 @@ import pytest
 from httpx import Request, Response
 
 from client import AgentClient, AgentClientError
-from schema import AgentInfo, ChatHistory, ChatMessage, ServiceMetadata
+from schema import AgentInfo, BatchResult, ChatHistory, ChatMessage, ServiceMetadata, UserInput
 from schema.models import OpenAIModelName
 
 
@@ -53,14 +54,14 @@ def test_invoke(agent_client):
         json={"type": "ai", "content": ANSWER},
         request=mock_request,
     )
-    with patch("httpx.post", return_value=mock_response):
+    with patch("httpx.Client.post", return_value=mock_response):
         response = agent_client.invoke(QUESTION)
         assert isinstance(response, ChatMessage)
         assert response.type == "ai"
         assert response.content == ANSWER
 
     # Test with model and thread_id
-    with patch("httpx.post", return_value=mock_response) as mock_post:
+    with patch("httpx.Client.post", return_value=mock_response) as mock_post:
         response = agent_client.invoke(
             QUESTION,
             model="gpt-4o",
@@ -75,7 +76,7 @@ def test_invoke(agent_client):
 
     # Test error response
     error_response = Response(500, text="Internal Server Error", request=mock_request)
-    with patch("httpx.post", return_value=error_response):
+    with patch("httpx.Client.post", return_value=error_response):
         with pytest.raises(AgentClientError) as exc:
             agent_client.invoke(QUESTION)
         assert "500 Internal Server Error" in str(exc.value)
@@ -143,7 +144,7 @@ def test_stream(agent_client):
     mock_response.__enter__ = Mock(return_value=mock_response)
     mock_response.__exit__ = Mock(return_value=None)
 
-    with patch("httpx.stream", return_value=mock_response):
+    with patch("httpx.Client.stream", return_value=mock_response):
         # Collect all streamed responses
         responses = list(agent_client.stream(QUESTION))
 
@@ -158,6 +159,11 @@ def test_stream(agent_client):
         assert final_message.type == "ai"
         assert final_message.content == FINAL_ANSWER
 
+    # Test token batching is passed through
+    with patch("httpx.Client.stream", return_value=mock_response) as mock_stream:
+        list(agent_client.stream(QUESTION, token_batch_ms=50))
+        assert mock_stream.call_args.kwargs["json"]["token_batch_ms"] == 50
+
     # Test error response
     error_response = Response(
         500, text="Internal Server Error", request=Request("POST", "http://test/stream")
@@ -165,7 +171,7 @@ def test_stream(agent_client):
     error_response_mock = Mock()
     error_response_mock.__enter__ = Mock(return_value=error_response)
     error_response_mock.__exit__ = Mock(return_value=None)
-    with patch("httpx.stream", return_value=error_response_mock):
+    with patch("httpx.Client.stream", return_value=error_response_mock):
         with pytest.raises(AgentClientError) as exc:
             list(agent_client.stream(QUESTION))
         assert "500 Internal Server Error" in str(exc.value)
@@ -236,6 +242,72 @@ async def test_astream(agent_client):
         assert "500 Internal Server Error" in str(exc.value)
 
 
+def test_batch(agent_client):
+    """Test batch invocation."""
+    RESULTS = [
+        BatchResult(index=1, output=ChatMessage(type="ai", content="Second")),
+        BatchResult(index=0, error="Unexpected error"),
+    ]
+
+    mock_response = Mock()
+    mock_response.iter_lines.return_value = [r.model_dump_json() for r in RESULTS] + [""]
+    mock_response.__enter__ = Mock(return_value=mock_response)
+    mock_response.__exit__ = Mock(return_value=None)
+
+    with patch("httpx.Client.stream", return_value=mock_response) as mock_stream:
+        results = list(
+            agent_client.batch(
+                ["First", UserInput(message="Second", thread_id="thread-2")],
+                model="gpt-4o",
+                concurrency=4,
+            )
+        )
+        assert results == RESULTS
+        args, kwargs = mock_stream.call_args
+        assert args[1] == "http://test/test-agent/batch"
+        assert kwargs["json"]["concurrency"] == 4
+        first, second = kwargs["json"]["inputs"]
+        assert first["message"] == "First"
+        assert first["model"] == "gpt-4o"
+        assert second["thread_id"] == "thread-2"
+        assert second["model"] != "gpt-4o"
+
+    # Test error response
+    error_response = Response(
+        500, text="Internal Server Error", request=Request("POST", "http://test/batch")
+    )
+    error_response_mock = Mock()
+    error_response_mock.__enter__ = Mock(return_value=error_response)
+    error_response_mock.__exit__ = Mock(return_value=None)
+    with patch("httpx.Client.stream", return_value=error_response_mock):
+        with pytest.raises(AgentClientError) as exc:
+            list(agent_client.batch(["First"]))
+        assert "500 Internal Server Error" in str(exc.value)
+
+
+@pytest.mark.asyncio
+async def test_abatch(agent_client):
+    """Test asynchronous batch invocation."""
+    RESULTS = [
+        BatchResult(index=0, output=ChatMessage(type="ai", content="First")),
+        BatchResult(index=1, output=ChatMessage(type="ai", content="Second")),
+    ]
+
+    async def async_lines():
+        for result in RESULTS:
+            yield result.model_dump_json()
+
+    mock_response = AsyncMock()
+    mock_response.raise_for_status = Mock()
+    mock_response.aiter_lines = Mock(return_value=async_lines())
+    mock_response.__aenter__ = AsyncMock(return_value=mock_response)
+
+    with patch("httpx.AsyncClient.stream", return_value=mock_response) as mock_stream:
+        results = [result async for result in agent_client.abatch(["First", "Second"])]
+        assert results == RESULTS
+        assert len(mock_stream.call_args.kwargs["json"]["inputs"]) == 2
+
+
 @pytest.mark.asyncio
 async def test_acreate_feedback(agent_client):
     """Test asynchronous feedback creation."""
@@ -277,18 +349,26 @@ def test_get_history(agent_client):
 
     # Mock successful response
     mock_response = Response(200, json=HISTORY, request=Request("POST", "http://test/history"))
-    with patch("httpx.post", return_value=mock_response):
+    with patch("httpx.Client.post", return_value=mock_response) as mock_post:
         history = agent_client.get_history(THREAD_ID)
+        assert mock_post.call_args.args[0] == "http://test/test-agent/history"
         assert isinstance(history, ChatHistory)
         assert len(history.messages) == 2
         assert history.messages[0].type == "human"
         assert history.messages[1].type == "ai"
 
+    # Test pagination parameters
+    with patch("httpx.Client.post", return_value=mock_response) as mock_post:
+        agent_client.get_history(THREAD_ID, limit=10, before=20)
+        kwargs = mock_post.call_args.kwargs
+        assert kwargs["json"]["limit"] == 10
+        assert kwargs["json"]["before"] == 20
+
     # Test error response
     error_response = Response(
         500, text="Internal Server Error", request=Request("POST", "http://test/history")
     )
-    with patch("httpx.post", return_value=error_response):
+    with patch("httpx.Client.post", return_value=error_response):
         with pytest.raises(AgentClientError) as exc:
             agent_client.get_history(THREAD_ID)
         assert "500 Internal Server Error" in str(exc.value)
@@ -310,7 +390,7 @@ def test_info(agent_client):
     )
 
     # Update an existing client with info
-    with patch("httpx.get", return_value=test_response):
+    with patch("httpx.Client.get", return_value=test_response):
         agent_client.retrieve_info()
 
     assert agent_client.info == test_info
@@ -322,7 +402,7 @@ def test_info(agent_client):
     assert "Agent unknown-agent not found in available agents: custom-agent" in str(exc.value)
 
     # Test a fresh client with info
-    with patch("httpx.get", return_value=test_response):
+    with patch("httpx.Client.get", return_value=test_response):
         agent_client = AgentClient(base_url="http://test")
     assert agent_client.info == test_info
     assert agent_client.agent == "custom-agent"
@@ -332,3 +412,69 @@ def test_info(agent_client):
     with pytest.raises(AgentClientError) as exc:
         agent_client.invoke("test")
     assert "No agent selected. Use update_agent() to select an agent." in str(exc.value)
+
+
+def test_connection_pool(mock_env):
+    """Requests share one pooled client until the AgentClient is closed."""
+    with AgentClient(
+        base_url="http://test", get_info=False, max_connections=5, keepalive_expiry=30
+    ) as agent_client:
+        agent_client.update_agent("test-agent", verify=False)
+        client = agent_client.client
+        assert agent_client.client is client
+        pool = client._transport._pool
+        assert pool._max_connections == 5
+        assert pool._keepalive_expiry == 30
+
+        mock_response = Response(200, json={"messages": []}, request=Request("POST", "http://test"))
+        with patch.object(client, "post", return_value=mock_response) as mock_post:
+            agent_client.get_history("thread-1")
+            agent_client.get_history("thread-2")
+        assert mock_post.call_count == 2
+    assert client.is_closed
+    assert agent_client._client is None
+
+
+@pytest.mark.asyncio
+async def test_async_connection_pool(mock_env):
+    """Async requests share one pooled client per event loop until the AgentClient is closed."""
+    async with AgentClient(base_url="http://test", get_info=False) as agent_client:
+        aclient = agent_client.aclient
+        assert agent_client.aclient is aclient
+    assert aclient.is_closed
+    assert agent_client._aclients == {}
+
+
+def test_async_client_per_event_loop(mock_env):
+    """A client reused across event loops, like in Streamlit, gets a new pool for each loop."""
+    agent_client = AgentClient(base_url="http://test", get_info=False)
+
+    async def get_aclient():
+        return agent_client.aclient
+
+    async def use_and_close():
+        aclient = agent_client.aclient
+        await agent_client.aclose()
+        return aclient
+
+    # Closed from the loop it belongs to, before asyncio.run closes the loop
+    first = asyncio.run(use_and_close())
+    assert first.is_closed
+
+    loop = asyncio.new_event_loop()
+    try:
+        with agent_client:
+            second = loop.run_until_complete(get_aclient())
+            assert second is not first
+            # Nothing is left pending in the loop to close the pool
+            assert not asyncio.all_tasks(loop)
+            # The pools of closed loops can't be closed anymore, and are dropped
+            asyncio.run(get_aclient())
+            asyncio.run(get_aclient())
+            assert len(agent_client._aclients) == 2
+            assert loop in agent_client._aclients
+        # Leaving the context closes the pools whose loops are still open
+        assert second.is_closed
+    finally:
+        loop.close()
+    assert agent_client._aclients == {}
@@ -0,0 +1,50 @@
+from unittest.mock import patch
+
+import pytest
+
+from core.cache import LRUCache
+
+
+def test_lru_cache_get_set():
+    cache: LRUCache[str, int] = LRUCache(maxsize=2)
+    assert cache.get("a") is None
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+
+    # "b" is now least recently used and gets evicted
+    cache.set("c", 3)
+    assert "b" not in cache
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+    stats = cache.stats()
+    assert stats["hits"] == 3
+    assert stats["misses"] == 1
+    assert stats["evictions"] == 1
+    assert stats["hit_rate"] == 0.75
+
+
+def test_lru_cache_ttl():
+    cache: LRUCache[str, int] = LRUCache(maxsize=2, ttl=10)
+    with patch("core.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("core.cache.time.monotonic", return_value=105.0):
+        assert cache.get("a") == 1
+    with patch("core.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_lru_cache_peek_does_not_count():
+    cache: LRUCache[str, int] = LRUCache()
+    cache.set("a", 1)
+    assert cache.peek("a") == 1
+    assert cache.peek("b") is None
+    assert cache.stats()["hits"] == 0
+    assert cache.stats()["misses"] == 0
+
+
+def test_lru_cache_invalid_size():
+    with pytest.raises(ValueError):
+        LRUCache(maxsize=0)
@@ -0,0 +1,221 @@
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+
+from core.circuit_breaker import (
+    CircuitBreaker,
+    CircuitBreakerChatModel,
+    CircuitOpenError,
+    CircuitState,
+    get_circuit_breaker,
+    is_transient_error,
+)
+from core.llm import get_model
+from core.llm_cache import CachedChatModel, _response_caches
+from core.metrics import collect_metrics
+from schema.models import FakeModelName, Provider
+
+
+class FlakyModel(FakeListChatModel):
+    """Fake model that fails while `failing` is set, and responds after `sleep`."""
+
+    failing: bool = True
+    error: Exception = ConnectionError("provider unavailable")
+
+    async def _agenerate(self, *args, **kwargs):
+        if self.sleep:
+            await asyncio.sleep(self.sleep)
+        if self.failing:
+            raise self.error
+        return await super()._agenerate(*args, **kwargs)
+
+    async def _astream(self, *args, **kwargs):
+        if self.failing:
+            raise self.error
+        async for chunk in super()._astream(*args, **kwargs):
+            yield chunk
+
+
+def _guarded(model: FakeListChatModel, breaker: CircuitBreaker, fallback=None):
+    return CircuitBreakerChatModel(
+        model=model, breaker=breaker, provider=Provider.OPENAI, fallback=fallback
+    )
+
+
+@pytest.mark.asyncio
+async def test_opens_after_consecutive_failures():
+    breaker = CircuitBreaker(failure_threshold=2, reset_timeout=60)
+    flaky = FlakyModel(responses=["ok"])
+    model = _guarded(flaky, breaker)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await model.ainvoke("Hi")
+    assert breaker.state == CircuitState.OPEN
+
+    # Calls fail fast, without reaching the provider
+    flaky.failing = False
+    with pytest.raises(CircuitOpenError, match="openai is unavailable"):
+        await model.ainvoke("Hi")
+    with pytest.raises(CircuitOpenError):
+        [chunk async for chunk in model.astream("Hi")]
+    assert breaker.stats()["rejected"] == 2
+    assert flaky.i == 0
+
+
+@pytest.mark.asyncio
+async def test_success_resets_failures():
+    breaker = CircuitBreaker(failure_threshold=2)
+    flaky = FlakyModel(responses=["ok"])
+    model = _guarded(flaky, breaker)
+    with pytest.raises(ConnectionError):
+        await model.ainvoke("Hi")
+    flaky.failing = False
+    assert (await model.ainvoke("Hi")).content == "ok"
+    assert breaker.consecutive_failures == 0
+    assert breaker.state == CircuitState.CLOSED
+
+
+@pytest.mark.asyncio
+async def test_half_open_probe():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.05)
+    flaky = FlakyModel(responses=["ok"], sleep=0.05)
+    model = _guarded(flaky, breaker)
+    with pytest.raises(ConnectionError):
+        await model.ainvoke("Hi")
+    await asyncio.sleep(0.06)
+
+    # A failed probe opens the circuit again
+    with pytest.raises(ConnectionError):
+        await model.ainvoke("Hi")
+    assert breaker.state == CircuitState.OPEN
+    await asyncio.sleep(0.06)
+
+    # Only one probe is let through, and its success closes the circuit
+    flaky.failing = False
+    probe = asyncio.create_task(model.ainvoke("Hi"))
+    await asyncio.sleep(0.01)
+    assert breaker.state == CircuitState.HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        await model.ainvoke("Hi")
+    assert (await probe).content == "ok"
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.stats()["opened"] == 2
+
+
+@pytest.mark.asyncio
+async def test_only_transient_errors_count():
+    breaker = CircuitBreaker(failure_threshold=1, reset_timeout=0.01)
+    flaky = FlakyModel(responses=["ok"], error=ValueError("invalid request"))
+    model = _guarded(flaky, breaker)
+    for _ in range(3):
+        with pytest.raises(ValueError):
+            await model.ainvoke("Hi")
+        with pytest.raises(ValueError):
+            [chunk async for chunk in model.astream("Hi")]
+    assert breaker.state == CircuitState.CLOSED
+    assert breaker.consecutive_failures == 0
+
+    # An invalid request doesn't use up the probe of a half-open circuit
+    flaky.error = ConnectionError("provider unavailable")
+    with pytest.raises(ConnectionError):
+        await model.ainvoke("Hi")
+    await asyncio.sleep(0.02)
+    flaky.error = ValueError("invalid request")
+    with pytest.raises(ValueError):
+        await model.ainvoke("Hi")
+    assert breaker.state == CircuitState.HALF_OPEN
+    flaky.failing = False
+    assert (await model.ainvoke("Hi")).content == "ok"
+    assert breaker.state == CircuitState.CLOSED
+
+
+def test_is_transient_error():
+    def status_error(status_code: int) -> httpx.HTTPStatusError:
+        request = httpx.Request("POST", "http://provider")
+        response = httpx.Response(status_code, request=request)
+        return httpx.HTTPStatusError("error", request=request, response=response)
+
+    class APIConnectionError(Exception):
+        pass
+
+    class APITimeoutError(APIConnectionError):
+        pass
+
+    assert is_transient_error(TimeoutError())
+    assert is_transient_error(ConnectionResetError())
+    assert is_transient_error(httpx.ReadTimeout("timed out"))
+    assert is_transient_error(APITimeoutError())
+    assert is_transient_error(status_error(429))
+    assert is_transient_error(status_error(503))
+    assert not is_transient_error(status_error(400))
+    assert not is_transient_error(ValueError("invalid request"))
+    assert not is_transient_error(asyncio.CancelledError())
+
+
+@pytest.mark.asyncio
+async def test_slow_calls_count_as_failures():
+    breaker = CircuitBreaker(failure_threshold=1, slow_call_seconds=0.01)
+    model = _guarded(FakeListChatModel(responses=["ok"], sleep=0.05), breaker)
+    # The slow response is still returned
+    chunks = [chunk.content async for chunk in model.astream("Hi")]
+    assert chunks == ["o", "k"]
+    assert breaker.state == CircuitState.OPEN
+
+
+@pytest.mark.asyncio
+async def test_open_circuit_routes_to_fallback():
+    breaker = CircuitBreaker(failure_threshold=1)
+    fallback = FakeListChatModel(responses=["from fallback"])
+    model = _guarded(FlakyModel(responses=["ok"]), breaker, fallback=fallback)
+    with pytest.raises(ConnectionError):
+        await model.ainvoke("Hi")
+    assert (await model.ainvoke("Hi")).content == "from fallback"
+    assert "".join([c.content async for c in model.astream("Hi")]) == "from fallback"
+
+
+def test_get_circuit_breaker():
+    with (
+        patch("core.circuit_breaker.settings") as mock_settings,
+        patch.dict("core.circuit_breaker._breakers", clear=True),
+    ):
+        mock_settings.CIRCUIT_BREAKER_FAILURES = None
+        assert get_circuit_breaker(Provider.OPENAI) is None
+        mock_settings.CIRCUIT_BREAKER_FAILURES = 3
+        mock_settings.CIRCUIT_BREAKER_RESET_TIMEOUT = 10
+        mock_settings.CIRCUIT_BREAKER_SLOW_CALL = None
+        breaker = get_circuit_breaker(Provider.OPENAI)
+        assert get_circuit_breaker(Provider.OPENAI) is breaker
+        assert breaker.failure_threshold == 3
+        assert collect_metrics()["circuit_breakers"][Provider.OPENAI]["state"] == "closed"
+
+        # A provider's fallback model has its own breaker, but no fallback of its own
+        with patch("core.llm.settings") as llm_settings:
+            llm_settings.CIRCUIT_BREAKER_FALLBACK = {Provider.FAKE: FakeModelName.FAKE}
+            get_model.cache_clear()
+            model = get_model(FakeModelName.FAKE)
+        get_model.cache_clear()
+        assert isinstance(model, CircuitBreakerChatModel)
+        assert isinstance(model.fallback, CircuitBreakerChatModel)
+        assert model.fallback.fallback is None
+        assert model.breaker is get_circuit_breaker(Provider.FAKE)
+
+        # A fallback model is called within the primary's response cache, so it has none
+        with (
+            patch("core.llm.settings") as llm_settings,
+            patch("core.llm_cache.settings") as cache_settings,
+            patch.dict("core.llm_cache._response_caches", clear=True),
+        ):
+            llm_settings.CIRCUIT_BREAKER_FALLBACK = {Provider.FAKE: FakeModelName.FAKE}
+            cache_settings.LLM_CACHE_TTL = {FakeModelName.FAKE: 300}
+            cache_settings.LLM_CACHE_SIZE = 16
+            cache_settings.LLM_CACHE_SQLITE_PATH = None
+            cache_settings.LLM_CACHE_SIMILARITY = None
+            get_model.cache_clear()
+            model = get_model(FakeModelName.FAKE)
+            assert _response_caches == {FakeModelName.FAKE: model.response_cache}
+        get_model.cache_clear()
+        assert isinstance(model, CachedChatModel)
+        assert isinstance(model.model.fallback, CircuitBreakerChatModel)
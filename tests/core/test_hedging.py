@@ -0,0 +1,149 @@
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessageChunk
+from langgraph.graph import END, MessagesState, StateGraph
+
+from core.hedging import MIN_SAMPLES, HedgedChatModel, LatencyTracker, get_latency_tracker
+from core.llm import FakeToolModel, get_model
+from schema.models import FakeModelName, OpenAIModelName, VirtualModelName
+
+
+@pytest.fixture(autouse=True)
+def latencies():
+    with patch.dict("core.hedging._latencies", clear=True):
+        yield
+
+
+def fake(response: str, sleep: float | None = None) -> FakeToolModel:
+    """A FakeToolModel that waits `sleep` seconds before each character it streams."""
+    model = FakeToolModel(responses=[response])
+    model.sleep = sleep
+    return model
+
+
+class FailingModel(FakeListChatModel):
+    async def _astream(self, *args, **kwargs):
+        raise ConnectionError("provider unavailable")
+        yield
+
+
+class EmptyModel(FakeListChatModel):
+    async def astream(self, *args, **kwargs):
+        return
+        yield
+
+
+def test_latency_tracker():
+    tracker = LatencyTracker()
+    for seconds in range(1, MIN_SAMPLES):
+        tracker.record(seconds)
+    assert tracker.percentile(0.5) is None
+    for seconds in range(MIN_SAMPLES, 21):
+        tracker.record(seconds)
+    assert tracker.percentile(0.5) == 11
+    assert tracker.percentile(0.95) == 20
+    assert tracker.stats()["p95_ms"] == 20_000
+
+
+@pytest.mark.asyncio
+async def test_fast_primary_is_not_hedged():
+    model = HedgedChatModel(models={"a": fake("aa", 0.01), "b": fake("bb")}, hedge_after=1)
+    assert (await model.ainvoke("Hi")).content == "aa"
+    assert model.counts["hedged"] == 0
+    assert get_latency_tracker("a").samples
+    assert not get_latency_tracker("b").samples
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged():
+    slow, fast = fake("slow", 0.5), fake("fast", 0.01)
+    model = HedgedChatModel(models={"slow": slow, "fast": fast}, hedge_after=0.05)
+    start = time.perf_counter()
+    chunks = [chunk async for chunk in model.astream("Hi")]
+    assert time.perf_counter() - start < 0.4
+    assert "".join(c.content for c in chunks) == "fast"
+    assert model.counts["hedged"] == model.counts["primary_lost"] == 1
+    # The cancelled call counts with the time it had taken
+    assert get_latency_tracker("slow").samples[0] >= 0.05
+
+
+@pytest.mark.asyncio
+async def test_failed_primary_falls_back():
+    model = HedgedChatModel(models={"down": FailingModel(responses=["x"]), "up": fake("ok")})
+    assert (await model.ainvoke("Hi")).content == "ok"
+    assert model.counts["fallbacks"] == 1
+    assert get_latency_tracker("down").errors == 1
+
+    every_model_down = HedgedChatModel(
+        models={"down": FailingModel(responses=["x"]), "also_down": FailingModel(responses=["x"])}
+    )
+    with pytest.raises(ConnectionError):
+        await every_model_down.ainvoke("Hi")
+
+
+@pytest.mark.asyncio
+async def test_empty_response_falls_back():
+    model = HedgedChatModel(models={"empty": EmptyModel(responses=["x"]), "up": fake("ok")})
+    assert (await model.ainvoke("Hi")).content == "ok"
+    assert model.counts["fallbacks"] == 1
+    assert get_latency_tracker("empty").errors == 1
+
+    every_model_empty = HedgedChatModel(models={"empty": EmptyModel(responses=["x"])})
+    with pytest.raises(ValueError, match="empty returned no response"):
+        await every_model_empty.ainvoke("Hi")
+
+
+@pytest.mark.asyncio
+async def test_ranked_by_median_latency():
+    model = HedgedChatModel(models={"a": fake("a"), "b": fake("b")})
+    for _ in range(MIN_SAMPLES):
+        get_latency_tracker("a").record(1.0)
+    # Models without enough samples are tried first
+    assert model.ranked() == ["b", "a"]
+    for _ in range(MIN_SAMPLES):
+        get_latency_tracker("b").record(2.0)
+    assert model.ranked() == ["a", "b"]
+    assert model._hedge_delay("a") == 1.0
+    assert model.stats()["models"]["b"]["p50_ms"] == 2000
+
+
+@pytest.mark.asyncio
+async def test_only_the_winner_is_streamed():
+    model = HedgedChatModel(
+        models={"slow": fake("slow", 0.2), "fast": fake("fast", 0.01)}, hedge_after=0.05
+    )
+
+    async def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    graph = builder.compile()
+    tokens = [
+        message.content
+        async for message, _ in graph.astream(
+            {"messages": [("user", "Hi")]}, stream_mode="messages"
+        )
+        if isinstance(message, AIMessageChunk)
+    ]
+    assert tokens == list("fast")
+
+
+def test_get_hedged_model():
+    with patch("core.llm.settings") as mock_settings:
+        mock_settings.HEDGED_MODELS = [FakeModelName.FAKE]
+        get_model.cache_clear()
+        with pytest.raises(ValueError, match="at least two models"):
+            get_model(VirtualModelName.HEDGED)
+        mock_settings.HEDGED_MODELS = [FakeModelName.FAKE, OpenAIModelName.GPT_4O_MINI]
+        mock_settings.HEDGE_AFTER = 1.5
+        with patch.dict("os.environ", {"OPENAI_API_KEY": "test_key"}):
+            model = get_model(VirtualModelName.HEDGED)
+        assert list(model.models) == ["fake", "gpt-4o-mini"]
+        assert model.hedge_after == 1.5
+    get_model.cache_clear()
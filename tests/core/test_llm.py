@@ -9,12 +9,14 @@ from langchain_ollama import ChatOllama
 from langchain_openai import ChatOpenAI
 
 from core.llm import get_model
+from core.rate_limit import RateLimitedChatModel
 from schema.models import (
     AnthropicModelName,
     FakeModelName,
     GroqModelName,
     OllamaModelName,
     OpenAIModelName,
+    Provider,
 )
 
 
@@ -70,3 +72,18 @@ def test_get_model_invalid():
     with pytest.raises(ValueError, match="Unsupported model:"):
         # Using type: ignore since we're intentionally testing invalid input
         get_model("invalid_model")  # type: ignore
+
+
+def test_get_model_rate_limited():
+    with (
+        patch("core.rate_limit.settings") as mock_settings,
+        patch.dict("core.rate_limit._limiters", clear=True),
+    ):
+        mock_settings.PROVIDER_RPM = {Provider.FAKE: 60}
+        mock_settings.PROVIDER_TPM = {}
+        get_model.cache_clear()
+        model = get_model(FakeModelName.FAKE)
+        assert isinstance(model, RateLimitedChatModel)
+        assert isinstance(model.model, FakeListChatModel)
+        assert model.limiter.rpm == 60
+    get_model.cache_clear()
@@ -0,0 +1,166 @@
+import asyncio
+from unittest.mock import patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.embeddings import Embeddings
+from langchain_core.messages import AIMessage, HumanMessage, SystemMessage
+from langgraph.graph import END, MessagesState, StateGraph
+
+from core.cache import SqliteCache
+from core.llm_cache import CachedChatModel, NumpyVectorIndex, ResponseCache, cache_model
+from core.metrics import collect_metrics
+
+RESPONSES = ["First answer.", "Second answer.", "Third answer."]
+
+
+def _cached(response_cache: ResponseCache | None = None) -> CachedChatModel:
+    return CachedChatModel(
+        model=FakeListChatModel(responses=RESPONSES),
+        response_cache=response_cache or ResponseCache(ttl=60),
+    )
+
+
+class WordEmbeddings(Embeddings):
+    """Bag of words over a small vocabulary, so similar questions get similar vectors."""
+
+    VOCABULARY = ["capital", "france", "germany", "what", "is", "the", "of", "weather"]
+
+    def embed_documents(self, texts: list[str]) -> list[list[float]]:
+        return [self.embed_query(text) for text in texts]
+
+    def embed_query(self, text: str) -> list[float]:
+        words = text.lower().replace("?", "").replace("'s", " is").split()
+        return [float(words.count(w)) for w in self.VOCABULARY]
+
+
+@pytest.mark.asyncio
+async def test_cached_model_exact_match():
+    model = _cached()
+    first = await model.ainvoke([HumanMessage(content="What is  the capital of France?")])
+    second = await model.ainvoke([HumanMessage(content="What is the capital of France? ")])
+    assert first.content == second.content == "First answer."
+    # A replayed response gets a new ID, so it's added to the conversation as a new message
+    assert first.id != second.id
+
+    # Different messages or model parameters miss
+    other = await model.ainvoke([HumanMessage(content="What is the capital of Germany?")])
+    assert other.content == "Second answer."
+    stopped = await model.ainvoke(
+        [HumanMessage(content="What is the capital of France?")], stop=["."]
+    )
+    assert stopped.content == "Third answer."
+    assert model.invoke([HumanMessage(content="What is the capital of Germany?")]).content == (
+        "Second answer."
+    )
+    assert model.response_cache.stats()["hits"] == 2
+    assert model.response_cache.stats()["misses"] == 3
+
+
+@pytest.mark.asyncio
+async def test_cached_model_replays_stream():
+    model = _cached()
+    messages = [SystemMessage(content="Be brief."), HumanMessage(content="Hi")]
+    live = [chunk.content async for chunk in model.astream(messages)]
+    replayed = [chunk.content async for chunk in model.astream(messages)]
+    assert len(live) > 1
+    assert replayed == live
+    assert (await model.ainvoke(messages)).content == "First answer."
+    assert model.model.i == 1
+
+    # Token streaming from a graph node gets the cached chunks too
+    async def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [await model.ainvoke(state["messages"])]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    graph = builder.compile()
+    tokens = [
+        message.content
+        async for message, _ in graph.astream({"messages": messages}, stream_mode="messages")
+    ]
+    assert tokens == live
+
+
+@pytest.mark.asyncio
+async def test_response_cache_ttl():
+    model = _cached(ResponseCache(ttl=0.05))
+    await model.ainvoke("Hi")
+    await asyncio.sleep(0.1)
+    assert (await model.ainvoke("Hi")).content == "Second answer."
+
+
+@pytest.mark.asyncio
+async def test_response_cache_shared_store(tmp_path):
+    path = str(tmp_path / "llm_cache.db")
+    await _cached(ResponseCache(ttl=60, store=SqliteCache(path))).ainvoke("Hi")
+
+    # Another process, with its own in-process cache, reuses the stored response
+    other = _cached(ResponseCache(ttl=60, store=SqliteCache(path)))
+    assert (await other.ainvoke("Hi")).content == "First answer."
+    # Responses cached without streaming are replayed as one chunk
+    assert [c.content async for c in other.astream("Hi")] == ["First answer."]
+    assert other.response_cache.stats()["store_hits"] == 1
+    assert other.model.i == 0
+
+
+@pytest.mark.asyncio
+async def test_response_cache_similarity():
+    model = _cached(ResponseCache(ttl=60, embeddings=WordEmbeddings(), similarity=0.9))
+    question = [HumanMessage(content="What is the capital of France?")]
+    await model.ainvoke(question)
+
+    similar = await model.ainvoke([HumanMessage(content="what's the capital of france")])
+    assert similar.content == "First answer."
+    assert model.response_cache.stats()["similar_hits"] == 1
+
+    # Different questions, or the same question after different messages, are answered live
+    other = await model.ainvoke([HumanMessage(content="What is the capital of Germany?")])
+    assert other.content == "Second answer."
+    followup = [HumanMessage(content="Hi"), AIMessage(content="Hello!")] + question
+    assert (await model.ainvoke(followup)).content == "Third answer."
+
+
+def test_numpy_vector_index():
+    index = NumpyVectorIndex()
+    index.add("a", [1.0, 0.0])
+    index.add("b", [1.0, 1.0])
+    assert [key for key, _ in index.search([0.9, 0.1], k=2)] == ["a", "b"]
+    index.remove("a")
+    assert index.search([0.9, 0.1])[0][0] == "b"
+    assert len(index) == 1
+
+
+def test_cache_model_settings():
+    model = FakeListChatModel(responses=RESPONSES)
+    with patch("core.llm_cache.settings") as mock_settings:
+        mock_settings.LLM_CACHE_TTL = {"fake": 300}
+        mock_settings.LLM_CACHE_SIZE = 16
+        mock_settings.LLM_CACHE_SQLITE_PATH = None
+        mock_settings.LLM_CACHE_SIMILARITY = None
+        assert cache_model(model, "gpt-4o") is model
+        cached = cache_model(model, "fake")
+        assert isinstance(cached, CachedChatModel)
+        assert cached.response_cache.ttl == 300
+        assert cached.response_cache.embeddings is None
+    assert "fake" in collect_metrics()["llm_cache"]
+
+
+def test_cached_model_bind_tools():
+    from langchain_openai import ChatOpenAI
+
+    from agents.tools import calculator
+
+    model = CachedChatModel(
+        model=ChatOpenAI(model="gpt-4o-mini", api_key="test_key"),
+        response_cache=ResponseCache(ttl=60),
+    )
+    bound = model.bind_tools([calculator])
+    # Tools are bound in the wrapped model's format, and passed to it through the cache
+    assert bound.bound is model
+    assert bound.kwargs["tools"][0]["function"]["name"] == "Calculator"
+    messages = [HumanMessage(content="1 + 1")]
+    keys = model._keys(messages, None, **bound.kwargs)
+    assert keys[0] != model._keys(messages, None)[0]
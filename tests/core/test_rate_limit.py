@@ -0,0 +1,166 @@
+import asyncio
+import heapq
+import time
+from unittest.mock import patch
+
+import pytest
+from langchain_community.chat_models import FakeListChatModel
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.metrics import collect_metrics
+from core.rate_limit import (
+    Priority,
+    ProviderRateLimiter,
+    RateLimitedChatModel,
+    TokenBucket,
+    get_rate_limiter,
+    request_priority,
+)
+from schema.models import Provider
+
+
+class UsageModel(FakeListChatModel):
+    """Fake model that reports a fixed token usage with its response."""
+
+    total_tokens: int = 0
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs):
+        result = await super()._agenerate(messages, stop, run_manager, **kwargs)
+        message = result.generations[0].message
+        result.generations[0].message = AIMessage(
+            content=message.content,
+            usage_metadata={
+                "input_tokens": self.total_tokens,
+                "output_tokens": 0,
+                "total_tokens": self.total_tokens,
+            },
+        )
+        return result
+
+
+def test_token_bucket():
+    bucket = TokenBucket(per_minute=600, capacity=10)
+    assert bucket.wait_time(10) == 0
+    bucket.consume(10)
+    # 10 per second
+    assert bucket.wait_time(5) == pytest.approx(0.5, abs=0.01)
+    # Amounts over the capacity wait for a full bucket, rather than forever
+    assert bucket.wait_time(100) == pytest.approx(1.0, abs=0.01)
+
+
+@pytest.mark.asyncio
+async def test_requests_are_queued_to_the_limit():
+    # 1200 requests per minute, up to 2 at once: a request every 50 ms after the first 2
+    limiter = ProviderRateLimiter(rpm=1200, burst_seconds=0.1)
+    model = RateLimitedChatModel(model=FakeListChatModel(responses=["ok"]), limiter=limiter)
+    start = time.perf_counter()
+    results = await asyncio.gather(*(model.ainvoke("Hi") for _ in range(6)))
+    elapsed = time.perf_counter() - start
+    assert [r.content for r in results] == ["ok"] * 6
+    assert 0.18 < elapsed < 1
+    stats = limiter.stats()
+    assert stats["sent_batch"] == 6
+    assert stats["queued"] == 0
+    assert stats["wait_ms_max"] >= 150
+
+
+@pytest.mark.asyncio
+async def test_interactive_requests_go_first():
+    limiter = ProviderRateLimiter(rpm=600, burst_seconds=0.1)
+    order = []
+
+    async def call(name: str, priority: Priority) -> None:
+        await limiter.acquire(1, priority)
+        order.append(name)
+
+    # The first call uses up the bucket, and the rest wait for it in priority order
+    await call("first", Priority.BATCH)
+    batch = [asyncio.create_task(call(f"batch-{i}", Priority.BATCH)) for i in range(2)]
+    await asyncio.sleep(0)
+    interactive = asyncio.create_task(call("interactive", Priority.INTERACTIVE))
+    await asyncio.sleep(0)
+    assert limiter.stats()["queued"] == 3
+    assert limiter.stats()["queued_interactive"] == 1
+    await asyncio.gather(*batch, interactive)
+    assert order == ["first", "interactive", "batch-0", "batch-1"]
+
+
+@pytest.mark.asyncio
+async def test_cancelled_waiters_leave_the_queue():
+    limiter = ProviderRateLimiter(rpm=600, burst_seconds=0.1)
+    await limiter.acquire(1)
+    waiter = asyncio.create_task(limiter.acquire(1))
+    await asyncio.sleep(0)
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.stats()["queued"] == 0
+    await asyncio.wait_for(limiter.acquire(1), 1)
+    assert limiter.stats()["sent_batch"] == 2
+
+
+@pytest.mark.asyncio
+async def test_cancelled_after_send_is_refunded():
+    # One request and 100 tokens at once
+    limiter = ProviderRateLimiter(rpm=60, tpm=6000, burst_seconds=1)
+    await limiter.acquire(10)
+    waiter = asyncio.create_task(limiter.acquire(10))
+    await asyncio.sleep(0)
+
+    # The call is sent, but cancelled before it gets to run
+    limiter._send(heapq.heappop(limiter._queue))
+    waiter.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await waiter
+    assert limiter.requests.tokens == pytest.approx(0, abs=0.05)
+    assert limiter.tokens.tokens == pytest.approx(90, abs=1)
+    assert limiter.stats()["tokens_estimated"] == 10
+
+
+@pytest.mark.asyncio
+async def test_token_usage_corrects_the_estimate():
+    limiter = ProviderRateLimiter(tpm=60_000)
+    model = RateLimitedChatModel(
+        model=UsageModel(responses=["ok"], total_tokens=2000), limiter=limiter
+    )
+    await model.ainvoke([HumanMessage(content="x" * 400)], max_tokens=100)
+    stats = limiter.stats()
+    # 104 prompt tokens from the length and the message, plus the completion limit
+    assert stats["tokens_estimated"] == 204
+    assert stats["tokens_used"] == 2000
+    assert limiter.tokens.tokens == pytest.approx(58_000, abs=5)
+
+    # Streamed calls without usage are settled at their estimate
+    chunks = [c async for c in model.astream("Hi", max_tokens=10)]
+    assert "".join(c.content for c in chunks) == "ok"
+    assert limiter.stats()["tokens_used"] == 2014
+
+
+@pytest.mark.asyncio
+async def test_priority_from_context():
+    limiter = ProviderRateLimiter(rpm=600)
+    model = RateLimitedChatModel(model=FakeListChatModel(responses=["ok"]), limiter=limiter)
+    await model.ainvoke("Hi")
+
+    async def interactive() -> None:
+        request_priority.set(Priority.INTERACTIVE)
+        await model.ainvoke("Hi")
+
+    await asyncio.create_task(interactive())
+    assert limiter.stats()["sent_batch"] == 1
+    assert limiter.stats()["sent_interactive"] == 1
+
+
+def test_get_rate_limiter():
+    with (
+        patch("core.rate_limit.settings") as mock_settings,
+        patch.dict("core.rate_limit._limiters", clear=True),
+    ):
+        mock_settings.PROVIDER_RPM = {Provider.OPENAI: 500}
+        mock_settings.PROVIDER_TPM = {Provider.OPENAI: 200_000, Provider.GROQ: 6000}
+        assert get_rate_limiter(Provider.ANTHROPIC) is None
+        limiter = get_rate_limiter(Provider.OPENAI)
+        assert get_rate_limiter(Provider.OPENAI) is limiter
+        assert (limiter.rpm, limiter.tpm) == (500, 200_000)
+        assert get_rate_limiter(Provider.GROQ).requests is None
+        assert collect_metrics()["rate_limits"][Provider.OPENAI]["rpm"] == 500
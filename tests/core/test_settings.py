@@ -5,7 +5,7 @@ from unittest.mock import patch
 import pytest
 from pydantic import SecretStr, ValidationError
 
-from core.settings import Settings, check_str_is_http
+from core.settings import CompressionCodec, Settings, check_str_is_http
 from schema.models import AnthropicModelName, AzureOpenAIModelName, OpenAIModelName
 
 
@@ -27,6 +27,8 @@ def test_settings_default_values():
     assert settings.PORT == 8080
     assert settings.USE_AWS_BEDROCK is False
     assert settings.USE_FAKE_MODEL is False
+    assert settings.CHECKPOINT_COMPRESSION == CompressionCodec.NONE
+    assert settings.CHECKPOINT_CACHE_SIZE == 0
 
 
 def test_settings_no_api_keys():
@@ -187,3 +189,34 @@ def test_settings_azure_openai():
         assert settings.AZURE_OPENAI_API_KEY.get_secret_value() == "test-key"
         assert settings.AZURE_OPENAI_ENDPOINT == "https://test.openai.azure.com"
         assert settings.AZURE_OPENAI_DEPLOYMENT_MAP == deployment_map
+
+
+def test_settings_circuit_breaker_fallback():
+    env = {"OPENAI_API_KEY": "test_openai_key", "ANTHROPIC_API_KEY": "test_anthropic_key"}
+    fallback = {"CIRCUIT_BREAKER_FALLBACK": '{"openai": "claude-3.5-haiku"}'}
+    with patch.dict(os.environ, {**env, **fallback}, clear=True):
+        settings = Settings(_env_file=None)
+        assert settings.CIRCUIT_BREAKER_FALLBACK == {"openai": AnthropicModelName.HAIKU_35}
+
+    for fallback, error in [
+        ('{"openai": "gpt-4o"}', "one of its own models"),
+        ('{"openai": "groq-llama-3.1-8b"}', "unavailable model"),
+        ('{"openai": "hedged"}', "can't be hedged"),
+    ]:
+        with patch.dict(os.environ, {**env, "CIRCUIT_BREAKER_FALLBACK": fallback}, clear=True):
+            with pytest.raises(ValueError, match=error):
+                Settings(_env_file=None)
+
+
+def test_settings_postgres_max_idle_deprecated(caplog):
+    env = {"OPENAI_API_KEY": "test_key", "POSTGRES_MAX_IDLE_SECONDS": "60"}
+    with patch.dict(os.environ, env, clear=True):
+        settings = Settings(_env_file=None)
+    assert settings.POSTGRES_MAX_IDLE_SECONDS == 60
+    assert "POSTGRES_MAX_IDLE is deprecated" not in caplog.text
+
+    # The old count of idle connections isn't read as a timeout
+    with patch.dict(os.environ, {**env, "POSTGRES_MAX_IDLE": "5"}, clear=True):
+        settings = Settings(_env_file=None)
+    assert settings.POSTGRES_MAX_IDLE_SECONDS == 60
+    assert "POSTGRES_MAX_IDLE is deprecated" in caplog.text
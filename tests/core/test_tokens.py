@@ -0,0 +1,17 @@
+from langchain_core.messages import AIMessage, HumanMessage
+
+from core.rate_limit import estimate_call_tokens
+from core.tokens import estimate_tokens
+
+
+def test_estimate_tokens():
+    assert estimate_tokens([HumanMessage(content="x" * 400)]) == 104
+    with_tool_call = AIMessage(
+        content="", tool_calls=[{"name": "WebSearch", "args": {"query": "x" * 400}, "id": "1"}]
+    )
+    assert estimate_tokens([with_tool_call]) > estimate_tokens([AIMessage(content="")]) + 100
+
+    # Model calls reserve the same prompt estimate, plus their completion
+    assert estimate_call_tokens([with_tool_call], max_tokens=10) == (
+        estimate_tokens([with_tool_call]) + 10
+    )
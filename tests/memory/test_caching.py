@@ -0,0 +1,130 @@
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.types import Command, interrupt
+
+from memory.caching import CachingCheckpointSaver
+
+
+def _graph(checkpointer, ask_first: bool = False):
+    def ask(state: MessagesState) -> MessagesState:
+        answer = interrupt("Are you sure?")
+        return {"messages": [AIMessage(content=f"You said {answer}")]}
+
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    if ask_first:
+        builder.add_node("ask", ask)
+        builder.set_entry_point("ask")
+        builder.add_edge("ask", "respond")
+    else:
+        builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+async def _turn(graph, config, message: str):
+    """Check for interrupts and run the graph, as the service does for each turn."""
+    state = await graph.aget_state(config)
+    if any(task.interrupts for task in state.tasks):
+        return await graph.ainvoke(Command(resume=message), config)
+    return await graph.ainvoke({"messages": [HumanMessage(content=message)]}, config)
+
+
+@pytest.mark.asyncio
+async def test_caching_saver_serves_reads_from_cache(tmp_path):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as sqlite:
+        saver = CachingCheckpointSaver(sqlite)
+        graph = _graph(saver)
+        config = {"configurable": {"thread_id": "1"}}
+
+        with patch.object(sqlite, "aget_tuple", wraps=sqlite.aget_tuple) as db_reads:
+            for i in range(3):
+                result = await _turn(graph, config, f"message {i}")
+            # Only the first read of the new thread goes to the database
+            assert db_reads.await_count == 1
+
+        assert result["messages"][-1].content == "reply 5"
+        stats = saver.stats()
+        assert stats["cached_saver"] == "AsyncSqliteSaver"
+        assert stats["cache_misses"] == 1
+        assert stats["cache_hits"] > 1
+
+        # The database has the same state, read by an uncached graph
+        state = await _graph(sqlite).aget_state(config)
+        assert [m.content for m in state.values["messages"]] == [
+            m.content for m in result["messages"]
+        ]
+
+
+@pytest.mark.asyncio
+async def test_caching_saver_interrupt_resume():
+    saver = CachingCheckpointSaver(MemorySaver())
+    graph = _graph(saver, ask_first=True)
+    config = {"configurable": {"thread_id": "1"}}
+
+    await _turn(graph, config, "Delete everything")
+    state = await graph.aget_state(config)
+    assert state.tasks[0].interrupts[0].value == "Are you sure?"
+
+    result = await _turn(graph, config, "yes")
+    assert [m.content for m in result["messages"]] == [
+        "Delete everything",
+        "You said yes",
+        "reply 2",
+    ]
+
+
+@pytest.mark.asyncio
+async def test_caching_saver_returns_copies():
+    saver = CachingCheckpointSaver(MemorySaver())
+    graph = _graph(saver)
+    config = {"configurable": {"thread_id": "1"}}
+    await _turn(graph, config, "hi")
+
+    saved = await saver.aget_tuple(config)
+    saved.checkpoint["channel_values"]["messages"].clear()
+    saved = await saver.aget_tuple(config)
+    assert len(saved.checkpoint["channel_values"]["messages"]) == 2
+
+
+@pytest.mark.asyncio
+async def test_caching_saver_older_checkpoints():
+    inner = MemorySaver()
+    saver = CachingCheckpointSaver(inner)
+    graph = _graph(saver)
+    config = {"configurable": {"thread_id": "1"}}
+    await _turn(graph, config, "first")
+    first = await saver.aget_tuple(config)
+    await _turn(graph, config, "second")
+
+    # The latest checkpoint by ID is served from the cache, older ones from the saver
+    latest = await saver.aget_tuple(config)
+    with patch.object(inner, "aget_tuple", wraps=inner.aget_tuple) as reads:
+        assert (await saver.aget_tuple(latest.config)).config == latest.config
+        assert reads.await_count == 0
+        older = await saver.aget_tuple(first.config)
+        assert reads.await_count == 1
+    assert older.checkpoint["id"] == first.checkpoint["id"]
+    assert len([c async for c in saver.alist(config)]) > 2
+
+
+@pytest.mark.asyncio
+async def test_caching_saver_eviction():
+    inner = MemorySaver()
+    saver = CachingCheckpointSaver(inner, maxsize=1)
+    graph = _graph(saver)
+    await _turn(graph, {"configurable": {"thread_id": "1"}}, "hi")
+    await _turn(graph, {"configurable": {"thread_id": "2"}}, "hi")
+
+    # Thread 1 was evicted, so it's read from the saver again
+    result = await _turn(graph, {"configurable": {"thread_id": "1"}}, "again")
+    assert result["messages"][-1].content == "reply 3"
+    assert saver.stats()["cache_evictions"] >= 1
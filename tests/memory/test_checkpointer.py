@@ -0,0 +1,145 @@
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.base import empty_checkpoint
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+
+from agents import get_agent, get_all_agent_info
+from core.metrics import collect_metrics
+from memory import SharedCheckpointer, get_checkpointer, preload_scope, set_checkpointer
+from memory.in_memory import BoundedMemorySaver
+
+
+def _save(saver: BoundedMemorySaver, thread_id: str, content: str = "hello") -> dict:
+    config = {"configurable": {"thread_id": thread_id, "checkpoint_ns": ""}}
+    checkpoint = empty_checkpoint()
+    checkpoint["channel_values"] = {"messages": [HumanMessage(content=content)]}
+    saved = saver.put(config, checkpoint, {}, {})
+    saver.put_writes(saved, [("messages", AIMessage(content=content))], task_id="task")
+    return saved
+
+
+def _threads(saver: BoundedMemorySaver) -> set[str]:
+    return set(saver.storage) | {key[0] for key in saver.writes}
+
+
+def test_bounded_memory_saver_evicts_least_recently_used_thread():
+    saver = BoundedMemorySaver(max_threads=2)
+    _save(saver, "a")
+    _save(saver, "b")
+    # Reading thread "a" makes "b" the least recently used
+    assert saver.get_tuple({"configurable": {"thread_id": "a"}}) is not None
+    _save(saver, "c")
+
+    assert _threads(saver) == {"a", "c"}
+    assert saver.get_tuple({"configurable": {"thread_id": "b"}}) is None
+    assert saver.stats()["threads"] == 2
+    assert saver.stats()["evictions"] == 1
+
+
+def test_bounded_memory_saver_evicts_by_size():
+    saver = BoundedMemorySaver(max_bytes=8_000)
+    _save(saver, "a", "x" * 1500)
+    _save(saver, "b", "x" * 1500)
+    assert _threads(saver) == {"a", "b"}
+    assert 0 < saver.total_bytes <= 8_000
+
+    _save(saver, "c", "x" * 1500)
+    assert _threads(saver) == {"b", "c"}
+    assert saver.total_bytes <= 8_000
+
+    # The thread being written is kept even if it's over the cap on its own
+    _save(saver, "d", "x" * 20_000)
+    assert _threads(saver) == {"d"}
+    assert saver.total_bytes == saver.stats()["bytes"] > 8_000
+
+
+@pytest.mark.asyncio
+async def test_bounded_memory_saver_with_graph():
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    saver = BoundedMemorySaver(max_threads=1)
+    graph = builder.compile(checkpointer=saver)
+
+    config = {"configurable": {"thread_id": "1"}}
+    await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+    result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+    assert result["messages"][-1].content == "reply 3"
+
+    # A second thread evicts the first, which then starts over
+    await graph.ainvoke(
+        {"messages": [HumanMessage(content="hi")]}, {"configurable": {"thread_id": "2"}}
+    )
+    result = await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+    assert result["messages"][-1].content == "reply 1"
+
+
+def test_all_agents_share_the_checkpointer():
+    checkpointer = get_checkpointer()
+    for agent in get_all_agent_info():
+        assert get_agent(agent.key).checkpointer is checkpointer
+
+
+@pytest.mark.asyncio
+async def test_set_checkpointer():
+    checkpointer = get_checkpointer()
+    assert isinstance(checkpointer.saver, BoundedMemorySaver)
+    assert collect_metrics()["checkpointer"]["backend"] == "BoundedMemorySaver"
+
+    saver = MagicMock()
+    saver.aget_tuple = AsyncMock(return_value=None)
+    set_checkpointer(saver)
+    try:
+        config = {"configurable": {"thread_id": "1"}}
+        assert await checkpointer.aget_tuple(config) is None
+        saver.aget_tuple.assert_awaited_once_with(config)
+        checkpointer.get_next_version(None, None)
+        saver.get_next_version.assert_called_once()
+    finally:
+        set_checkpointer(None)
+    assert checkpointer.saver is checkpointer.default
+
+
+@pytest.mark.asyncio
+async def test_preloaded_checkpoint_dropped_with_scope():
+    checkpointer = SharedCheckpointer()
+    checkpointer.saver = saver = MagicMock()
+    saver.aget_tuple = AsyncMock(side_effect=["preloaded", "read"])
+    config = {"configurable": {"thread_id": "1"}}
+
+    # The run failed before reading its checkpoint, so the next read goes to the saver
+    with preload_scope():
+        assert await checkpointer.apreload(config) == "preloaded"
+    assert await checkpointer.aget_tuple(config) == "read"
+
+
+@pytest.mark.asyncio
+async def test_shared_checkpointer_with_sqlite(tmp_path):
+    """A graph compiled with the shared checkpointer runs on a plugged-in SQLite saver."""
+
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    graph = builder.compile(checkpointer=get_checkpointer())
+
+    config = {"configurable": {"thread_id": "1"}}
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        set_checkpointer(saver)
+        try:
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+            result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+            assert result["messages"][-1].content == "reply 3"
+            assert (await saver.aget_tuple(config)) is not None
+        finally:
+            set_checkpointer(None)
@@ -0,0 +1,59 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+from langgraph.checkpoint.postgres.aio import AsyncPostgresSaver
+
+from core.metrics import collect_metrics
+from memory.postgres import get_pool_stats, get_postgres_saver
+
+
+def test_get_pool_stats():
+    pool = MagicMock()
+    pool.get_stats.return_value = {
+        "pool_min": 3,
+        "pool_max": 10,
+        "pool_size": 6,
+        "pool_available": 2,
+        "requests_waiting": 1,
+        "requests_num": 4,
+        "requests_wait_ms": 20,
+    }
+    stats = get_pool_stats(pool)
+    assert stats["in_use"] == 4
+    assert stats["waiting"] == 1
+    assert stats["acquire_wait_ms_avg"] == 5.0
+
+    # Counters are only reported by psycopg once they are non-zero
+    pool.get_stats.return_value = {"pool_min": 3, "pool_max": 10}
+    stats = get_pool_stats(pool)
+    assert stats["in_use"] == 0
+    assert stats["acquire_wait_ms_avg"] == 0.0
+
+
+@pytest.mark.asyncio
+async def test_get_postgres_saver_uses_pool_settings():
+    pool = MagicMock()
+    pool.get_stats.return_value = {}
+    pool_cls = MagicMock()
+    pool_cls.return_value.__aenter__.return_value = pool
+
+    with (
+        patch("memory.postgres.validate_postgres_config"),
+        patch("memory.postgres.get_postgres_connection_string", return_value="postgresql://x"),
+        patch("memory.postgres.AsyncConnectionPool", pool_cls),
+        patch("memory.postgres.settings") as mock_settings,
+    ):
+        mock_settings.POSTGRES_MIN_SIZE = 2
+        mock_settings.POSTGRES_POOL_SIZE = 7
+        mock_settings.POSTGRES_MAX_IDLE_SECONDS = 60
+        async with get_postgres_saver() as saver:
+            assert isinstance(saver, AsyncPostgresSaver)
+            assert saver.conn is pool
+            assert "postgres_pool" in collect_metrics()
+
+    kwargs = pool_cls.call_args.kwargs
+    assert kwargs["min_size"] == 2
+    assert kwargs["max_size"] == 7
+    assert kwargs["max_idle"] == 60
+    assert kwargs["kwargs"]["autocommit"] is True
+    assert "postgres_pool" not in collect_metrics()
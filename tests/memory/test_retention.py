@@ -0,0 +1,191 @@
+import asyncio
+import time
+from unittest.mock import patch
+
+import aiosqlite
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.types import Command, interrupt
+
+from core.metrics import collect_metrics
+from memory import get_checkpoint_retention
+from memory.caching import CachingCheckpointSaver
+from memory.retention import CheckpointRetention, checkpoint_created_at
+from memory.sqlite import PooledSqliteSaver
+
+
+def _graph(checkpointer, ask_first: bool = False):
+    def ask(state: MessagesState) -> MessagesState:
+        answer = interrupt("Are you sure?")
+        return {"messages": [AIMessage(content=f"You said {answer}")]}
+
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    if ask_first:
+        builder.add_node("ask", ask)
+        builder.set_entry_point("ask")
+        builder.add_edge("ask", "respond")
+    else:
+        builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+def _config(thread_id: str) -> dict:
+    return {"configurable": {"thread_id": thread_id}}
+
+
+async def _count(saver: AsyncSqliteSaver, table: str, thread_id: str) -> int:
+    async with saver.conn.execute(
+        f"SELECT COUNT(*) FROM {table} WHERE thread_id = ?", (thread_id,)
+    ) as cur:
+        (count,) = await cur.fetchone()
+    return count
+
+
+@pytest.mark.asyncio
+async def test_retention_keeps_last_checkpoints(tmp_path):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = _graph(saver)
+        for thread_id in ("1", "2"):
+            for i in range(3):
+                await graph.ainvoke(
+                    {"messages": [HumanMessage(content=f"hi {i}")]}, _config(thread_id)
+                )
+        assert await _count(saver, "checkpoints", "1") > 2
+
+        retention = CheckpointRetention(saver, keep_last=2)
+        result = await retention.prune()
+
+        for thread_id in ("1", "2"):
+            assert await _count(saver, "checkpoints", thread_id) == 2
+        assert result.checkpoints_deleted > 0
+        assert result.writes_deleted > 0
+        assert result.bytes_reclaimed > 0
+        assert result.expired_threads == []
+        assert retention.stats()["checkpoints_deleted"] == result.checkpoints_deleted
+        assert (await retention.prune()).checkpoints_deleted == 0
+
+        # The conversation continues from the latest checkpoint
+        result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, _config("1"))
+        assert result["messages"][-1].content == "reply 7"
+
+
+@pytest.mark.asyncio
+async def test_retention_keeps_pending_interrupt(tmp_path):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = _graph(saver, ask_first=True)
+        config = _config("1")
+        await graph.ainvoke({"messages": [HumanMessage(content="Delete everything")]}, config)
+
+        await CheckpointRetention(saver, keep_last=1).prune()
+
+        state = await graph.aget_state(config)
+        assert state.tasks[0].interrupts[0].value == "Are you sure?"
+        result = await graph.ainvoke(Command(resume="yes"), config)
+        assert [m.content for m in result["messages"]] == [
+            "Delete everything",
+            "You said yes",
+            "reply 2",
+        ]
+
+
+@pytest.mark.asyncio
+async def test_retention_deletes_idle_threads(tmp_path):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        cached = CachingCheckpointSaver(saver)
+        graph = _graph(cached)
+        created_at = {}
+        for thread_id in ("old", "new"):
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, _config(thread_id))
+            latest = await saver.aget_tuple(_config(thread_id))
+            created_at[thread_id] = checkpoint_created_at(latest.checkpoint["id"])
+        assert abs(created_at["new"] - time.time()) < 60
+
+        retention = CheckpointRetention(saver, ttl=3600, on_expired=cached.forget)
+        assert (await retention.prune()).expired_threads == []
+
+        # An hour later, only the thread that was idle for longer has expired
+        now = (created_at["old"] + created_at["new"]) / 2 + 3600
+        with patch("memory.retention.time.time", return_value=now):
+            result = await retention.prune()
+
+        assert result.expired_threads == ["old"]
+        assert await _count(saver, "checkpoints", "old") == 0
+        assert await _count(saver, "writes", "old") == 0
+        assert await _count(saver, "checkpoints", "new") > 0
+        # The deleted thread is gone from the cache too, so it starts over
+        assert await cached.aget_tuple(_config("old")) is None
+        assert retention.stats()["threads_expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_retention_deletes_message_log(tmp_path):
+    async with aiosqlite.connect(str(tmp_path / "checkpoints.db")) as conn:
+        saver = PooledSqliteSaver(conn, message_log=True)
+        graph = _graph(saver)
+        await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, _config("old"))
+        latest = await saver.aget_tuple(_config("old"))
+        assert await _count(saver, "messages", "old") == 2
+
+        retention = CheckpointRetention(saver, keep_last=1, ttl=3600)
+        # Older checkpoints are pruned, but the log is kept while the thread is alive
+        result = await retention.prune()
+        assert result.messages_deleted == 0
+        assert await _count(saver, "messages", "old") == 2
+
+        now = checkpoint_created_at(latest.checkpoint["id"]) + 7200
+        with patch("memory.retention.time.time", return_value=now):
+            result = await retention.prune()
+        assert result.expired_threads == ["old"]
+        assert result.messages_deleted == 2
+        assert await _count(saver, "messages", "old") == 0
+
+        # The thread starts over, logging its messages again
+        await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, _config("old"))
+        assert await _count(saver, "messages", "old") == 2
+
+
+@pytest.mark.asyncio
+async def test_retention_vacuum(tmp_path):
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        graph = _graph(saver)
+        for i in range(10):
+            await graph.ainvoke({"messages": [HumanMessage(content="x" * 5000)]}, _config("1"))
+
+        result = await CheckpointRetention(saver, keep_last=1, vacuum=True).prune()
+        assert result.file_bytes_reclaimed > result.bytes_reclaimed / 2
+
+
+@pytest.mark.asyncio
+async def test_retention_task(tmp_path):
+    with pytest.raises(TypeError):
+        CheckpointRetention(MemorySaver(), keep_last=1)
+
+    async with AsyncSqliteSaver.from_conn_string(str(tmp_path / "checkpoints.db")) as saver:
+        assert get_checkpoint_retention(saver) is None
+        with patch("memory.settings") as mock_settings:
+            mock_settings.CHECKPOINT_KEEP_LAST = 5
+            mock_settings.CHECKPOINT_THREAD_TTL = None
+            mock_settings.CHECKPOINT_VACUUM = False
+            retention = get_checkpoint_retention(saver, CachingCheckpointSaver(saver))
+        assert retention.keep_last == 5
+        assert retention.on_expired is not None
+
+        await saver.setup()
+        task = asyncio.create_task(retention.run(interval=0.01))
+        try:
+            while not retention.runs:
+                await asyncio.sleep(0.01)
+            assert collect_metrics()["checkpoint_retention"]["runs"] >= 1
+        finally:
+            task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert "checkpoint_retention" not in collect_metrics()
@@ -0,0 +1,138 @@
+import os
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.checkpoint.sqlite.aio import AsyncSqliteSaver
+from langgraph.graph import END, MessagesState, StateGraph
+
+from core.settings import CompressionCodec, settings
+from memory.serde import CompressedSerializer, get_checkpoint_serializer
+from memory.sqlite import get_sqlite_saver
+
+LARGE = "search result " * 500
+
+
+def test_compressed_serializer_round_trip():
+    serde = CompressedSerializer(threshold=1024)
+    small = {"messages": [HumanMessage(content="hi")]}
+    large = {"messages": [AIMessage(content=LARGE)]}
+
+    type_, data = serde.dumps_typed(small)
+    assert type_ == "msgpack"
+    assert serde.loads_typed((type_, data)) == small
+
+    type_, data = serde.dumps_typed(large)
+    assert type_ == "msgpack+zlib"
+    assert len(data) < len(LARGE) / 10
+    assert serde.loads_typed((type_, data)) == large
+
+    # Values that don't shrink are stored as they are
+    random_bytes = os.urandom(2048)
+    assert serde.dumps_typed(random_bytes)[0] == "bytes"
+
+
+def test_compressed_serializer_reads_other_codecs():
+    plain = CompressedSerializer().serde
+    legacy = plain.dumps_typed(LARGE)
+    assert CompressedSerializer().loads_typed(legacy) == LARGE
+
+    zlib_value = CompressedSerializer(codec="zlib").dumps_typed(LARGE)
+    assert zlib_value[0] == "msgpack+zlib"
+    assert CompressedSerializer(codec="zlib", threshold=10**9).loads_typed(zlib_value) == LARGE
+
+    with pytest.raises(ValueError, match="Unknown codec"):
+        CompressedSerializer(codec="lzma")
+
+
+def test_compressed_serializer_zstd():
+    pytest.importorskip("zstandard")
+    serde = CompressedSerializer(codec="zstd")
+    type_, data = serde.dumps_typed(LARGE)
+    assert type_ == "msgpack+zstd"
+    assert CompressedSerializer(codec="zlib").loads_typed((type_, data)) == LARGE
+
+
+def test_get_checkpoint_serializer():
+    with patch("memory.serde.settings") as mock_settings:
+        mock_settings.CHECKPOINT_COMPRESSION_THRESHOLD = 100
+        mock_settings.CHECKPOINT_COMPRESSION = CompressionCodec.NONE
+        uncompressed = get_checkpoint_serializer()
+        mock_settings.CHECKPOINT_COMPRESSION = CompressionCodec.ZLIB
+        serde = get_checkpoint_serializer()
+    assert serde.codec.name == "zlib"
+    assert serde.threshold == 100
+
+    # With compression off, values are written uncompressed and compressed ones still read
+    assert uncompressed.codec is None
+    assert uncompressed.dumps_typed(LARGE)[0] == "msgpack"
+    assert uncompressed.loads_typed(serde.dumps_typed(LARGE)) == LARGE
+
+
+def _large_reply_graph() -> StateGraph:
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=LARGE)]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    return builder
+
+
+@pytest.mark.asyncio
+async def test_compressed_checkpoints_read_legacy_rows(tmp_path):
+    builder = _large_reply_graph()
+    config = {"configurable": {"thread_id": "1"}}
+    path = str(tmp_path / "checkpoints.db")
+
+    # A thread saved before compression was enabled
+    async with AsyncSqliteSaver.from_conn_string(path) as saver:
+        await builder.compile(checkpointer=saver).ainvoke(
+            {"messages": [HumanMessage(content="hi")]}, config
+        )
+
+    with (
+        patch.object(settings, "SQLITE_DB_PATH", path),
+        patch.object(settings, "CHECKPOINT_COMPRESSION", CompressionCodec.ZLIB),
+    ):
+        async with get_sqlite_saver() as saver:
+            assert isinstance(saver.serde, CompressedSerializer)
+            graph = builder.compile(checkpointer=saver)
+            result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+            assert [m.content for m in result["messages"]] == ["hi", LARGE, "again", LARGE]
+
+            async with saver.conn.execute("SELECT DISTINCT type FROM checkpoints") as cur:
+                types = {row[0] for row in await cur.fetchall()}
+    assert types == {"msgpack", "msgpack+zlib"}
+
+
+@pytest.mark.asyncio
+async def test_compressed_checkpoints_read_with_compression_off(tmp_path):
+    builder = _large_reply_graph()
+    config = {"configurable": {"thread_id": "1"}}
+    path = str(tmp_path / "checkpoints.db")
+
+    with (
+        patch.object(settings, "SQLITE_DB_PATH", path),
+        patch.object(settings, "CHECKPOINT_COMPRESSION", CompressionCodec.ZLIB),
+    ):
+        async with get_sqlite_saver() as saver:
+            await builder.compile(checkpointer=saver).ainvoke(
+                {"messages": [HumanMessage(content="hi")]}, config
+            )
+
+    with (
+        patch.object(settings, "SQLITE_DB_PATH", path),
+        patch.object(settings, "CHECKPOINT_COMPRESSION", CompressionCodec.NONE),
+    ):
+        async with get_sqlite_saver() as saver:
+            assert (await saver.aget_tuple(config)).checkpoint is not None
+            graph = builder.compile(checkpointer=saver)
+            result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+            assert [m.content for m in result["messages"]] == ["hi", LARGE, "again", LARGE]
+
+            async with saver.conn.execute(
+                "SELECT type FROM checkpoints ORDER BY checkpoint_id DESC LIMIT 1"
+            ) as cur:
+                assert (await cur.fetchone())[0] == "msgpack"
@@ -0,0 +1,272 @@
+import asyncio
+import sqlite3
+from contextlib import contextmanager
+from unittest.mock import patch
+
+import pytest
+from langchain_core.messages import AIMessage, HumanMessage
+from langgraph.graph import END, MessagesState, StateGraph
+from langgraph.types import Command, interrupt
+
+from core.metrics import collect_metrics
+from memory.sqlite import PooledSqliteSaver, get_sqlite_saver
+
+
+def _graph(checkpointer):
+    def respond(state: MessagesState) -> MessagesState:
+        return {"messages": [AIMessage(content=f"reply {len(state['messages'])}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("respond", respond)
+    builder.set_entry_point("respond")
+    builder.add_edge("respond", END)
+    return builder.compile(checkpointer=checkpointer)
+
+
+@contextmanager
+def _sqlite_settings(path: str, pool_size: int = 2, message_log: bool = False):
+    with patch("memory.sqlite.settings") as mock_settings:
+        mock_settings.SQLITE_DB_PATH = path
+        mock_settings.SQLITE_READ_POOL_SIZE = pool_size
+        mock_settings.SQLITE_BUSY_TIMEOUT = 5.0
+        mock_settings.SQLITE_SYNCHRONOUS = "NORMAL"
+        mock_settings.SQLITE_CACHE_SIZE_KB = 2048
+        mock_settings.SQLITE_MMAP_SIZE = 0
+        mock_settings.SQLITE_MESSAGE_LOG = message_log
+        yield
+
+
+async def _pragma(conn, name: str):
+    async with conn.execute(f"PRAGMA {name}") as cur:
+        return (await cur.fetchone())[0]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_connections(tmp_path):
+    with _sqlite_settings(str(tmp_path / "checkpoints.db"), pool_size=2):
+        async with get_sqlite_saver() as saver:
+            assert isinstance(saver, PooledSqliteSaver)
+            assert len(saver.readers) == 2
+            assert await _pragma(saver.conn, "journal_mode") == "wal"
+            assert await _pragma(saver.conn, "synchronous") == 1  # NORMAL
+            assert await _pragma(saver.conn, "cache_size") == -2048
+            for reader in saver.readers:
+                assert await _pragma(reader, "query_only") == 1
+            await saver.setup()
+            with pytest.raises(sqlite3.OperationalError):
+                await saver.readers[0].execute("DELETE FROM checkpoints")
+            assert collect_metrics()["sqlite_pool"]["readers"] == 2
+    assert "sqlite_pool" not in collect_metrics()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_reads_from_pool(tmp_path):
+    with _sqlite_settings(str(tmp_path / "checkpoints.db"), pool_size=2):
+        async with get_sqlite_saver() as saver:
+            graph = _graph(saver)
+
+            async def conversation(thread_id: str) -> str:
+                config = {"configurable": {"thread_id": thread_id}}
+                for i in range(3):
+                    result = await graph.ainvoke(
+                        {"messages": [HumanMessage(content=f"hi {i}")]}, config
+                    )
+                return result["messages"][-1].content
+
+            results = await asyncio.gather(*(conversation(str(i)) for i in range(10)))
+            assert results == ["reply 5"] * 10
+            assert saver.reads >= 30
+            assert saver.stats()["readers_idle"] == 2
+
+            # History, with the pending writes of each checkpoint
+            config = {"configurable": {"thread_id": "0"}}
+            history = [c async for c in saver.alist(config)]
+            assert history[0].checkpoint["id"] == (await saver.aget_tuple(config)).checkpoint["id"]
+            assert any(c.pending_writes for c in history)
+            assert len([c async for c in saver.alist(config, limit=2)]) == 2
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_interrupt_round_trip(tmp_path):
+    def ask(state: MessagesState) -> MessagesState:
+        answer = interrupt("birthdate?")
+        return {"messages": [AIMessage(content=f"Born on {answer}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("ask", ask)
+    builder.set_entry_point("ask")
+    builder.add_edge("ask", END)
+
+    with _sqlite_settings(str(tmp_path / "checkpoints.db"), pool_size=2):
+        async with get_sqlite_saver() as saver:
+            graph = builder.compile(checkpointer=saver)
+            config = {"configurable": {"thread_id": "1"}}
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+
+            # The interrupt is read back through the reader pool
+            reads = saver.reads
+            state = await graph.aget_state(config)
+            assert saver.reads > reads
+            assert state.tasks[0].interrupts[0].value == "birthdate?"
+
+            result = await graph.ainvoke(Command(resume="1 May"), config)
+            assert result["messages"][-1].content == "Born on 1 May"
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_in_memory():
+    with _sqlite_settings(":memory:", pool_size=4):
+        async with get_sqlite_saver() as saver:
+            assert saver.readers == []
+            graph = _graph(saver)
+            config = {"configurable": {"thread_id": "1"}}
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+            result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+            assert result["messages"][-1].content == "reply 3"
+
+
+async def _rows(conn, sql: str, *params) -> list:
+    async with conn.execute(sql, params) as cur:
+        return await cur.fetchall()
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_message_log(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    config = {"configurable": {"thread_id": "1"}}
+
+    # A thread saved without the message log is continued with it
+    with _sqlite_settings(path):
+        async with get_sqlite_saver() as saver:
+            await _graph(saver).ainvoke({"messages": [HumanMessage(content="first")]}, config)
+
+    with _sqlite_settings(path, message_log=True):
+        async with get_sqlite_saver() as saver:
+            graph = _graph(saver)
+            for i in range(3):
+                result = await graph.ainvoke(
+                    {"messages": [HumanMessage(content=f"hi {i}")]}, config
+                )
+            assert result["messages"][-1].content == "reply 7"
+
+            # Each message is logged once, and the latest checkpoint only references them
+            logged = await _rows(saver.conn, "SELECT seq FROM messages WHERE thread_id = '1'")
+            assert len(logged) == 8
+            assert saver.stats()["messages_logged"] == 8
+            ((checkpoint,),) = await _rows(
+                saver.conn,
+                "SELECT checkpoint FROM checkpoints WHERE thread_id = '1' "
+                "ORDER BY checkpoint_id DESC LIMIT 1",
+            )
+            assert b"hi 2" not in checkpoint
+
+            state = await graph.aget_state(config)
+            assert [m.content for m in state.values["messages"]] == [
+                "first",
+                "reply 1",
+                "hi 0",
+                "reply 3",
+                "hi 1",
+                "reply 5",
+                "hi 2",
+                "reply 7",
+            ]
+            history = [s async for s in graph.aget_state_history(config)]
+            assert [len(s.values.get("messages", [])) for s in history][:5] == [8, 7, 6, 6, 5]
+            assert history[-2].values["messages"][0].content == "first"
+
+    # A new process reads the log, and continues appending to it
+    with _sqlite_settings(path, message_log=True):
+        async with get_sqlite_saver() as saver:
+            result = await _graph(saver).ainvoke(
+                {"messages": [HumanMessage(content="again")]}, config
+            )
+            assert result["messages"][-1].content == "reply 9"
+            assert len(await _rows(saver.conn, "SELECT seq FROM messages")) == 10
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_message_log_edits(tmp_path):
+    def edit(state: MessagesState) -> MessagesState:
+        # Replace the last message by ID, as add_messages does
+        last = state["messages"][-1]
+        return {"messages": [AIMessage(content="edited", id=last.id)]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("edit", edit)
+    builder.set_entry_point("edit")
+    builder.add_edge("edit", END)
+
+    with _sqlite_settings(str(tmp_path / "checkpoints.db"), message_log=True):
+        async with get_sqlite_saver() as saver:
+            graph = builder.compile(checkpointer=saver)
+            config = {"configurable": {"thread_id": "1"}}
+            await graph.ainvoke({"messages": [AIMessage(content="original", id="m1")]}, config)
+
+            history = [s async for s in graph.aget_state_history(config)]
+            assert [m.content for m in history[0].values["messages"]] == ["edited"]
+            # Older checkpoints keep the version of the message they were saved with
+            assert [m.content for m in history[1].values["messages"]] == ["original"]
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_message_log_failed_write(tmp_path):
+    with _sqlite_settings(str(tmp_path / "checkpoints.db"), message_log=True):
+        async with get_sqlite_saver() as saver:
+            graph = _graph(saver)
+            config = {"configurable": {"thread_id": "1"}}
+            await graph.ainvoke({"messages": [HumanMessage(content="hi")]}, config)
+
+            # The new messages are rolled back with the checkpoint that failed to save
+            with patch.object(saver.jsonplus_serde, "dumps", side_effect=sqlite3.OperationalError):
+                with pytest.raises(sqlite3.OperationalError):
+                    await graph.ainvoke({"messages": [HumanMessage(content="lost")]}, config)
+            assert len(await _rows(saver.conn, "SELECT seq FROM messages")) == 2
+
+            result = await graph.ainvoke({"messages": [HumanMessage(content="again")]}, config)
+            assert [m.content for m in result["messages"]] == ["hi", "reply 1", "again", "reply 3"]
+            state = await graph.aget_state(config)
+            assert len(state.values["messages"]) == 4
+
+
+@pytest.mark.asyncio
+async def test_sqlite_saver_message_log_pages(tmp_path):
+    path = str(tmp_path / "checkpoints.db")
+    with _sqlite_settings(path):
+        async with get_sqlite_saver() as saver:
+            await _graph(saver).ainvoke(
+                {"messages": [HumanMessage(content="hi")]}, {"configurable": {"thread_id": "0"}}
+            )
+
+    with _sqlite_settings(path, message_log=True):
+        async with get_sqlite_saver() as saver:
+            graph = _graph(saver)
+            config = {"configurable": {"thread_id": "1"}}
+            for i in range(5):
+                await graph.ainvoke({"messages": [HumanMessage(content=f"hi {i}")]}, config)
+
+            with patch.object(saver.serde, "loads_typed", wraps=saver.serde.loads_typed) as loads:
+                messages, start = await saver.aget_messages(config, limit=4)
+            assert [m.content for m in messages] == ["hi 3", "reply 7", "hi 4", "reply 9"]
+            assert start == 6
+            # The checkpoint and the page's messages, not the rest of the thread
+            assert loads.call_count == 5
+
+            messages, start = await saver.aget_messages(config, before=2, limit=4)
+            assert [m.content for m in messages] == ["hi 0", "reply 1"]
+            assert start == 0
+            messages, _ = await saver.aget_messages(config)
+            assert len(messages) == 10
+
+            # Threads whose messages aren't in the log are read from the state instead
+            assert await saver.aget_messages({"configurable": {"thread_id": "0"}}) is None
+            assert await saver.aget_messages({"configurable": {"thread_id": "2"}}) is None
+            await graph.aupdate_state(config, {"messages": [HumanMessage(content="edit")]})
+            state = await graph.aget_state(config)
+            messages, _ = await saver.aget_messages(config)
+            assert [m.content for m in messages] == [m.content for m in state.values["messages"]]
+
+            # Pending writes to the messages would be applied to the state
+            latest = await saver.aget_tuple(config)
+            await saver.aput_writes(latest.config, [("messages", [HumanMessage("x")])], "task")
+            assert await saver.aget_messages(config) is None
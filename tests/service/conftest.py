@@ -1,9 +1,10 @@
-from unittest.mock import AsyncMock, Mock, patch
+from unittest.mock import AsyncMock, patch
 
 import pytest
 from fastapi.testclient import TestClient
 from langchain_core.messages import AIMessage
 
+from client import AgentClient
 from service import app
 
 
@@ -20,8 +21,8 @@ def mock_agent():
     agent_mock.ainvoke = AsyncMock(
         return_value=[("values", {"messages": [AIMessage(content="Test response")]})]
     )
-    agent_mock.get_state = Mock()  # Default empty mock for get_state
-    with patch("service.service.get_agent", Mock(return_value=agent_mock)):
+    agent_mock.aget_state = AsyncMock()  # Default empty mock for aget_state
+    with patch("service.service.aget_agent", AsyncMock(return_value=agent_mock)):
         yield agent_mock
 
 
@@ -34,20 +35,9 @@ def mock_settings(mock_env):
 
 @pytest.fixture
 def mock_httpx():
-    """Patch httpx.stream and httpx.get to use our test client."""
+    """Route AgentClient's synchronous requests to our test client."""
 
     with TestClient(app) as client:
-
-        def mock_stream(method: str, url: str, **kwargs):
-            # Strip the base URL since TestClient expects just the path
-            path = url.replace("http://0.0.0.0", "")
-            return client.stream(method, path, **kwargs)
-
-        def mock_get(url: str, **kwargs):
-            # Strip the base URL since TestClient expects just the path
-            path = url.replace("http://0.0.0.0", "")
-            return client.get(path, **kwargs)
-
-        with patch("httpx.stream", mock_stream):
-            with patch("httpx.get", mock_get):
-                yield
+        # TestClient is an httpx.Client that serves any URL from the app
+        with patch.object(AgentClient, "client", property(lambda self: client)):
+            yield
@@ -0,0 +1,129 @@
+import asyncio
+from unittest.mock import Mock, patch
+
+import pytest
+from fastapi import HTTPException
+from langchain_core.messages import AIMessage
+
+from schema import StreamInput
+from service.admission import AdmissionController, ConcurrencyLimiter
+from service.service import stream
+
+
+@pytest.mark.asyncio
+async def test_limiter_queues_until_release():
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=5)
+    await limiter.acquire(timeout=1)
+    assert limiter.active == 1
+
+    waiter = asyncio.create_task(limiter.acquire(timeout=1))
+    await asyncio.sleep(0)
+    assert limiter.waiting == 1
+    assert not waiter.done()
+
+    # The slot is handed directly to the waiter
+    limiter.release(run_s=0.1)
+    await waiter
+    assert limiter.active == 1
+    assert limiter.waiting == 0
+    assert limiter.stats()["admitted"] == 2
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_when_queue_full():
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=1)
+    await limiter.acquire(timeout=1)
+    waiter = asyncio.create_task(limiter.acquire(timeout=1))
+    await asyncio.sleep(0)
+
+    with pytest.raises(HTTPException) as exc:
+        await limiter.acquire(timeout=1)
+    assert exc.value.status_code == 429
+    assert exc.value.headers["Retry-After"] == "1"
+    assert limiter.stats()["rejected_queue_full"] == 1
+
+    limiter.release(run_s=0.1)
+    await waiter
+
+
+@pytest.mark.asyncio
+async def test_limiter_rejects_on_timeout():
+    limiter = ConcurrencyLimiter(limit=1, max_waiting=5)
+    await limiter.acquire(timeout=1)
+    limiter.completed, limiter.run_s_total = 1, 4.0
+
+    with pytest.raises(HTTPException) as exc:
+        await limiter.acquire(timeout=0.01)
+    assert exc.value.status_code == 503
+    assert exc.value.headers["Retry-After"] == "4"
+    assert limiter.waiting == 0
+    assert limiter.active == 1
+
+    limiter.release(run_s=0.1)
+    assert limiter.active == 0
+
+
+@pytest.mark.asyncio
+async def test_admission_controller_per_agent_limit():
+    with (
+        patch("service.admission.settings.MAX_CONCURRENT_RUNS", None),
+        patch("service.admission.settings.MAX_CONCURRENT_RUNS_PER_AGENT", {"chatbot": 1}),
+        patch("service.admission.settings.RUN_QUEUE_TIMEOUT", 0.01),
+    ):
+        controller = AdmissionController()
+        release = await controller.acquire("chatbot")
+
+        # A different agent is not limited
+        async with controller.admit("research-assistant"):
+            pass
+
+        with pytest.raises(HTTPException) as exc:
+            await controller.acquire("chatbot")
+        assert exc.value.status_code == 503
+
+        release()
+        release()  # Releasing twice is a no-op
+        stats = controller.stats()
+        assert stats["agents"]["chatbot"]["active"] == 0
+        assert stats["global"]["active"] == 0
+        assert stats["global"]["admitted"] == 2
+
+
+def test_invoke_rejected_when_over_capacity(test_client, mock_agent) -> None:
+    mock_agent.ainvoke.return_value = [("values", {"messages": [AIMessage(content="Hi")]})]
+    with (
+        patch("service.admission.settings.MAX_QUEUED_RUNS", 0),
+        patch("service.admission.settings.MAX_CONCURRENT_RUNS", 0),
+        patch("service.service.admission", AdmissionController()),
+    ):
+        response = test_client.post("/invoke", json={"message": "Hello"})
+        assert response.status_code == 429
+        assert response.headers["Retry-After"] == "1"
+
+        response = test_client.post("/stream", json={"message": "Hello"})
+        assert response.status_code == 429
+    mock_agent.ainvoke.assert_not_awaited()
+
+
+def test_unknown_agent_not_admitted(test_client) -> None:
+    controller = AdmissionController()
+    with patch("service.service.admission", controller):
+        for endpoint in ("invoke", "stream", "history"):
+            response = test_client.post(
+                f"/no-such-agent/{endpoint}", json={"message": "Hello", "thread_id": "1"}
+            )
+            assert response.status_code == 404
+    assert controller.stats()["agents"] == {}
+
+
+@pytest.mark.asyncio
+async def test_stream_slot_released_if_never_started(mock_agent) -> None:
+    controller = AdmissionController()
+    with patch("service.service.admission", controller):
+        response = await stream(StreamInput(message="Hello"), Mock(), "chatbot")
+        assert controller.stats()["global"]["active"] == 1
+
+        # The client went away before the body was iterated, so only the background task runs
+        await response.background()
+        assert controller.stats()["global"]["active"] == 0
+        assert controller.stats()["agents"]["chatbot"]["active"] == 0
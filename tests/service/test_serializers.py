@@ -0,0 +1,50 @@
+import json
+
+import pytest
+
+from client import AgentClient
+from schema import ChatMessage
+from service.serializers import SSE_DONE, dump_chat_message, sse_error, sse_message, sse_token
+
+MESSAGE = ChatMessage(
+    type="ai",
+    content="The answer is 4. Ünïcödé and emoji 🙂 too.",
+    tool_calls=[
+        {"name": "Calculator", "args": {"expression": "2 + 2"}, "id": "call_1", "type": "tool_call"}
+    ],
+    response_metadata={"finish_reason": "stop", "token_usage": {"total_tokens": 42}},
+    run_id="847c6285-8fc9-4560-a83f-4e6285809254",
+)
+
+
+def test_dump_chat_message_matches_model_dump() -> None:
+    assert json.loads(dump_chat_message(MESSAGE)) == json.loads(json.dumps(MESSAGE.model_dump()))
+
+
+def test_sse_events_match_json_dumps() -> None:
+    assert json.loads(sse_token('Hello "world"\n')[6:]) == {
+        "type": "token",
+        "content": 'Hello "world"\n',
+    }
+    assert json.loads(sse_message(MESSAGE)[6:]) == {
+        "type": "message",
+        "content": MESSAGE.model_dump(),
+    }
+    assert json.loads(sse_error("Unexpected error")[6:]) == {
+        "type": "error",
+        "content": "Unexpected error",
+    }
+    for event in (sse_token("x"), sse_message(MESSAGE), SSE_DONE):
+        assert event.startswith(b"data: ")
+        assert event.endswith(b"\n\n")
+
+
+@pytest.mark.parametrize("separator", ["\u0085", "\u2028", "\u2029"])
+def test_line_separators_are_escaped(separator) -> None:
+    """An event must stay on one line for clients that split with str.splitlines()."""
+    text = f"before{separator}after"
+    for event in (sse_token(text), sse_message(ChatMessage(type="ai", content=text))):
+        lines = event.decode().strip().splitlines()
+        assert len(lines) == 1
+        parsed = AgentClient(get_info=False)._parse_stream_line(lines[0])
+        assert (parsed if isinstance(parsed, str) else parsed.content) == text
@@ -1,15 +1,23 @@
+import asyncio
 import json
 from unittest.mock import AsyncMock, patch
 
 import langsmith
 import pytest
-from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage
+from fastapi.testclient import TestClient
+from langchain_core.messages import AIMessage, AIMessageChunk, HumanMessage, ToolMessage
+from langgraph.checkpoint.memory import MemorySaver
+from langgraph.graph import END, MessagesState, StateGraph
 from langgraph.pregel.types import StateSnapshot
-from langgraph.types import Interrupt
+from langgraph.types import Interrupt, interrupt
 
 from agents.agents import Agent
-from schema import ChatHistory, ChatMessage, ServiceMetadata
+from agents.llama_guard import SAFETY_VERIFIED_KEY
+from memory import SharedCheckpointer
+from schema import BatchResult, ChatHistory, ChatMessage, ServiceMetadata
 from schema.models import OpenAIModelName
+from service import app
+from service.service import stream_stats, stream_until_disconnect
 
 
 def test_invoke(test_client, mock_agent) -> None:
@@ -45,13 +53,13 @@ def test_invoke_custom_agent(test_client, mock_agent) -> None:
     # Configure our custom mock agent
     mock_agent.ainvoke.return_value = [("values", {"messages": [AIMessage(content=CUSTOM_ANSWER)]})]
 
-    # Patch get_agent to return the correct agent based on the provided agent_id
+    # Patch aget_agent to return the correct agent based on the provided agent_id
     def agent_lookup(agent_id):
         if agent_id == CUSTOM_AGENT:
             return mock_agent
         return default_mock
 
-    with patch("service.service.get_agent", side_effect=agent_lookup):
+    with patch("service.service.aget_agent", side_effect=agent_lookup):
         response = test_client.post(f"/{CUSTOM_AGENT}/invoke", json={"message": QUESTION})
         assert response.status_code == 200
 
@@ -124,6 +132,15 @@ def test_invoke_custom_agent_config(test_client, mock_agent) -> None:
     )
     assert response.status_code == 422
 
+    # And so does a context budget that isn't a number of tokens
+    for max_tokens in ("lots", -1, 1.5):
+        response = test_client.post(
+            "/invoke",
+            json={"message": QUESTION, "agent_config": {"context_max_tokens": max_tokens}},
+        )
+        assert response.status_code == 422
+    mock_agent.ainvoke.assert_awaited_once()
+
 
 def test_invoke_interrupt(test_client, mock_agent) -> None:
     QUESTION = "What is the weather in Tokyo?"
@@ -146,6 +163,45 @@ def test_invoke_interrupt(test_client, mock_agent) -> None:
     assert output.content == INTERRUPT
 
 
+def test_interrupt_check_skipped_for_new_thread(test_client, mock_agent) -> None:
+    response = test_client.post("/invoke", json={"message": "Hello"})
+    assert response.status_code == 200
+    mock_agent.aget_state.assert_not_awaited()
+
+    response = test_client.post("/invoke", json={"message": "Hello", "thread_id": "thread-1"})
+    assert response.status_code == 200
+    mock_agent.aget_state.assert_awaited_once()
+
+
+def test_invoke_interrupt_resume_reuses_checkpoint(test_client) -> None:
+    """The interrupt check reads the latest checkpoint once and the run reuses it."""
+
+    def confirm(state: MessagesState) -> MessagesState:
+        answer = interrupt("Are you sure?")
+        return {"messages": [AIMessage(content=f"You said {answer}")]}
+
+    builder = StateGraph(MessagesState)
+    builder.add_node("confirm", confirm)
+    builder.set_entry_point("confirm")
+    builder.add_edge("confirm", END)
+    checkpointer = SharedCheckpointer()
+    saver = MemorySaver()
+    checkpointer.saver = saver
+    agent = builder.compile(checkpointer=checkpointer)
+
+    with (
+        patch("service.service.aget_agent", return_value=agent),
+        patch.object(saver, "aget_tuple", wraps=saver.aget_tuple) as reads,
+    ):
+        response = test_client.post("/invoke", json={"message": "Delete", "thread_id": "t1"})
+        assert response.json()["content"] == "Are you sure?"
+        assert reads.await_count == 1
+
+        response = test_client.post("/invoke", json={"message": "yes", "thread_id": "t1"})
+        assert response.json()["content"] == "You said yes"
+        assert reads.await_count == 2
+
+
 @patch("service.service.LangsmithClient")
 def test_feedback(mock_client: langsmith.Client, test_client) -> None:
     ls_instance = mock_client.return_value
@@ -170,7 +226,7 @@ def test_history(test_client, mock_agent) -> None:
     ANSWER = "The weather in Tokyo is 70 degrees."
     user_question = HumanMessage(content=QUESTION)
     agent_response = AIMessage(content=ANSWER)
-    mock_agent.get_state.return_value = StateSnapshot(
+    mock_agent.aget_state.return_value = StateSnapshot(
         values={"messages": [user_question, agent_response]},
         next=(),
         config={},
@@ -190,6 +246,73 @@ def test_history(test_client, mock_agent) -> None:
     assert output.messages[0].content == QUESTION
     assert output.messages[1].type == "ai"
     assert output.messages[1].content == ANSWER
+    assert output.next_before is None
+
+
+def test_history_pagination(test_client, mock_agent) -> None:
+    messages = [HumanMessage(content=f"Message {i}") for i in range(10)]
+    mock_agent.aget_state.return_value = StateSnapshot(
+        values={"messages": messages},
+        next=(),
+        config={},
+        metadata=None,
+        created_at=None,
+        parent_config=None,
+        tasks=(),
+    )
+    thread = {"thread_id": "7bcc7cc1-99d7-4b1d-bdb5-e6f90ed44de6"}
+
+    # The first page holds the most recent messages
+    response = test_client.post("/history", json={**thread, "limit": 4})
+    assert response.status_code == 200
+    output = ChatHistory.model_validate(response.json())
+    assert [m.content for m in output.messages] == [f"Message {i}" for i in range(6, 10)]
+    assert output.next_before == 6
+
+    response = test_client.post("/history", json={**thread, "limit": 4, "before": 6})
+    output = ChatHistory.model_validate(response.json())
+    assert [m.content for m in output.messages] == [f"Message {i}" for i in range(2, 6)]
+    assert output.next_before == 2
+
+    response = test_client.post("/history", json={**thread, "limit": 4, "before": 2})
+    output = ChatHistory.model_validate(response.json())
+    assert [m.content for m in output.messages] == ["Message 0", "Message 1"]
+    assert output.next_before is None
+
+    response = test_client.post("/history", json={**thread, "limit": 0})
+    assert response.status_code == 422
+
+
+def test_history_reads_page_from_message_log(test_client, mock_agent) -> None:
+    checkpointer = SharedCheckpointer()
+    checkpointer.saver = AsyncMock()
+    checkpointer.saver.aget_messages.return_value = ([HumanMessage(content="Message 6")], 6)
+    mock_agent.checkpointer = checkpointer
+
+    response = test_client.post("/history", json={"thread_id": "abc", "limit": 1, "before": 7})
+    output = ChatHistory.model_validate(response.json())
+    assert [m.content for m in output.messages] == ["Message 6"]
+    assert output.next_before == 6
+    checkpointer.saver.aget_messages.assert_awaited_once_with(
+        {"configurable": {"thread_id": "abc"}}, before=7, limit=1
+    )
+    mock_agent.aget_state.assert_not_awaited()
+
+
+def test_history_custom_agent(test_client, mock_agent) -> None:
+    mock_agent.aget_state.return_value = StateSnapshot(
+        values={"messages": [HumanMessage(content="Hi")]},
+        next=(),
+        config={},
+        metadata=None,
+        created_at=None,
+        parent_config=None,
+        tasks=(),
+    )
+    with patch("service.service.aget_agent", return_value=mock_agent) as aget_agent:
+        response = test_client.post("/chatbot/history", json={"thread_id": "abc"})
+    assert response.status_code == 200
+    aget_agent.assert_awaited_once_with("chatbot")
 
 
 @pytest.mark.asyncio
@@ -300,6 +423,125 @@ async def test_stream_no_tokens(test_client, mock_agent) -> None:
         assert messages[0]["content"]["type"] == "ai"
 
 
+def test_stream_token_batching(test_client, mock_agent) -> None:
+    """Tokens are coalesced into frames when token_batch_ms is set."""
+    TOKENS = ["The", " weather", " in", " Tokyo", " is", " sunny", "."]
+    FINAL_ANSWER = "The weather in Tokyo is sunny."
+    events = [("messages", (AIMessageChunk(content=t), {"tags": []})) for t in TOKENS] + [
+        ("updates", {"chat_model": {"messages": [AIMessage(content=FINAL_ANSWER)]}}),
+    ]
+
+    async def mock_astream(**kwargs):
+        for event in events:
+            yield event
+
+    mock_agent.astream = mock_astream
+
+    with test_client.stream(
+        "POST",
+        "/stream",
+        json={"message": "Weather?", "token_batch_ms": 60_000, "token_batch_bytes": 16},
+    ) as response:
+        assert response.status_code == 200
+        messages = [
+            json.loads(line.lstrip("data: "))
+            for line in response.iter_lines()
+            if line and line.strip() != "data: [DONE]"
+        ]
+
+    tokens = [m["content"] for m in messages if m["type"] == "token"]
+    assert tokens == ["The weather in Tokyo", " is sunny."]
+    assert messages[-1]["type"] == "message"
+    assert messages[-1]["content"]["content"] == FINAL_ANSWER
+
+
+def test_stream_token_batching_flushes_on_time(test_client, mock_agent) -> None:
+    """A frame is sent once it's due, even if no token follows while the agent is busy."""
+
+    async def mock_astream(**kwargs):
+        for token in ["The", " weather"]:
+            yield ("messages", (AIMessageChunk(content=token), {"tags": []}))
+        # e.g. a tool call, during which the first frame becomes due
+        await asyncio.sleep(0.2)
+        yield ("messages", (AIMessageChunk(content=" is sunny."), {"tags": []}))
+
+    mock_agent.astream = mock_astream
+
+    response = test_client.post("/stream", json={"message": "Weather?", "token_batch_ms": 20})
+    tokens = [
+        json.loads(line[6:])["content"]
+        for line in response.text.splitlines()
+        if line.startswith("data: {")
+    ]
+    # Without the timer, the first frame would wait for the next token and be sent with it
+    assert tokens == ["The weather", " is sunny."]
+
+
+def test_stream_safety_check_holdback(test_client, mock_agent) -> None:
+    """Tokens are held back until the agent reports them as verified."""
+    QUESTION = "What is the weather in Tokyo?"
+    SAFE_MESSAGE = "This conversation was flagged for unsafe content: Hate"
+    events = [
+        ("messages", (AIMessageChunk(content="Sunny"), {"tags": []})),
+        ("messages", (AIMessageChunk(content=" and"), {"tags": []})),
+        ("custom", {SAFETY_VERIFIED_KEY: 5}),
+        ("messages", (AIMessageChunk(content=" awful"), {"tags": []})),
+        ("updates", {"model": {"messages": [AIMessage(content=SAFE_MESSAGE)]}}),
+    ]
+
+    async def mock_astream(**kwargs):
+        for event in events:
+            yield event
+
+    mock_agent.astream = mock_astream
+
+    with test_client.stream(
+        "POST",
+        "/stream",
+        json={"message": QUESTION, "agent_config": {"stream_safety_check": True}},
+    ) as response:
+        assert response.status_code == 200
+        messages = [
+            json.loads(line.lstrip("data: "))
+            for line in response.iter_lines()
+            if line and line.strip() != "data: [DONE]"
+        ]
+
+    # Only the verified text was streamed, the rest is replaced by the final message
+    assert [m["content"] for m in messages if m["type"] == "token"] == ["Sunny"]
+    assert messages[-1]["type"] == "message"
+    assert messages[-1]["content"]["content"] == SAFE_MESSAGE
+
+
+def test_stream_tool_results_once(test_client, mock_agent) -> None:
+    """Tool results streamed as they finish aren't sent again with the node's update."""
+    fast = ToolMessage(content="fast result", tool_call_id="call_fast")
+    slow = ToolMessage(content="slow result", tool_call_id="call_slow")
+    events = [
+        ("custom", fast),
+        ("custom", slow),
+        ("updates", {"tools": {"messages": [slow, fast]}}),
+    ]
+
+    async def mock_astream(**kwargs):
+        for event in events:
+            yield event
+
+    mock_agent.astream = mock_astream
+
+    with test_client.stream(
+        "POST", "/stream", json={"message": "Search", "stream_tokens": False}
+    ) as response:
+        messages = [
+            json.loads(line.lstrip("data: "))
+            for line in response.iter_lines()
+            if line and line.strip() != "data: [DONE]"
+        ]
+
+    assert [m["content"]["content"] for m in messages] == ["fast result", "slow result"]
+    assert all(m["content"]["type"] == "tool" for m in messages)
+
+
 def test_stream_interrupt(test_client, mock_agent) -> None:
     QUESTION = "What is the weather in Tokyo?"
     INTERRUPT = "Confirm weather check"
@@ -335,6 +577,90 @@ def test_stream_interrupt(test_client, mock_agent) -> None:
         assert messages[0]["content"]["type"] == "ai"
 
 
+def test_batch(test_client, mock_agent) -> None:
+    """Test that /batch runs every input and reports failures per input."""
+
+    async def ainvoke(input, config, **kwargs):
+        message = input["messages"][0].content
+        if message == "fail":
+            raise ValueError("Model error")
+        return [("values", {"messages": [AIMessage(content=f"Answer to {message}")]})]
+
+    mock_agent.ainvoke = AsyncMock(side_effect=ainvoke)
+    inputs = [
+        {"message": "one"},
+        {"message": "fail"},
+        {"message": "two", "agent_config": {"thread_id": "reserved"}},
+        {"message": "three"},
+    ]
+
+    response = test_client.post("/batch", json={"inputs": inputs})
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+
+    results = {}
+    for line in response.text.splitlines():
+        result = BatchResult.model_validate_json(line)
+        results[result.index] = result
+    assert sorted(results) == [0, 1, 2, 3]
+    assert results[0].output.content == "Answer to one"
+    assert results[0].output.run_id is not None
+    assert results[1].output is None
+    assert results[1].error == "Unexpected error"
+    assert "reserved keys" in results[2].error
+    assert results[3].output.content == "Answer to three"
+    assert mock_agent.ainvoke.await_count == 3
+
+    # An empty batch is rejected
+    response = test_client.post("/batch", json={"inputs": []})
+    assert response.status_code == 422
+
+
+def test_batch_unknown_agent(test_client) -> None:
+    response = test_client.post("/no-such-agent/batch", json={"inputs": [{"message": "one"}]})
+    assert response.status_code == 404
+    assert response.json()["detail"] == "Agent not found: no-such-agent"
+
+
+def test_batch_sse(test_client, mock_agent) -> None:
+    """Test that /batch can stream its results as SSE events."""
+    response = test_client.post(
+        "/custom_agent/batch",
+        json={"inputs": [{"message": "one"}, {"message": "two"}], "format": "sse"},
+    )
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+
+    events = [line[6:] for line in response.text.splitlines() if line.startswith("data: ")]
+    assert events[-1] == "[DONE]"
+    results = [json.loads(event) for event in events[:-1]]
+    assert [r["type"] for r in results] == ["result", "result"]
+    assert sorted(r["content"]["index"] for r in results) == [0, 1]
+    assert all(r["content"]["output"]["content"] == "Test response" for r in results)
+
+
+def test_batch_concurrency(test_client, mock_agent) -> None:
+    """Test that /batch runs no more than `concurrency` inputs at once."""
+    running = 0
+    max_running = 0
+
+    async def ainvoke(**kwargs):
+        nonlocal running, max_running
+        running += 1
+        max_running = max(max_running, running)
+        await asyncio.sleep(0.01)
+        running -= 1
+        return [("values", {"messages": [AIMessage(content="done")]})]
+
+    mock_agent.ainvoke = AsyncMock(side_effect=ainvoke)
+    inputs = [{"message": f"question {i}"} for i in range(6)]
+
+    response = test_client.post("/batch", json={"inputs": inputs, "concurrency": 2})
+    assert response.status_code == 200
+    assert len(response.text.splitlines()) == 6
+    assert max_running == 2
+
+
 def test_info(test_client, mock_settings) -> None:
     """Test that /info returns the correct service metadata."""
 
@@ -354,3 +680,70 @@ def test_info(test_client, mock_settings) -> None:
 
     assert output.default_model == OpenAIModelName.GPT_4O_MINI
     assert output.models == [OpenAIModelName.GPT_4O, OpenAIModelName.GPT_4O_MINI]
+
+
+def test_metrics(test_client) -> None:
+    with patch.dict("core.metrics._providers", {"test": lambda: {"in_use": 2}}, clear=True):
+        response = test_client.get("/metrics")
+    assert response.status_code == 200
+    assert response.json() == {"test": {"in_use": 2}}
+
+
+def test_agents_loaded_off_the_event_loop_on_startup(tmp_path) -> None:
+    loaded_on_loop = []
+
+    def load_agents() -> None:
+        try:
+            asyncio.get_running_loop()
+            loaded_on_loop.append(True)
+        except RuntimeError:
+            loaded_on_loop.append(False)
+
+    with (
+        patch("service.service.load_agents", load_agents),
+        patch("memory.sqlite.settings.SQLITE_DB_PATH", str(tmp_path / "checkpoints.db")),
+        TestClient(app),
+    ):
+        pass
+    assert loaded_on_loop == [False]
+
+
+@pytest.mark.asyncio
+async def test_stream_until_disconnect_cancels_run() -> None:
+    """The agent run is cancelled once the client disconnects."""
+    run_cancelled = asyncio.Event()
+
+    async def events():
+        yield "data: first\n\n"
+        try:
+            await asyncio.sleep(60)  # e.g. a slow tool call
+        except asyncio.CancelledError:
+            run_cancelled.set()
+            raise
+        yield "data: never sent\n\n"
+
+    request = AsyncMock()
+    request.is_disconnected.side_effect = [False, True]
+    stream_stats.clear()
+    with patch("service.service.DISCONNECT_POLL_INTERVAL", 0.01):
+        received = [event async for event in stream_until_disconnect(events(), request)]
+
+    assert received == ["data: first\n\n"]
+    assert run_cancelled.is_set()
+    assert stream_stats["client_disconnected"] == 1
+    assert stream_stats["runs_cancelled"] == 1
+
+
+@pytest.mark.asyncio
+async def test_stream_until_disconnect_completes() -> None:
+    async def events():
+        yield "data: one\n\n"
+        yield "data: two\n\n"
+
+    request = AsyncMock()
+    request.is_disconnected.return_value = False
+    stream_stats.clear()
+    received = [event async for event in stream_until_disconnect(events(), request)]
+    assert received == ["data: one\n\n", "data: two\n\n"]
+    assert stream_stats["completed"] == 1
+    assert stream_stats["runs_cancelled"] == 0
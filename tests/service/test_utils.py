@@ -1,6 +1,9 @@
+from unittest.mock import patch
+
+import pytest
 from langchain_core.messages import AIMessage, HumanMessage, SystemMessage, ToolCall, ToolMessage
 
-from service.utils import langchain_to_chat_message
+from service.utils import TokenBatcher, TokenHoldback, langchain_to_chat_message
 
 
 def test_messages_from_langchain() -> None:
@@ -42,3 +45,36 @@ def test_messages_tool_calls() -> None:
     assert ai_message.tool_calls[0]["id"] == "call_Jja7"
     assert ai_message.tool_calls[0]["name"] == "test_tool"
     assert ai_message.tool_calls[0]["args"] == {"x": 1, "y": 2}
+
+
+def test_token_holdback() -> None:
+    holdback = TokenHoldback()
+    assert holdback.add("Hello") == ""
+    assert holdback.add(" world") == ""
+    assert holdback.verify(3) == "Hel"
+    assert holdback.verify(2) == ""
+    assert holdback.add("!") == ""
+    assert holdback.verify(12) == "lo world!"
+    # Tokens already covered by a verified offset are released immediately
+    assert holdback.add("?") == ""
+
+    holdback.reset()
+    assert holdback.add("Next") == ""
+    assert holdback.verify(4) == "Next"
+
+
+def test_token_batcher() -> None:
+    batcher = TokenBatcher(interval_ms=50, max_bytes=10)
+    with patch("service.utils.time.monotonic", return_value=1.0):
+        assert batcher.add("Hello") is None
+        # Flushed once the frame holds max_bytes
+        assert batcher.add(" world") == "Hello world"
+        assert batcher.add("!") is None
+        assert batcher.due_in() == pytest.approx(0.05)
+    with patch("service.utils.time.monotonic", return_value=1.06):
+        # Flushed once the first buffered token is older than the interval
+        assert batcher.add("?") == "!?"
+    assert batcher.flush() is None
+    assert batcher.due_in() is None
+    assert batcher.add("end") is None
+    assert batcher.flush() == "end"